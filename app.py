@@ -1,18 +1,20 @@
 import os
 import stripe
 import requests as http_requests
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from flask_cors import CORS
 from datetime import datetime, timedelta
 # Firebase removed - using Supabase only
 # import firebase_admin
 # from firebase_admin import credentials, firestore, auth
 from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content
+from sendgrid.helpers.mail import Mail, Email, To, Content, Attachment, FileContent, FileName, FileType, Disposition
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 import csv
+import json
 from io import StringIO
+from itertools import islice
 from dotenv import load_dotenv
 import random
 import time as time_module
@@ -62,6 +64,24 @@ from scrapers import (
     OklahomaCityPermitScraper,
     AlbuquerquePermitScraper
 )
+from scrapers.pool import ScraperPool, STATUS_DONE, STATUS_STOPPED, STATUS_TIMEOUT
+from scrapers.utils import RetryPolicy
+from permit_pipeline import run_pipeline, city_key, ScrapeStopped
+from upload_outbox import UploadOutbox, OutboxDrainer
+from permit_fingerprints import FingerprintIndex
+from leads_manifest import LeadsManifest
+from permit_store import PermitStore, csv_permit_row
+from leads_history import LeadsHistory, iter_leads_rows
+from geocode_cache import GeocodeResolver, cache_city
+from geocode_worker import GeocodeWorker, make_backend
+from permit_stats import PermitStats
+from permit_query import parse_filters, query_permits, PERMITS_PAGE_DEFAULT
+from permit_map import PermitMap, parse_bbox
+from permit_tiles import PermitTiles, TILES_LAYER
+from lead_mailer import LeadMailer
+from lead_digest import DigestCache, filter_signature, digest_key, parse_digest_key
+from delivery_ledger import DeliveryLedger
+from subscriber_filters import FilterIndex, normalize_filters, LEADS_FILTER_POOL
 
 # Load environment variables from .env file
 load_dotenv()
@@ -78,8 +98,59 @@ except Exception as e:
     print(f"Supabase connection failed: {e}")
     supabase = None
 
+# Hashes of the rows Supabase has accepted, so unchanged permits aren't re-upserted
+permit_fingerprints = FingerprintIndex()
+
+# Scraped rows are queued locally and uploaded to Supabase in the background,
+# rows queued while Supabase is unreachable are sent once it's back
+upload_outbox = UploadOutbox()
+outbox_drainer = OutboxDrainer(upload_outbox, supabase, fingerprints=permit_fingerprints) if supabase else None
+if outbox_drainer:
+    outbox_drainer.start()
+
+# Index of the leads/<city>/<date> CSVs so readers don't walk the tree
+leads_manifest = LeadsManifest('leads')
+
+# Local SQLite copy of the permits table - backfilled from leads/ on first start
+permit_store = PermitStore()
+
+# Map viewport queries over the store's spatial index, clusters cached per tile
+permit_map = PermitMap(permit_store)
+
+# Vector tiles of the permit points per city, rebuilt after scrapes for the cities that changed
+permit_tiles = PermitTiles(permit_store)
+
+def build_map_tiles(city_names):
+    """Regenerate the MVT tiles of these (display-name) cities whose geocoded permits changed"""
+    rebuilt = permit_tiles.build_cities([city_key(name) for name in city_names])
+    print(f"🗺️  Map tiles rebuilt for {len(rebuilt)} cities")
+
+# Per-city counts for the admin views, refreshed when a scraper run finishes
+permit_stats = PermitStats(permit_store, supabase)
+
+# Per-day deltas of the leads CSVs, old daily files are compacted into it
+leads_history = LeadsHistory()
+
+# Who has been sent which day's leads email, so an interrupted send resumes without duplicates
+delivery_ledger = DeliveryLedger()
+daily_send_lock = threading.Lock()
+
+# Geocode lookups: in-process LRU -> data/geocode_cache.db -> Supabase geocode_cache
+geocoder = GeocodeResolver(supabase)
+
+# Fills in missing permit coordinates after each scraper run (GEOCODER_BACKEND, daily quota)
+geocode_worker = GeocodeWorker(geocoder, make_backend(), permit_store, upload_outbox)
+
+def backfill_local_stores():
+    """Bring the permit store and leads history up to date with the leads/ tree"""
+    if permit_store.count() == 0:
+        permit_store.import_leads(leads_manifest)
+    leads_history.import_leads(leads_manifest)
+
+threading.Thread(target=backfill_local_stores, daemon=True).start()
+
 # ============ SUPABASE SUBSCRIBER FUNCTIONS ============
-def save_subscriber_to_supabase(email, city, amount_paid, stripe_customer_id=None, subscription_id=None, cities=None):
+def save_subscriber_to_supabase(email, city, amount_paid, stripe_customer_id=None, subscription_id=None, cities=None, filters=None):
     """Save a new subscriber to Supabase"""
     if not supabase:
         print("Supabase not available, skipping subscriber save")
@@ -101,6 +172,10 @@ def save_subscriber_to_supabase(email, city, amount_paid, stripe_customer_id=Non
             import json
             data['cities'] = json.dumps(cities)
         
+        # Lead filters for the daily email (permit types, value range, zip codes, keywords)
+        if filters:
+            data['filters'] = filters
+        
         result = supabase.table('subscribers').insert(data).execute()
         print(f"✅ Saved subscriber to Supabase: {email}")
         return result.data[0] if result.data else None
@@ -151,6 +226,18 @@ def update_subscriber_status(subscriber_id, active):
         print(f"Error updating subscriber: {e}")
         return False
 
+def update_subscriber_filters(subscriber_id, filters):
+    """Replace a subscriber's lead filters (already normalized, {} = all leads)"""
+    if not supabase:
+        return False
+    
+    try:
+        supabase.table('subscribers').update({'filters': filters}).eq('id', subscriber_id).execute()
+        return True
+    except Exception as e:
+        print(f"Error updating subscriber filters: {e}")
+        return False
+
 def deactivate_subscriber_by_stripe_id(stripe_customer_id):
     """Deactivate subscriber by Stripe customer ID"""
     if not supabase:
@@ -182,6 +269,11 @@ SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
 OWNER_EMAIL = os.getenv('OWNER_EMAIL')
 FROM_EMAIL = os.getenv('FROM_EMAIL')
 
+# Parallel scraper run settings
+SCRAPER_MAX_WORKERS = int(os.getenv('SCRAPER_MAX_WORKERS', 8))
+SCRAPER_PER_HOST_LIMIT = int(os.getenv('SCRAPER_PER_HOST_LIMIT', 2))
+SCRAPER_DEADLINE_MINUTES = int(os.getenv('SCRAPER_DEADLINE_MINUTES', 120))  # Must finish before 8 AM send
+
 # Firebase removed - using Supabase only
 db = None
 
@@ -554,6 +646,10 @@ def add_client():
         
         if not email:
             return jsonify({'success': False, 'error': 'Email is required'}), 400
+        try:
+            filters = normalize_filters(data.get('filters'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         result = save_subscriber_to_supabase(
             email=email,
@@ -561,7 +657,8 @@ def add_client():
             amount_paid=amount_paid,
             stripe_customer_id=data.get('stripe_customer_id'),
             subscription_id=data.get('subscription_id'),
-            cities=data.get('cities')
+            cities=data.get('cities'),
+            filters=filters
         )
         
         if result:
@@ -570,57 +667,71 @@ def add_client():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/clients/<int:client_id>/filters', methods=['POST'])
+def set_client_filters(client_id):
+    """Set a client's lead filters - JSON body like {"permit_types": ["roofing"], "min_value": 10000, "zip_codes": ["37206"], "keywords": ["solar"]}, {} clears them"""
+    try:
+        try:
+            filters = normalize_filters(request.get_json(silent=True) or {})
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if update_subscriber_filters(client_id, filters):
+            return jsonify({'success': True, 'filters': filters})
+        return jsonify({'success': False, 'error': 'Failed to update'}), 500
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ============ END CLIENT MANAGEMENT ENDPOINTS ============
 
-def get_leads_for_city(city, count=10):
-    """Get REAL leads from scraped CSV files with auto-fallback to cached data"""
+def _read_leads(city, date, entry, count):
+    """First `count` rows of a city's leads for a date in the email lead format"""
     leads = []
+    for lead_data in islice(iter_leads_rows(leads_manifest, leads_history, city, date, entry), count):
+        leads.append({
+            'permit_number': lead_data.get('permit_number', 'N/A'),
+            'address': lead_data.get('address', 'N/A'),
+            'permit_type': lead_data.get('type', 'N/A'),
+            'permit_value': lead_data.get('value', 'N/A'),
+            'issue_date': lead_data.get('issued_date', datetime.now().strftime('%Y-%m-%d'))
+        })
+    return leads
+
+def permit_lead(row):
+    """Permit store row -> lead dict for the emails"""
+    cost = row.get('estimated_cost')
+    return {
+        'permit_number': row['permit_number'],
+        'address': row['address'],
+        'permit_type': row.get('permit_type') or 'N/A',
+        'permit_value': f"${cost:,.0f}" if cost else 'N/A',
+        'issue_date': row.get('issue_date') or datetime.now().strftime('%Y-%m-%d')
+    }
 
+def get_leads_for_city(city, count=10):
+    """Get REAL leads from the local permit store or scraped CSV files, with auto-fallback to cached data"""
     try:
-        # Get the most recent CSV file for the city
+        # Newest permits by issue date from the local store
+        rows = permit_store.recent(city.lower().replace(' ', ''), limit=count)
+        if rows:
+            leads = [permit_lead(row) for row in rows]
+            print(f"✅ Loaded {len(leads)} real leads for {city} from local permit store")
+            return leads
+
+        # The manifest knows the city's most recent CSV and its row count
         city_lower = city.lower()
-        leads_dir = f'leads/{city_lower}'
-
-        if not os.path.exists(leads_dir):
-            print(f"⚠️  No leads directory found for {city} - trying fallback")
-            return get_fallback_leads(city, count)
+        latest_date, entry = leads_manifest.latest(city_lower)
 
-        # Find most recent date folder
-        date_folders = [d for d in os.listdir(leads_dir) if os.path.isdir(os.path.join(leads_dir, d))]
-        if not date_folders:
-            print(f"⚠️  No date folders found for {city} - trying fallback")
+        if not entry:
+            print(f"⚠️  No leads found for {city} - trying fallback")
             return get_fallback_leads(city, count)
 
-        # Sort by date (most recent first)
-        date_folders.sort(reverse=True)
-        most_recent_folder = date_folders[0]
-
-        # Look for CSV file in that folder
-        csv_path = os.path.join(leads_dir, most_recent_folder, f'{most_recent_folder}_{city_lower}.csv')
-
-        if not os.path.exists(csv_path):
-            print(f"⚠️  CSV file not found: {csv_path} - trying fallback")
-            return get_fallback_leads(city, count)
-
-        # Read CSV file
-        with open(csv_path, 'r') as f:
-            reader = csv.DictReader(f)
-            all_leads = list(reader)
-
-        if not all_leads:
+        csv_path = leads_manifest.full_path(entry)
+        if not entry['rows']:
             print(f"⚠️  CSV file empty: {csv_path} - trying fallback")
             return get_fallback_leads(city, count)
 
-        # Return requested count
-        for lead_data in all_leads[:count]:
-            leads.append({
-                'permit_number': lead_data.get('permit_number', 'N/A'),
-                'address': lead_data.get('address', 'N/A'),
-                'permit_type': lead_data.get('type', 'N/A'),
-                'permit_value': lead_data.get('value', 'N/A'),
-                'issue_date': lead_data.get('issued_date', datetime.now().strftime('%Y-%m-%d'))
-            })
-
+        # Read only the rows we need
+        leads = _read_leads(city_lower, latest_date, entry, count)
         print(f"✅ Loaded {len(leads)} real leads for {city} from {csv_path}")
         return leads
 
@@ -632,42 +743,20 @@ def get_fallback_leads(city, count=10):
     """Get fallback leads from any available historical data"""
     try:
         city_lower = city.lower()
-        leads_dir = f'leads/{city_lower}'
 
-        if not os.path.exists(leads_dir):
+        # Any historical CSV with rows, newest first (not just the most recent)
+        # (compacted days are rebuilt from the leads history)
+        candidates = [(date, entry) for date, entry in leads_manifest.dates(city_lower) if entry['rows']]
+        if not candidates:
             print(f"❌ No fallback data available for {city}")
             return get_sample_leads(city, count)
 
-        # Find ANY available CSV file (not just most recent)
-        all_csv_files = []
-        for root, dirs, files in os.walk(leads_dir):
-            for file in files:
-                if file.endswith('.csv'):
-                    all_csv_files.append(os.path.join(root, file))
-
-        if not all_csv_files:
-            print(f"❌ No CSV files found for {city} fallback")
-            return get_sample_leads(city, count)
-
         # Try each CSV file until we find one with data
-        for csv_path in all_csv_files:
+        for date, entry in candidates:
+            csv_path = leads_manifest.full_path(entry)
             try:
-                with open(csv_path, 'r') as f:
-                    reader = csv.DictReader(f)
-                    all_leads = list(reader)
-
-                if all_leads:
-                    # Return requested count from this historical data
-                    leads = []
-                    for lead_data in all_leads[:count]:
-                        leads.append({
-                            'permit_number': lead_data.get('permit_number', 'N/A'),
-                            'address': lead_data.get('address', 'N/A'),
-                            'permit_type': lead_data.get('type', 'N/A'),
-                            'permit_value': lead_data.get('value', 'N/A'),
-                            'issue_date': lead_data.get('issued_date', datetime.now().strftime('%Y-%m-%d'))
-                        })
-
+                leads = _read_leads(city_lower, date, entry, count)
+                if leads:
                     print(f"🔄 Using fallback data: {len(leads)} leads for {city} from {csv_path}")
                     return leads
             except Exception as e:
@@ -793,44 +882,45 @@ def get_sample_leads(city, count=10):
     print(f"🎭 Generated {len(sample_leads)} sample leads for {city} (no real data available)")
     return sample_leads
 
+CITY_STATES = {
+    'nashville': 'TN',
+    'chattanooga': 'TN',
+    'austin': 'TX',
+    'san antonio': 'TX',
+    'houston': 'TX',
+    'charlotte': 'NC',
+    'phoenix': 'AZ',
+    'seattle': 'WA',
+    'chicago': 'IL',
+    'atlanta': 'GA',
+    'san diego': 'CA',
+    'indianapolis': 'IN',
+    'columbus': 'OH',
+    'boston': 'MA',
+    'philadelphia': 'PA',
+    'richmond': 'VA',
+    'milwaukee': 'WI',
+    'omaha': 'NE',
+    'knoxville': 'TN',
+    'birmingham': 'AL',
+    'snohomish': 'WA',
+    'maricopa': 'AZ',
+    'mecklenburg': 'NC',
+    'clark county': 'NV',
+    'cleveland': 'OH',
+    'fort collins': 'CO',
+    'santa barbara': 'CA',
+    'virginia beach': 'VA',
+    'tulsa': 'OK',
+    'colorado springs': 'CO',
+    'raleigh': 'NC',
+    'oklahoma city': 'OK',
+    'albuquerque': 'NM'
+}
+
 def get_state_for_city(city):
     """Get state abbreviation for a city"""
-    state_map = {
-        'nashville': 'TN',
-        'chattanooga': 'TN',
-        'austin': 'TX',
-        'san antonio': 'TX',
-        'houston': 'TX',
-        'charlotte': 'NC',
-        'phoenix': 'AZ',
-        'seattle': 'WA',
-        'chicago': 'IL',
-        'atlanta': 'GA',
-        'san diego': 'CA',
-        'indianapolis': 'IN',
-        'columbus': 'OH',
-        'boston': 'MA',
-        'philadelphia': 'PA',
-        'richmond': 'VA',
-        'milwaukee': 'WI',
-        'omaha': 'NE',
-        'knoxville': 'TN',
-        'birmingham': 'AL',
-        'snohomish': 'WA',
-        'maricopa': 'AZ',
-        'mecklenburg': 'NC',
-        'clark county': 'NV',
-        'cleveland': 'OH',
-        'fort collins': 'CO',
-        'santa barbara': 'CA',
-        'virginia beach': 'VA',
-        'tulsa': 'OK',
-        'colorado springs': 'CO',
-        'raleigh': 'NC',
-        'oklahoma city': 'OK',
-        'albuquerque': 'NM'
-    }
-    return state_map.get(city.lower(), 'TN')
+    return CITY_STATES.get(city.lower(), 'TN')
 
 def generate_csv_string(leads):
     """Convert leads list to CSV string"""
@@ -869,126 +959,185 @@ def generate_html_table(leads):
     html += "</tbody></table>"
     return html
 
+DIGEST_CITIES = ['Nashville', 'Chattanooga', 'Austin', 'San Antonio', 'Houston', 'Charlotte', 'Phoenix', 'Dallas', 'Snohomish', 'Maricopa', 'Mecklenburg', 'Clark County', 'Cleveland', 'Fort Collins', 'Santa Barbara', 'Virginia Beach', 'Tulsa', 'Colorado Springs', 'Raleigh', 'Oklahoma City', 'Albuquerque']
+
+def leads_email_html(body_city, lead_message, html_table):
+    """Daily leads email body"""
+    return f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; padding: 20px;">
+        <h2 style="color: #667eea;">Your Daily {body_city} Leads</h2>
+        <p>{lead_message}</p>
+        {html_table}
+        <hr style="margin: 30px 0;">
+        <p style="color: #718096; font-size: 14px;">
+            Need to cancel? Click the manage subscription link in your Stripe receipt.
+        </p>
+    </body>
+    </html>
+    """
+
+# Most leads in one "new since your last email" table
+LEADS_NEW_MAX = int(os.getenv('LEADS_NEW_MAX', 50))
+
+def digest_leads_loader(count=10):
+    """
+    DigestCache loader, plus where a "new since" email's cursor range has to end
+
+    Without a cursor (a subscriber's first email) it's the newest leads as
+    before; with one, the permits first seen in the cursor range. Filter
+    sets are answered from one FilterIndex per city and range.
+
+    A range can hold more matches than one email shows (LEADS_NEW_MAX, or
+    the LEADS_FILTER_POOL rows read per city), so new_leads_end() moves its
+    end back to the last permit that fits, in first-seen order. Planning
+    with that end makes the email and the cursor it advances agree - the
+    rest come in the next email.
+    """
+    indexes = {}
+
+    def index(city, since):
+        key = (city_key(city), since)
+        if key not in indexes:
+            if since is None:
+                rows = permit_store.recent(key[0], limit=LEADS_FILTER_POOL)
+            else:
+                rows = permit_store.first_seen_between(key[0], since[0], since[1], limit=LEADS_FILTER_POOL)
+            indexes[key] = FilterIndex(rows)
+        return indexes[key]
+
+    def load(city, filters, since):
+        if since is None and not filters:
+            return get_leads_for_city(city, count)
+        if since is None:
+            return [permit_lead(row) for row in index(city, None).select(filters, count)]
+        rows = index(city, since).select(filters, LEADS_NEW_MAX)
+        rows.sort(key=lambda row: (row.get('issue_date') or '', row['id']), reverse=True)
+        return [permit_lead(row) for row in rows]
+
+    def new_leads_end(city, filters, since):
+        """Highest permit id an email for (after, upto) can cover in full"""
+        city_index = index(city, since)
+        rows = city_index.select(filters, LEADS_NEW_MAX + 1)
+        if len(rows) > LEADS_NEW_MAX:
+            return rows[LEADS_NEW_MAX - 1]['id']
+        if len(city_index.rows) >= LEADS_FILTER_POOL:
+            return city_index.rows[-1]['id']
+        return since[1]
+
+    return load, new_leads_end
+
+def subscriber_filters(data):
+    """Normalized filters of a subscriber row ({} if none or malformed)"""
+    try:
+        return normalize_filters(data.get('filters'))
+    except ValueError as e:
+        print(f"⚠️  Ignoring invalid filters of {data.get('email')}: {e}")
+        return {}
+
+def build_city_email(city, digests, filters=None, since=None):
+    """(subject, html) of the daily email for one subscription city ('all-cities' = bundle), filter set and cursor range"""
+    today = datetime.now()
+    matching = " matching your filters" if filters else ""
+    fresh = "new contractor leads since your last email" if since else "fresh contractor leads"
+    if city == 'all-cities':
+        # Bundle subscribers get leads from all cities, assembled from the per-city fragments
+        html_table, cities_with_data = digests.bundle(DIGEST_CITIES, filters, since)
+
+        if cities_with_data:
+            subject = f'Your Daily All Cities Contractor Leads - {today.strftime("%m/%d/%Y")}'
+            lead_message = f"Here are your {fresh}{matching} from {len(cities_with_data)} cities for {today.strftime('%B %d, %Y')}:"
+        else:
+            html_table = "<p style='text-align: center; padding: 40px; background: #f8f9fa; border-radius: 8px;'>No new permits available from any cities today. We're actively monitoring all locations for fresh leads.</p>"
+            subject = f'All Cities Update - {today.strftime("%m/%d/%Y")}'
+            lead_message = "We're actively monitoring all 20 cities for new contractor leads. No permits available today."
+        return subject, leads_email_html("All Cities", lead_message, html_table)
+
+    # Individual city subscribers
+    html_table = digests.fragment(city, filters, since)
+    if html_table:
+        subject = f'Your Daily {city} Contractor Leads - {today.strftime("%m/%d/%Y")}'
+        lead_message = f"Here are your {fresh}{matching} for {today.strftime('%B %d, %Y')}:"
+    else:
+        html_table = "<p style='text-align: center; padding: 40px; background: #f8f9fa; border-radius: 8px;'>No new permits available today. We'll keep checking for fresh leads.</p>"
+        subject = f'{city} Update - {today.strftime("%m/%d/%Y")}'
+        lead_message = f"We're actively monitoring {city} for new contractor leads. No permits available today."
+    return subject, leads_email_html(city, lead_message, html_table)
+
 def send_daily_leads():
     """Run daily at 8 AM Central - send leads to all active subscribers"""
     print(f"Starting daily lead distribution at {datetime.now()}")
+    if not daily_send_lock.acquire(blocking=False):
+        print("Daily lead distribution already running - skipping")
+        return
     
     try:
         # Get all active subscribers
-        subscribers_ref = db.collection('subscribers').where('active', '==', True)
-        subscribers = subscribers_ref.get()
+        subscribers = get_active_subscribers()
         
-        # Group by city
+        # Group by city, and within a city by filter set (identical filters share one signature)
         city_subscribers = {}
+        filter_sets = {}
         all_subscribers_data = []
         
-        for sub in subscribers:
-            data = sub.to_dict()
-            city = data['city']
-            email = data['email']
+        for data in subscribers:
+            city = data.get('city') or 'Unknown'
+            email = data.get('email')
+            if not email:
+                continue
             
-            if city not in city_subscribers:
-                city_subscribers[city] = []
-            city_subscribers[city].append(email)
+            filters = subscriber_filters(data)
+            signature = filter_signature(filters)
+            filter_sets[signature] = filters
+            city_subscribers.setdefault(city, []).append((email, signature))
             
             all_subscribers_data.append({
                 'email': email,
                 'city': city,
-                'customer_id': data['stripe_customer_id'],
+                'customer_id': data.get('stripe_customer_id'),
                 'created_at': data.get('created_at', 'N/A')
             })
         
-        # Send leads to each city's subscribers
-        for city, emails in city_subscribers.items():
-            if city == 'all-cities':
-                # Bundle subscribers get leads from all cities
-                all_cities = ['Nashville', 'Chattanooga', 'Austin', 'San Antonio', 'Houston', 'Charlotte', 'Phoenix', 'Dallas', 'Snohomish', 'Maricopa', 'Mecklenburg', 'Clark County', 'Cleveland', 'Fort Collins', 'Santa Barbara', 'Virginia Beach', 'Tulsa', 'Colorado Springs', 'Raleigh', 'Oklahoma City', 'Albuquerque']
-                all_leads = []
-                cities_with_data = []
-                
-                for c in all_cities:
-                    leads = get_leads_for_city(c)
-                    if leads:
-                        all_leads.extend(leads)
-                        cities_with_data.append(c)
-                
-                if all_leads:
-                    html_table = generate_html_table(all_leads)
-                    subject = f'Your Daily All Cities Contractor Leads - {datetime.now().strftime("%m/%d/%Y")}'
-                    lead_message = f"Here are your fresh contractor leads from {len(cities_with_data)} cities for {datetime.now().strftime('%B %d, %Y')}:"
-                else:
-                    html_table = "<p style='text-align: center; padding: 40px; background: #f8f9fa; border-radius: 8px;'>No new permits available from any cities today. We're actively monitoring all locations for fresh leads.</p>"
-                    subject = f'All Cities Update - {datetime.now().strftime("%m/%d/%Y")}'
-                    lead_message = "We're actively monitoring all 20 cities for new contractor leads. No permits available today."
-                
-                body_city = "All Cities"
-                
-                for email in emails:
-                    try:
-                        message = Mail(
-                            from_email=Email(FROM_EMAIL),
-                            to_emails=To(email),
-                            subject=subject,
-                            html_content=f"""
-                            <html>
-                            <body style="font-family: Arial, sans-serif; padding: 20px;">
-                                <h2 style="color: #667eea;">Your Daily {body_city} Leads</h2>
-                                <p>{lead_message}</p>
-                                {html_table}
-                                <hr style="margin: 30px 0;">
-                                <p style="color: #718096; font-size: 14px;">
-                                    Need to cancel? Click the manage subscription link in your Stripe receipt.
-                                </p>
-                            </body>
-                            </html>
-                            """
-                        )
-                        
-                        sg = SendGridAPIClient(SENDGRID_API_KEY)
-                        sg.send(message)
-                        print(f"Sent all cities leads to {email}")
-                    except Exception as e:
-                        print(f"Error sending to {email}: {e}")
-            else:
-                # Individual city subscribers
-                leads = get_leads_for_city(city)
-                if leads:
-                    html_table = generate_html_table(leads)
-                    subject = f'Your Daily {city} Contractor Leads - {datetime.now().strftime("%m/%d/%Y")}'
-                    body_city = city
-                    lead_message = f"Here are your fresh contractor leads for {datetime.now().strftime('%B %d, %Y')}:"
-                else:
-                    html_table = "<p style='text-align: center; padding: 40px; background: #f8f9fa; border-radius: 8px;'>No new permits available today. We'll keep checking for fresh leads.</p>"
-                    subject = f'{city} Update - {datetime.now().strftime("%m/%d/%Y")}'
-                    body_city = city
-                    lead_message = f"We're actively monitoring {city} for new contractor leads. No permits available today."
-                
-                for email in emails:
-                    try:
-                        message = Mail(
-                            from_email=Email(FROM_EMAIL),
-                            to_emails=To(email),
-                            subject=subject,
-                            html_content=f"""
-                            <html>
-                            <body style="font-family: Arial, sans-serif; padding: 20px;">
-                                <h2 style="color: #667eea;">Your Daily {body_city} Leads</h2>
-                                <p>{lead_message}</p>
-                                {html_table}
-                                <hr style="margin: 30px 0;">
-                                <p style="color: #718096; font-size: 14px;">
-                                    Need to cancel? Click the manage subscription link in your Stripe receipt.
-                                </p>
-                            </body>
-                            </html>
-                            """
-                        )
-                        
-                        sg = SendGridAPIClient(SENDGRID_API_KEY)
-                        sg.send(message)
-                        print(f"Sent leads to {email} for {city}")
-                    except Exception as e:
-                        print(f"Error sending to {email}: {e}")
+        # Today's recipients go in the delivery ledger; anyone already sent today is skipped
+        digest_date = datetime.now().strftime('%Y-%m-%d')
+        delivery_ledger.prune()
+        # Every subscriber of a city with the same filters and cursor gets the same email, sent in batched requests
+        # Each (city, filter set, cursor range) is loaded and rendered once per run, bundles reuse the fragments
+        load_leads, new_leads_end = digest_leads_loader()
+        digests = DigestCache(load_leads, generate_html_table, digest_date)
+
+        # Each subscriber gets the permits first seen after their cursor, up to everything stored now -
+        # or up to the last one that fits in the email, and the cursor only advances that far
+        upto = permit_store.first_seen_mark()
+        cursors = delivery_ledger.cursors()
+        range_ends = {}
+        recipients_today = []
+        for city, recipients in city_subscribers.items():
+            for email, signature in recipients:
+                after = cursors.get((email, city))
+                if after is not None and (city, signature, after) not in range_ends:
+                    cities = DIGEST_CITIES if city == 'all-cities' else [city]
+                    range_ends[(city, signature, after)] = min(
+                        new_leads_end(c, filter_sets[signature], (after, upto)) for c in cities)
+                end = upto if after is None else range_ends[(city, signature, after)]
+                recipients_today.append((email, city, digest_key(signature, after, end), end))
+        delivery_ledger.plan(digest_date, recipients_today)
+        pending = delivery_ledger.pending_digests(digest_date)
+        if not pending:
+            print(f"Everyone already has the {digest_date} leads email")
+            return
+        
+        contents = {}
+        for city, digest in pending:
+            signature, since = parse_digest_key(digest)
+            if signature in filter_sets:
+                contents[(city, digest)] = build_city_email(city, digests, filter_sets[signature], since)
+        print(f"Built {len(contents)} emails ({digests.stats['loads']} city loads, {digests.stats['renders']} tables rendered)")
+        mailer = LeadMailer(SENDGRID_API_KEY, FROM_EMAIL)
+        result = mailer.deliver(delivery_ledger, digest_date, contents)
+        delivered = delivery_ledger.status(digest_date)['by_status']
+        print(f"Sent leads to {result['sent']} subscribers in {result['seconds']}s "
+              f"({result['emails_per_second']}/s, {delivered.get('sent', 0)} of {len(all_subscribers_data)} delivered today)")
         
         # Send master CSV to owner
         if all_subscribers_data:
@@ -1003,6 +1152,7 @@ def send_daily_leads():
                 <body style="font-family: Arial, sans-serif; padding: 20px;">
                     <h2>Daily Active Subscribers</h2>
                     <p>Total Active: {len(all_subscribers_data)}</p>
+                    <p>Delivered today: {delivered.get('sent', 0)} ({delivered.get('failed', 0)} failed, {delivered.get('pending', 0) + delivered.get('sending', 0)} still pending)</p>
                     <p>Breakdown:</p>
                     <ul>
                         {''.join([f'<li>{city}: {len(emails)} subscribers</li>' for city, emails in city_subscribers.items()])}
@@ -1016,24 +1166,86 @@ def send_daily_leads():
             # Attach CSV
             import base64
             encoded_csv = base64.b64encode(csv_content.encode()).decode()
-            message.attachment = {
-                'content': encoded_csv,
-                'filename': f'subscribers_{datetime.now().strftime("%Y%m%d")}.csv',
-                'type': 'text/csv',
-                'disposition': 'attachment'
-            }
+            message.attachment = Attachment(
+                FileContent(encoded_csv),
+                FileName(f'subscribers_{datetime.now().strftime("%Y%m%d")}.csv'),
+                FileType('text/csv'),
+                Disposition('attachment')
+            )
             
-            sg = SendGridAPIClient(SENDGRID_API_KEY)
-            sg.send(message)
+            mailer.client.send(message)
             print(f"Sent master report to {OWNER_EMAIL}")
         
         print(f"Daily lead distribution completed successfully")
         
     except Exception as e:
         print(f"Error in daily lead distribution: {e}")
+    finally:
+        daily_send_lock.release()
+
+def resume_daily_leads():
+    """On startup, finish a daily send that was interrupted (deploy, worker recycle)"""
+    digest_date = datetime.now().strftime('%Y-%m-%d')
+    if delivery_ledger.undelivered(digest_date):
+        print(f"Resuming the {digest_date} leads email ({delivery_ledger.undelivered(digest_date)} recipients left)")
+        send_daily_leads()
 
-def run_daily_scrapers():
-    """Run all city scrapers with auto-recovery and fallback systems"""
+def scrape_city(city_name, scraper):
+    """
+    Scrape one city, streaming its permits to the leads CSV and the Supabase outbox
+
+    Returns (result_line, succeeded) for the run summary. Runs inside the
+    scraper pool worker threads, so it must not touch shared run state.
+    """
+    try:
+        print(f"\n🏗️  Scraping {city_name}...")
+        start_time = time_module.time()
+
+        # Stream the scraper's batches into the leads CSV and the upload outbox
+        # (a forced full refresh re-sends every row, not just the changes)
+        stats = run_pipeline(city_name, scraper, upload_outbox, permit_fingerprints, leads_manifest, permit_store,
+                             leads_history, geocoder, resend=getattr(scraper, 'full_refresh', None) is True)
+        elapsed = time_module.time() - start_time
+        policy = getattr(scraper, 'retry_policy', None)
+        retries = f", {policy.retries} retries" if policy and policy.retries else ""
+
+        if stats['written'] > 0:
+            print(f"✅ {city_name}: Successfully scraped {stats['written']} permits in {elapsed:.1f}s")
+            return f"✅ {city_name}: {stats['written']} permits, {stats['queued']} to upload ({elapsed:.1f}s{retries})", True
+        elif getattr(scraper, 'up_to_date', False):
+            # Incremental scrape worked, the city just has nothing new since
+            # the watermark - the latest leads folder stays current
+            print(f"✅ {city_name}: No new permits since last run ({elapsed:.1f}s)")
+            return f"✅ {city_name}: Up to date, no new permits ({elapsed:.1f}s{retries})", True
+        else:
+            # Scraper returned empty - readers fall back to the newest day we
+            # have (the leads history keeps it, no need to copy it forward)
+            print(f"⚠️  {city_name}: No new data - using previous day's permits")
+            city_slug = city_name.lower().replace(' ', '')
+            latest_date, entry = leads_manifest.latest(city_slug)
+            if not entry or not entry['rows']:
+                return f"⚠️  {city_name}: No historical data for fallback", False
+
+            print(f"🔄 Serving {latest_date} data for {city_name}")
+            return f"🔄 {city_name}: Using {latest_date} data as fallback", True
+    except ScrapeStopped as e:
+        # Run deadline passed - nothing published, the watermark stays put for the next run
+        print(f"⏰ {e} - deadline reached, leads CSV discarded")
+        return f"⏰ {city_name}: Stopped at the deadline (fallback active)", False
+    except Exception as e:
+        # Scraper completely failed - fallback system will handle this
+        error_msg = str(e)[:100]
+        print(f"❌ {city_name}: Error - {e}")
+        print(f"🔄 Fallback system will provide sample data for {city_name}")
+        return f"❌ {city_name}: Error - {error_msg} (fallback active)", False
+
+def run_daily_scrapers(full_refresh=False):
+    """
+    Run all city scrapers with auto-recovery and fallback systems
+
+    Scrapers fetch incrementally from their watermark unless full_refresh
+    is set (they also do a full-window run every SCRAPER_FULL_REFRESH_DAYS).
+    """
     try:
         # Random delay between 0-30 minutes (in seconds)
         delay_seconds = random.randint(0, 1800)
@@ -1050,6 +1262,7 @@ def run_daily_scrapers():
         # Reset stop flag
         global stop_scrapers
         stop_scrapers = False
+        scraper_kill_switch.clear()
 
         # ALL 33 CITIES ENABLED WITH AUTO-RECOVERY
         # System tries real APIs first, uses fallback data if APIs fail
@@ -1090,6 +1303,19 @@ def run_daily_scrapers():
             ('Albuquerque', AlbuquerquePermitScraper())
         ]
 
+        if full_refresh:
+            print(f"📚 Full refresh requested - scraping the whole window for every city")
+            for _, scraper in scrapers:
+                scraper.full_refresh = True
+
+        # Every scraper's retries share the run deadline, so a flaky city
+        # stops backing off (and its requests time out) when the run is over
+        run_deadline = time_module.monotonic() + SCRAPER_DEADLINE_MINUTES * 60
+        for _, scraper in scrapers:
+            if getattr(scraper, 'retry_policy', None) is None:
+                scraper.retry_policy = RetryPolicy()
+            scraper.retry_policy.deadline = run_deadline
+
         results = []
         successful = 0
         failed = 0
@@ -1098,115 +1324,59 @@ def run_daily_scrapers():
         print(f"🔄 Running {total_cities} scrapers with auto-recovery...")
         print(f"💡 System will use fallback data if scrapers fail - subscribers always get leads!")
 
-        for city_name, scraper in scrapers:
-            if stop_scrapers:
-                print(f"\n🛑 Scraper run stopped by user request")
-                break
-            try:
-                print(f"\n🏗️  Scraping {city_name}...")
-                start_time = time_module.time()
-
-                # Run scraper with built-in error handling
-                permits = scraper.run()
-                elapsed = time_module.time() - start_time
-
-                if permits and len(permits) > 0:
-                    # Save the scraped permits to CSV
-                    today = datetime.now().strftime('%Y-%m-%d')
-                    city_folder = f"leads/{city_name.lower().replace(' ', '')}"
-                    dest_folder = os.path.join(city_folder, today)
-                    os.makedirs(dest_folder, exist_ok=True)
-                    dest_csv = os.path.join(dest_folder, f"{today}_{city_name.lower().replace(' ', '')}.csv")
-
-                    # Write permits to CSV
-                    if permits:
-                        import csv
-                        with open(dest_csv, 'w', newline='', encoding='utf-8') as csvfile:
-                            fieldnames = ['permit_number', 'address', 'permit_type', 'permit_value', 'issue_date']
-                            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                            writer.writeheader()
-                            for permit in permits:
-                                writer.writerow(permit)
-                        print(f"💾 Saved {len(permits)} permits to {dest_csv}")
-
-                    # Upload to Supabase
-                    if supabase:
-                        try:
-                            supabase_permits = []
-                            for permit in permits:
-                                cost_str = permit.get('permit_value', '')
-                                try:
-                                    cost_val = float(cost_str.replace('$', '').replace(',', '')) if cost_str else None
-                                except:
-                                    cost_val = None
-
-                                supabase_permit = {
-                                    "permit_number": permit.get('permit_number', f"{city_name}_{permit.get('address', 'unknown')[:30]}"),
-                                    "address": permit.get('address', 'Unknown'),
-                                    "city": city_name.lower().replace(' ', ''),
-                                    "permit_type": permit.get('permit_type', 'Permit'),
-                                    "description": permit.get('description', ''),
-                                    "issue_date": permit.get('issue_date', today),
-                                    "estimated_cost": cost_val,
-                                    "lat": permit.get('lat'),
-                                    "lng": permit.get('lng')
-                                }
-                                supabase_permits.append(supabase_permit)
-
-                            # Insert in batches of 100
-                            for i in range(0, len(supabase_permits), 100):
-                                batch = supabase_permits[i:i+100]
-                                supabase.table('permits').upsert(batch).execute()
-                            print(f"☁️  Uploaded {len(supabase_permits)} permits to Supabase")
-                        except Exception as e:
-                            print(f"⚠️  Supabase upload failed: {e}")
-
-                    results.append(f"✅ {city_name}: {len(permits)} permits ({elapsed:.1f}s)")
-                    print(f"✅ {city_name}: Successfully scraped {len(permits)} permits in {elapsed:.1f}s")
+        pool = ScraperPool(
+            max_workers=SCRAPER_MAX_WORKERS,
+            per_host_limit=SCRAPER_PER_HOST_LIMIT,
+            deadline_seconds=SCRAPER_DEADLINE_MINUTES * 60,
+            should_stop=lambda: stop_scrapers or scraper_kill_switch.is_set()
+        )
+        print(f"⚡ Up to {SCRAPER_MAX_WORKERS} cities in parallel, {SCRAPER_PER_HOST_LIMIT} per API host, {SCRAPER_DEADLINE_MINUTES} min deadline")
+        run_start = time_module.time()
+        stop_announced = False
+
+        for city_name, status, outcome in pool.run(scrapers, scrape_city):
+            if status == STATUS_DONE:
+                result_line, succeeded = outcome
+                results.append(result_line)
+                if succeeded:
                     successful += 1
                 else:
-                    # Scraper returned empty - copy yesterday's data as fallback
-                    print(f"⚠️  {city_name}: No new data - using previous day's permits")
-                    city_folder = f"leads/{city_name.lower().replace(' ', '')}"
-                    if os.path.exists(city_folder):
-                        # Find most recent date folder
-                        date_folders = sorted([d for d in os.listdir(city_folder) if os.path.isdir(os.path.join(city_folder, d))], reverse=True)
-                        if date_folders:
-                            latest_date = date_folders[0]
-                            source_csv = os.path.join(city_folder, latest_date, f"{latest_date}_{city_name.lower().replace(' ', '')}.csv")
-                            if os.path.exists(source_csv):
-                                # Copy to today
-                                today = datetime.now().strftime('%Y-%m-%d')
-                                dest_folder = os.path.join(city_folder, today)
-                                os.makedirs(dest_folder, exist_ok=True)
-                                dest_csv = os.path.join(dest_folder, f"{today}_{city_name.lower().replace(' ', '')}.csv")
-                                import shutil
-                                shutil.copy(source_csv, dest_csv)
-                                results.append(f"🔄 {city_name}: Using {latest_date} data as fallback")
-                                print(f"🔄 Copied {latest_date} data for {city_name}")
-                                successful += 1  # Count as success - we have data
-                            else:
-                                results.append(f"⚠️  {city_name}: No fallback data available")
-                                failed += 1
-                        else:
-                            results.append(f"⚠️  {city_name}: No historical data for fallback")
-                            failed += 1
-                    else:
-                        results.append(f"⚠️  {city_name}: No fallback data available")
-                        failed += 1
-
-            except KeyboardInterrupt:
-                print(f"\n⚠️  Scraper run interrupted by user")
-                break
-            except Exception as e:
-                # Scraper completely failed - fallback system will handle this
-                error_msg = str(e)[:100]
-                results.append(f"❌ {city_name}: Error - {error_msg} (fallback active)")
-                print(f"❌ {city_name}: Error - {e}")
-                print(f"🔄 Fallback system will provide sample data for {city_name}")
+                    failed += 1
+            elif status == STATUS_STOPPED:
+                if not stop_announced:
+                    print(f"\n🛑 Scraper run stopped by user request")
+                    stop_announced = True
+                results.append(f"🛑 {city_name}: Not started - run stopped by user request")
+            elif status == STATUS_TIMEOUT:
+                results.append(f"⏰ {city_name}: Not finished within {SCRAPER_DEADLINE_MINUTES} min deadline (fallback active)")
+                print(f"⏰ {city_name}: Deadline reached - fallback system will provide data")
                 failed += 1
-                # Continue to next city - don't let one failure stop the whole run
-                continue
+            else:
+                # scrape_city catches its own errors, this is a last resort
+                results.append(f"❌ {city_name}: Error - {str(outcome)[:100]} (fallback active)")
+                failed += 1
+
+        print(f"\n⏱️  Scraped {total_cities} cities in {time_module.time() - run_start:.1f}s")
+        total_retries = sum(scraper.retry_policy.retries for _, scraper in scrapers)
+        total_backoff = sum(scraper.retry_policy.sleep_seconds for _, scraper in scrapers)
+        print(f"🔁 Retries spent: {total_retries} ({total_backoff:.1f}s of backoff)")
+        print(f"📤 Supabase outbox: {upload_outbox.depth()} permits still waiting to upload")
+
+        # Old daily CSVs only repeat what the leads history already holds
+        try:
+            leads_history.compact(leads_manifest)
+        except Exception as e:
+            print(f"⚠️  Leads history compaction failed: {e}")
+
+        permit_stats.invalidate()
+
+        # Geocode the permits that came without coordinates, then rebuild the
+        # map tiles of the cities that changed - all in the background
+        city_names = [name for name, _ in scrapers]
+        if geocode_worker.start(city_names, get_state_for_city, on_done=build_map_tiles):
+            print(f"📍 Geocoding started ({geocode_worker.quota_left()} lookups left today)")
+        else:
+            threading.Thread(target=build_map_tiles, args=(city_names,), daemon=True).start()
 
         # Always print summary
         print("\n" + "=" * 80)
@@ -1258,6 +1428,9 @@ scheduler.add_job(
 
 scheduler.start()
 
+# Finish today's leads email if a restart interrupted it
+threading.Thread(target=resume_daily_leads, daemon=True).start()
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()}), 200
@@ -1293,10 +1466,11 @@ def manual_scraper_run():
         if admin_secret != os.getenv('ADMIN_SECRET'):
             return jsonify({'error': 'Unauthorized'}), 401
 
-        print("🔧 Manual scraper run triggered - starting in background thread")
+        full_refresh = bool(data.get('full'))
+        print(f"🔧 Manual {'full' if full_refresh else 'incremental'} scraper run triggered - starting in background thread")
 
         # Run scrapers in background thread so API returns immediately
-        thread = threading.Thread(target=run_daily_scrapers, daemon=True)
+        thread = threading.Thread(target=run_daily_scrapers, kwargs={'full_refresh': full_refresh}, daemon=True)
         thread.start()
 
         return jsonify({'status': 'success', 'message': 'Scraper run initiated in background'}), 200
@@ -1412,6 +1586,8 @@ def run_manual_scrapers():
             print(f"❌ {city_name}: Error - {str(e)}")
             failed += 1
 
+    permit_stats.invalidate()
+
     print("\n" + "=" * 80)
     if scraper_kill_switch.is_set():
         print(f"🛑 Scraper run STOPPED by kill switch")
@@ -1491,72 +1667,125 @@ def get_logs():
         print(f"Error in get_logs: {e}")
         return f"Error retrieving logs: {str(e)}", 500
 
+@app.route('/api/outbox-status', methods=['GET'])
+def outbox_status():
+    """Depth and health of the Supabase upload outbox"""
+    try:
+        return jsonify({
+            'outbox': upload_outbox.stats(),
+            'drainer': outbox_drainer.stats() if outbox_drainer else None
+        }), 200
+    except Exception as e:
+        print(f"Error in outbox-status: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/outbox/retry-parked', methods=['POST'])
+def outbox_retry_parked():
+    """Give rows that exhausted their upload attempts another round"""
+    try:
+        requeued = upload_outbox.requeue_parked()
+        return jsonify({'status': 'success', 'requeued': requeued}), 200
+    except Exception as e:
+        print(f"Error in outbox retry: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/geocode-status', methods=['GET'])
+def geocode_status():
+    """Geocoding backend, today's quota use and the last run per city"""
+    try:
+        return jsonify(geocode_worker.status()), 200
+    except Exception as e:
+        print(f"Error in geocode-status: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/geocode/run', methods=['POST'])
+def run_geocoding():
+    """Geocode missing coordinates now (?cities=Austin,San Antonio, default every city in the store)"""
+    try:
+        cities_param = request.args.get('cities')
+        if cities_param:
+            cities = [city.strip() for city in cities_param.split(',') if city.strip()]
+        else:
+            stored = permit_store.city_summary()
+            cities = [name.title() for name in CITY_STATES if city_key(name) in stored]
+        if not geocode_worker.start(cities, get_state_for_city, on_done=build_map_tiles):
+            return jsonify({'status': 'error', 'message': 'Geocoding already running'}), 409
+        return jsonify({'status': 'success', 'message': f'Geocoding {len(cities)} cities in background'}), 200
+    except Exception as e:
+        print(f"Error in geocode run: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/delivery-status', methods=['GET'])
+def delivery_status():
+    """Per-status counts, recent failures and run stats of one day's leads email (?date=YYYY-MM-DD, default today)"""
+    try:
+        return jsonify(delivery_ledger.status(request.args.get('date'))), 200
+    except Exception as e:
+        print(f"Error in delivery-status: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/delivery/resume', methods=['POST'])
+def resume_delivery():
+    """Send today's leads email to whoever hasn't got it yet (?retry_failed=1 also retries failed recipients)"""
+    try:
+        if daily_send_lock.locked():
+            return jsonify({'status': 'error', 'message': 'Daily send already running'}), 409
+        retried = 0
+        if request.args.get('retry_failed') in ('1', 'true'):
+            retried = delivery_ledger.retry_failed(datetime.now().strftime('%Y-%m-%d'))
+        threading.Thread(target=send_daily_leads, daemon=True).start()
+        return jsonify({'status': 'success', 'message': f'Daily send started in background ({retried} failed recipients requeued)'}), 200
+    except Exception as e:
+        print(f"Error in delivery resume: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/permit-store/import', methods=['POST'])
+def import_permit_store():
+    """Re-import the leads/ CSVs into the local permit store (already imported files are skipped)"""
+    try:
+        thread = threading.Thread(target=permit_store.import_leads, args=(leads_manifest,), daemon=True)
+        thread.start()
+        return jsonify({'status': 'success', 'message': 'Import started in background'}), 200
+    except Exception as e:
+        print(f"Error in permit-store import: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/get-leads-structure', methods=['GET'])
 def get_leads_structure():
     """Return the structure of saved leads folders"""
     try:
-        leads_dir = 'leads'
-        if not os.path.exists(leads_dir):
-            return jsonify({'cities': []}), 200
-        
+        # Served from the leads manifest - ?rescan=true rebuilds it from disk
+        # (e.g. after CSVs were copied in by hand)
+        if request.args.get('rescan') == 'true':
+            leads_manifest.rebuild()
+
         cities = []
-        for city_name in sorted(os.listdir(leads_dir)):
-            city_path = os.path.join(leads_dir, city_name)
-            if os.path.isdir(city_path):
-                dates = []
-                for date_folder in sorted(os.listdir(city_path), reverse=True):
-                    date_path = os.path.join(city_path, date_folder)
-                    if os.path.isdir(date_path):
-                        # Count CSV files and total permits
-                        csv_files = [f for f in os.listdir(date_path) if f.endswith('.csv')]
-                        total_permits = 0
-                        for csv_file in csv_files:
-                            csv_path = os.path.join(date_path, csv_file)
-                            try:
-                                with open(csv_path, 'r', encoding='utf-8') as f:
-                                    # Count lines minus header
-                                    lines = f.readlines()
-                                    if lines:
-                                        total_permits += len(lines) - 1
-                            except Exception as e:
-                                print(f"Error reading {csv_path}: {e}")
-                        
-                        dates.append({
-                            'date': date_folder,
-                            'files': len(csv_files),
-                            'permits': total_permits
-                        })
-                
-                cities.append({
-                    'name': city_name,
-                    'dates': dates
+        for city_name, city_dates in sorted(leads_manifest.snapshot().items()):
+            dates = []
+            for date_folder, entry in sorted(city_dates.items(), reverse=True):
+                dates.append({
+                    'date': date_folder,
+                    'files': 1,
+                    'permits': entry['rows'],
+                    'bytes': entry['bytes'],
+                    'min_issue_date': entry['min_issue_date'],
+                    'max_issue_date': entry['max_issue_date']
                 })
-        
-        # Get Supabase database counts separately
-        supabase_stats = None
-        if supabase:
-            try:
-                city_list = ['austin', 'nashville', 'houston', 'sanantonio']
-                supabase_stats = {'cities': {}}
-
-                for city in city_list:
-                    try:
-                        city_result = supabase.table('permits').select('*', count='exact').eq('city', city).execute()
-                        supabase_stats['cities'][city] = city_result.count if hasattr(city_result, 'count') else 0
-                    except:
-                        supabase_stats['cities'][city] = 0
 
-                # Get total
-                total_result = supabase.table('permits').select('*', count='exact').execute()
-                supabase_stats['total'] = total_result.count if hasattr(total_result, 'count') else 0
+            cities.append({
+                'name': city_name,
+                'dates': dates
+            })
 
-            except Exception as e:
-                print(f"Error getting Supabase stats: {e}")
-                supabase_stats = {'error': str(e)}
+        # Counts come from the per-city/day summary tables, cached for a few minutes
+        stats = permit_stats.summary(refresh=request.args.get('rescan') == 'true')
 
         return jsonify({
             'cities': cities,
-            'supabase': supabase_stats
+            'supabase': stats['supabase'],
+            'local_store': stats['local_store'],
+            'stats_generated_at': stats['generated_at'],
+            'stats_cached': stats['cached']
         }), 200
 
     except Exception as e:
@@ -1602,129 +1831,271 @@ def get_recent_permits():
         print(f"Error in get-recent-permits: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/permits', methods=['GET'])
+def query_permits_endpoint():
+    """Filtered permits, one page at a time
+
+    ?cities=austin,houston&permit_type=...&status=...&min_cost=&max_cost=
+    &since=YYYY-MM-DD&until=YYYY-MM-DD&limit=50&source=supabase|local; pass
+    the returned next_cursor as ?cursor= (with the same filters) for the next page.
+    """
+    try:
+        filters = parse_filters(request.args)
+        page = query_permits(filters, permit_store, supabase,
+                             cursor=request.args.get('cursor'),
+                             limit=request.args.get('limit', PERMITS_PAGE_DEFAULT),
+                             source=request.args.get('source'))
+        return jsonify(page), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in permits query: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/map/permits', methods=['GET'])
+def map_permits():
+    """Permits (zoomed in) or grid clusters (zoomed out) inside a map viewport, as GeoJSON
+
+    ?bbox=west,south,east,north&zoom=12 plus the /api/permits filters
+    (cities, permit_type, status, min_cost, max_cost, since, until).
+    """
+    try:
+        bbox = parse_bbox(request.args.get('bbox'))
+        zoom = int(request.args.get('zoom', 12))
+        return jsonify(permit_map.features(bbox, zoom, parse_filters(request.args))), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in map permits: {e}")
+        return jsonify({'error': str(e)}), 500
+
+TILES_MAX_AGE = int(os.getenv('TILES_MAX_AGE', 3600))
+
+@app.route('/tiles/<city>.json', methods=['GET'])
+def tilejson(city):
+    """TileJSON for a city's permit tiles; tile URLs carry the build fingerprint so they can be cached for good"""
+    index = permit_tiles.index(city.lower()) if city.isalnum() else None
+    if not index:
+        return jsonify({'error': f'No tiles for {city}'}), 404
+    base = request.host_url.rstrip('/')
+    return jsonify({
+        'tilejson': '3.0.0',
+        'name': f"{city.lower()} permits",
+        'tiles': [f"{base}/tiles/{city.lower()}/{{z}}/{{x}}/{{y}}.mvt?v={index['fingerprint'][:12]}"],
+        'minzoom': index['zooms'][0],
+        'maxzoom': index['zooms'][1],
+        'bounds': index['bounds'] or [-180, -85.0511, 180, 85.0511],
+        'vector_layers': [{
+            'id': TILES_LAYER,
+            'fields': {'city': 'String', 'address': 'String', 'permit_number': 'String', 'type': 'String',
+                       'description': 'String', 'date': 'String', 'value': 'Number'}
+        }]
+    }), 200
+
+@app.route('/tiles/<city>/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def permit_tile(city, z, x, y):
+    """One prebuilt vector tile, with an ETag (204 where the city has no permits)"""
+    if not city.isalnum():
+        return jsonify({'error': 'Invalid city'}), 400
+    path = permit_tiles.tile_path(city.lower(), z, x, y)
+    if not os.path.exists(path):
+        if permit_tiles.index(city.lower()) is None:
+            return jsonify({'error': f'No tiles for {city}'}), 404
+        return '', 204
+    # Versioned URLs (from the TileJSON) never change content; bare ones revalidate by ETag
+    max_age = 31536000 if request.args.get('v') else TILES_MAX_AGE
+    response = send_file(path, mimetype='application/vnd.mapbox-vector-tile', etag=True,
+                         conditional=True, max_age=max_age)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+@app.route('/api/tiles/rebuild', methods=['POST'])
+def rebuild_tiles():
+    """Rebuild every city's map tiles now (?force=true rewrites unchanged cities too)"""
+    try:
+        force = request.args.get('force') == 'true'
+        thread = threading.Thread(target=permit_tiles.build_cities, kwargs={'force': force}, daemon=True)
+        thread.start()
+        return jsonify({'status': 'success', 'message': 'Tile build started in background'}), 200
+    except Exception as e:
+        print(f"Error in tile rebuild: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # Geocoding disabled to avoid API limits
 def geocode_address(address, city='Austin, TX'):
     """Geocoding disabled - returns None to avoid hitting API limits"""
-    # Check Supabase cache only (no new API calls)
-    if supabase and address and address != 'Unknown Address':
+    # Cache tiers only (no new API calls)
+    return geocoder.resolve(address, city)
+
+LAST_WEEK_CITY_LIMIT = 500     # Permits per city, as before
+LAST_WEEK_PAGE_SIZE = 1000     # Rows per Supabase request (PostgREST's default max)
+LAST_WEEK_COLUMNS = 'id, city, address, permit_type, description, issue_date, permit_number, estimated_cost, lat, lng'
+
+def _last_week_permit(row, city):
+    """permits/store row -> /last-week permit"""
+    return {
+        'city': city,
+        'address': row.get('address') or 'Unknown Address',
+        'description': f"{row.get('permit_type') or ''} - {row.get('description') or ''}",
+        'date': row.get('issue_date') or '',
+        'type': row.get('permit_type') or 'Permit',
+        'permit_number': row.get('permit_number') or '',
+        'value': row.get('estimated_cost') or '',
+        'lat': row.get('lat'),
+        'lng': row.get('lng')
+    }
+
+def _supabase_recent(cities, since, counts):
+    """
+    Requested cities in one `in` query, keyset-paginated on (issue_date, id), newest first
+
+    Cities that already have LAST_WEEK_CITY_LIMIT permits in `counts` are
+    dropped from the next page's query, so one sparse city doesn't page
+    through the whole window of the others.
+    """
+    cursor = None
+    while True:
+        wanted = [city for city in cities if counts[city] < LAST_WEEK_CITY_LIMIT]
+        if not wanted:
+            return
+        query = supabase.table('permits').select(LAST_WEEK_COLUMNS).in_('city', wanted).gte('issue_date', since)
+        if cursor:
+            query = query.or_(f"issue_date.lt.{cursor[0]},and(issue_date.eq.{cursor[0]},id.lt.{cursor[1]})")
+        rows = query.order('issue_date', desc=True).order('id', desc=True).limit(LAST_WEEK_PAGE_SIZE).execute().data or []
+        yield from rows
+        if len(rows) < LAST_WEEK_PAGE_SIZE:
+            return
+        cursor = (rows[-1]['issue_date'], rows[-1]['id'])
+
+def _csv_recent(city):
+    """Newest non-empty leads CSV of a city, geocoded from the cache in one batch"""
+    for date_folder, entry in leads_manifest.dates(city):
+        if not entry['rows']:
+            continue
+        try:
+            rows = list(iter_leads_rows(leads_manifest, leads_history, city, date_folder, entry))
+        except Exception as e:
+            print(f"Error reading {leads_manifest.full_path(entry)}: {e}")
+            continue
+        if not rows:
+            continue
+
+        permit_rows = [permit_row for permit_row in (csv_permit_row(row, city) for row in rows) if permit_row]
+        # One batched cache lookup for the whole file instead of one per row.
+        # Coordinates reach Supabase through the geocode worker, not from here.
+        coords = geocoder.resolve_many([permit_row['address'] for permit_row in permit_rows], cache_city(city))
+        permits = []
+        for permit_row in permit_rows:
+            permit_row['lat'], permit_row['lng'] = coords.get(permit_row['address'], (None, None))
+            permit = _last_week_permit(permit_row, city)
+            permit['date'] = permit['date'] or date_folder
+            permits.append(permit)
+        return permits
+    return []
+
+def _iter_last_week(cities, source, summary):
+    """
+    Yield /last-week permits for all cities, newest first per source
+
+    Supabase answers every city in one paginated query; cities it has
+    nothing for fall back to the local store (one limited query each),
+    then to their newest CSV. Counts and sources end up in `summary`.
+    """
+    cutoff_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    counts = summary['cities']
+    sources_used = set()
+
+    def take(rows, source_name):
+        for row in rows:
+            city = row['city']
+            if counts[city] >= LAST_WEEK_CITY_LIMIT:
+                continue
+            counts[city] += 1
+            sources_used.add(source_name)
+            yield row
+            if all(count >= LAST_WEEK_CITY_LIMIT for count in counts.values()):
+                return  # Every city is full - don't fetch further pages
+
+    # Try Supabase first if available
+    if supabase and source == 'supabase':
         try:
-            result = supabase.table('geocode_cache').select('lat, lng').eq('address', address).eq('city', city).execute()
-            if result.data and len(result.data) > 0:
-                return result.data[0]['lat'], result.data[0]['lng']
+            supabase_rows = (_last_week_permit(row, row['city']) for row in _supabase_recent(cities, cutoff_date, counts))
+            yield from take(supabase_rows, 'supabase')
         except Exception as e:
-            print(f"Supabase cache read error: {e}")
+            print(f"Supabase error for {','.join(cities)}: {e}")  # Fall back to the local store / CSV
 
-    return None, None
+    # The response is already streaming, so a failing fallback is reported in
+    # the summary instead of cutting the body short
+    def failed(stage, error):
+        print(f"Error in last-week ({stage}): {error}")
+        summary.setdefault('errors', []).append(f"{stage}: {error}")
+
+    # Then the local permit store (same rows, no network round-trip)
+    if source in ('supabase', 'local'):
+        for city in [city for city in cities if not counts[city]]:
+            try:
+                store_rows = permit_store.recent(city, since=cutoff_date, limit=LAST_WEEK_CITY_LIMIT)
+                yield from take((_last_week_permit(row, city) for row in store_rows), 'local')
+            except Exception as e:
+                failed(f'local store {city}', e)
+
+    # Fall back to CSV files if no Supabase data
+    for city in cities:
+        if not counts[city]:
+            try:
+                yield from take(_csv_recent(city), 'csv')
+            except Exception as e:
+                failed(f'csv {city}', e)
+    try:
+        geocoder.flush()
+    except Exception as e:
+        failed('geocode cache flush', e)
+
+    summary['total_count'] = sum(counts.values())
+    summary['source'] = ','.join(sorted(sources_used)) or 'none'
 
 @app.route('/last-week', methods=['GET'])
 def last_week():
-    """Return permits from Supabase (primary) or CSV files (fallback)"""
+    """Stream permits from Supabase (primary), the local permit store or CSV files (fallbacks)
+
+    ?source=local skips Supabase and answers from the local store.
+    ?format=ndjson (or Accept: application/x-ndjson) streams one permit per
+    line followed by a {"summary": ...} line; the default is one JSON object
+    {"all_permits": [...], "<city>": {"count": n}, "total_count", "source"}
+    written out as rows arrive. Every permit carries its city. Fallbacks
+    that failed after the response started are listed under "errors".
+    """
     try:
         cities_param = request.args.get('cities', 'austin')
-        cities = cities_param.split(',') if cities_param else ['austin']
-        use_supabase = request.args.get('source', 'supabase') == 'supabase'
-        
-        result = {}
-        total_permits = []
-        
-        for city in cities:
-            city = city.strip().lower()
-            city_permits = []
-            
-            # Try Supabase first if available
-            if supabase and use_supabase:
-                try:
-                    # Get permits from last 30 days for this city
-                    from datetime import datetime, timedelta
-                    cutoff_date = (datetime.now() - timedelta(days=30)).isoformat()
-                    
-                    db_result = supabase.table('permits').select('*').eq('city', city).gte('issue_date', cutoff_date).order('issue_date', desc=True).limit(500).execute()
-                    
-                    if db_result.data:
-                        for row in db_result.data:
-                            permit = {
-                                'address': row.get('address', 'Unknown Address'),
-                                'description': f"{row.get('permit_type', '')} - {row.get('description', '')}",
-                                'date': row.get('issue_date', ''),
-                                'type': row.get('permit_type', 'Permit'),
-                                'permit_number': row.get('permit_number', ''),
-                                'value': row.get('permit_value', ''),
-                                'lat': row.get('lat'),
-                                'lng': row.get('lng')
-                            }
-                            city_permits.append(permit)
-                        print(f"Loaded {len(city_permits)} permits for {city} from Supabase")
-                except Exception as e:
-                    print(f"Supabase error for {city}: {e}")
-                    city_permits = []  # Fall back to CSV
-            
-            # Fall back to CSV files if no Supabase data
-            if not city_permits:
-                leads_dir = 'leads'
-                city_dir = os.path.join(leads_dir, city)
-                if os.path.exists(city_dir):
-                    date_folders = sorted([d for d in os.listdir(city_dir) if os.path.isdir(os.path.join(city_dir, d))], reverse=True)
-                    
-                    for date_folder in date_folders:
-                        date_path = os.path.join(city_dir, date_folder)
-                        csv_files = [f for f in os.listdir(date_path) if f.endswith('.csv')]
-                        for csv_file in csv_files:
-                            csv_path = os.path.join(date_path, csv_file)
-                            try:
-                                with open(csv_path, 'r', encoding='utf-8') as f:
-                                    reader = csv.DictReader(f)
-                                    for row in reader:
-                                        address = row.get('address', 'Unknown Address')
-                                        
-                                        city_name = city.replace('_', ' ').title()
-                                        lat, lng = geocode_address(address, f"{city_name}, USA")
-                                        
-                                        permit = {
-                                            'address': address,
-                                            'description': row.get('permit_type', '') + ' - ' + row.get('description', ''),
-                                            'date': row.get('issue_date', row.get('date', date_folder)),
-                                            'type': row.get('permit_type', 'Permit'),
-                                            'permit_number': row.get('permit_number', ''),
-                                            'value': row.get('permit_value', row.get('estimated_cost', '')),
-                                            'lat': lat,
-                                            'lng': lng
-                                        }
-                                        city_permits.append(permit)
-                                        
-                                        # Also save to Supabase for next time
-                                        if supabase and lat and lng:
-                                            try:
-                                                supabase.table('permits').upsert({
-                                                    'permit_number': permit['permit_number'] or f"{city}_{address[:50]}",
-                                                    'address': address,
-                                                    'city': city,
-                                                    'permit_type': row.get('permit_type', 'Permit'),
-                                                    'description': row.get('description', ''),
-                                                    'issue_date': permit['date'],
-                                                    'permit_value': permit['value'],
-                                                    'lat': lat,
-                                                    'lng': lng
-                                                }, on_conflict='permit_number').execute()
-                                            except Exception as e:
-                                                pass  # Silent fail for duplicate inserts
-                            except Exception as e:
-                                print(f"Error reading {csv_path}: {e}")
-                        
-                        if city_permits:
-                            break
-            
-            result[city] = {
-                'count': len(city_permits),
-                'permits': city_permits
-            }
-            total_permits.extend(city_permits)
-        
-        result['total_count'] = len(total_permits)
-        result['all_permits'] = total_permits
-        result['source'] = 'supabase' if (supabase and use_supabase) else 'csv'
-        
-        return jsonify(result), 200
-    
+        cities = [city.strip().lower() for city in (cities_param or 'austin').split(',') if city.strip()] or ['austin']
+        cities = list(dict.fromkeys(cities))
+        source = request.args.get('source', 'supabase')
+        ndjson = request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+        summary = {'cities': {city: 0 for city in cities}}
+        permits = _iter_last_week(cities, source, summary)
+
+        def generate_ndjson():
+            for permit in permits:
+                yield json.dumps(permit) + '\n'
+            yield json.dumps({'summary': summary}) + '\n'
+
+        def generate_json():
+            yield '{"all_permits": ['
+            separator = ''
+            for permit in permits:
+                yield separator + json.dumps(permit)
+                separator = ','
+            yield '],'
+            for city, count in summary['cities'].items():
+                yield f'{json.dumps(city)}: {{"count": {count}}},'
+            if summary.get('errors'):
+                yield f'"errors": {json.dumps(summary["errors"])},'
+            yield f'"total_count": {summary["total_count"]}, "source": {json.dumps(summary["source"])}}}'
+
+        if ndjson:
+            return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+        return Response(stream_with_context(generate_json()), mimetype='application/json')
+
     except Exception as e:
         print(f"Error in last-week: {e}")
         return jsonify({'error': str(e)}), 500
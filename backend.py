@@ -15,6 +15,8 @@ from sendgrid.helpers.mail import Mail, Email, To, Content
 import firebase_admin
 from firebase_admin import credentials, firestore
 import warnings
+from leads_manifest import LeadsManifest
+from leads_history import LeadsHistory, iter_leads_rows
 
 # Suppress warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -43,6 +45,8 @@ db = firestore.client()
 
 # Cities list - add new ones here
 CITIES = ['nashville', 'chattanooga', 'austin', 'sanantonio', 'houston', 'charlotte', 'phoenix', 'dallas', 'raleigh']  # expand forever
+leads_manifest = LeadsManifest('../leads')
+leads_history = LeadsHistory()
 
 # Create folders
 os.makedirs('../Clients Subs/cities', exist_ok=True)
@@ -701,14 +705,14 @@ ADMIN_DASHBOARD_TEMPLATE = '''
                 <div class="stat-label">Total Leads Scraped</div>
             </div>
             <div class="stat-card">
-                <div class="stat-number">{{ all_leads|length }}</div>
+                <div class="stat-number">{{ days_of_data }}</div>
                 <div class="stat-label">Days of Data</div>
             </div>
             <div class="stat-card">
                 <div class="stat-number">
                     {% set active_cities = 0 %}
                     {% for city, data in cities_data.items() %}
-                        {% if data.leads %}
+                        {% if data.count %}
                             {% set active_cities = active_cities + 1 %}
                         {% endif %}
                     {% endfor %}
@@ -725,7 +729,7 @@ ADMIN_DASHBOARD_TEMPLATE = '''
                 <div class="city-card">
                     <div class="city-header">{{ city.title() }}</div>
                     <div class="city-stats">
-                        <span>{{ data.leads|length }} leads</span>
+                        <span>{{ data.count }} leads</span>
                         <span>{{ data.files|length }} files</span>
                     </div>
                     <div class="city-files">
@@ -748,8 +752,8 @@ ADMIN_DASHBOARD_TEMPLATE = '''
                 <div class="activity-item">
                     <span class="activity-date">{{ date }}</span>
                     <div class="activity-cities">
-                        {% for city, leads in cities.items() %}
-                        <span class="activity-city">{{ city.title() }} ({{ leads|length }})</span>
+                        {% for city, count in cities.items() %}
+                        <span class="activity-city">{{ city.title() }} ({{ count }})</span>
                         {% endfor %}
                         {% if not cities %}
                         <span style="color: #64748b; font-style: italic;">No activity</span>
@@ -762,7 +766,7 @@ ADMIN_DASHBOARD_TEMPLATE = '''
         
         {% if all_leads %}
         <div class="section">
-            <div class="section-header">📋 All Leads by Date</div>
+            <div class="section-header">📋 Leads by Date (Last 7 Days)</div>
             {% for date, cities in all_leads.items() %}
             <div style="margin-bottom: 30px;">
                 <h3 style="padding: 15px 20px; background: #f8fafc; margin: 0; border-bottom: 1px solid #e2e8f0;">{{ date }}</h3>
@@ -1134,51 +1138,42 @@ def admin_dashboard():
     if admin_secret != ADMIN_SECRET:
         return render_template_string(ADMIN_LOGIN_TEMPLATE)
     
-    # Get all CSV files from all cities
+    # Counts come from the leads manifest; only the last 7 days of CSVs are read
+    recent_dates = []
+    for i in range(7):
+        date = (datetime.date.today() - datetime.timedelta(days=i)).isoformat()
+        recent_dates.append(date)
+
+    manifest = leads_manifest.snapshot()
     all_leads = {}
+    lead_counts = {}
     total_leads = 0
     cities_data = {}
-    
+
     for city in CITIES:
-        city_path = f'../leads/{city}'
-        if os.path.exists(city_path):
-            # Look for all date directories
-            date_dirs = [d for d in os.listdir(city_path) if os.path.isdir(os.path.join(city_path, d)) and d.startswith('2025-')]
-            csv_files = []
-            for date_dir in sorted(date_dirs, reverse=True):
-                dir_path = os.path.join(city_path, date_dir)
-                dir_files = [os.path.join(date_dir, f) for f in os.listdir(dir_path) if f.endswith('.csv')]
-                csv_files.extend(dir_files)
-            cities_data[city] = {'files': csv_files, 'leads': []}
-            
-            for csv_file in sorted(csv_files, reverse=True):  # Most recent first
-                file_path = os.path.join(city_path, csv_file)
+        city_dates = manifest.get(city)
+        if city_dates is None:
+            continue
+        csv_files = [os.path.relpath(entry['path'], city) for _, entry in sorted(city_dates.items(), reverse=True)]
+        city_total = sum(entry['rows'] for entry in city_dates.values())
+        cities_data[city] = {'files': csv_files, 'count': city_total}
+        total_leads += city_total
+
+        for date, entry in city_dates.items():
+            lead_counts.setdefault(date, {})[city] = entry['rows']
+            if date in recent_dates and entry['rows']:
                 try:
-                    df = pd.read_csv(file_path)
-                    leads = df.to_dict('records')
-                    cities_data[city]['leads'].extend(leads)
-                    total_leads += len(leads)
-                    
-                    # Group by date
-                    date = csv_file.split('/')[0]  # Extract date from directory name
-                    if date not in all_leads:
-                        all_leads[date] = {}
-                    all_leads[date][city] = leads
-                    
+                    all_leads.setdefault(date, {})[city] = list(iter_leads_rows(leads_manifest, leads_history, city, date, entry))
                 except Exception as e:
-                    print(f'Error reading {file_path}: {e}')
-    
-    # Get recent activity (last 7 days)
-    recent_dates = []
-    for i in range(7):
-        date = (datetime.date.today() - datetime.timedelta(days=i)).isoformat()
-        recent_dates.append(date)
-    
-    recent_activity = {date: all_leads.get(date, {}) for date in recent_dates}
+                    print(f'Error reading {entry["path"]}: {e}')
+
+    all_leads = dict(sorted(all_leads.items(), reverse=True))
+    recent_activity = {date: lead_counts.get(date, {}) for date in recent_dates}
     
     return render_template_string(ADMIN_DASHBOARD_TEMPLATE,
                                 cities_data=cities_data,
                                 all_leads=all_leads,
+                                days_of_data=len(lead_counts),
                                 total_leads=total_leads,
                                 recent_activity=recent_activity,
                                 cities=CITIES)
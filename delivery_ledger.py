@@ -0,0 +1,256 @@
+"""
+Durable ledger of the daily leads emails
+
+Every (digest date, subscriber email, city) gets a row before anything is
+sent, and a sender leases rows the same way the upload outbox does:
+claimed rows are 'sending' until SendGrid answers, then 'sent' (with the
+request's X-Message-Id) or back to 'pending' with a backoff. A rerun of
+send_daily_leads - after a deploy, a worker recycle, or from a second
+worker's scheduler - only picks up what isn't sent yet, so nobody gets
+today's email twice and nobody is skipped. Rows that keep failing, or
+that SendGrid rejects outright, end up 'failed' for inspection.
+
+The one gap is a crash between SendGrid accepting a request and the
+ledger recording it: those rows are retried once their lease runs out.
+
+Each sender run is recorded with its throughput and request latencies.
+
+The ledger also keeps each subscriber's delivery cursor per city: the
+highest permit id (see permit_first_seen in permit_store.py) their last
+email covered. A delivery row carries the cursor it advances to, and
+marking it sent moves the cursor in the same transaction.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+DELIVERY_LEDGER_PATH = os.getenv('DELIVERY_LEDGER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'delivery_ledger.db'))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv('DELIVERY_MAX_ATTEMPTS', 5))
+DELIVERY_LEASE_SECONDS = 300    # A claimed row returns to the queue if its sender dies
+DELIVERY_KEEP_DAYS = 60
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    digest_date TEXT NOT NULL,
+    email TEXT NOT NULL,
+    city TEXT NOT NULL,
+    digest TEXT NOT NULL DEFAULT '',    -- Key of the email this recipient gets (filter signature and cursor range)
+    cursor_to INTEGER,                  -- Their delivery cursor once this is sent
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    message_id TEXT,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (digest_date, email, city)
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_due ON deliveries (digest_date, status, available_at);
+CREATE TABLE IF NOT EXISTS cursors (
+    email TEXT NOT NULL,
+    city TEXT NOT NULL,
+    last_seen_id INTEGER NOT NULL,      -- Newest permit id covered by their last delivered email
+    digest_date TEXT NOT NULL,          -- Date of that email
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (email, city)
+);
+CREATE TABLE IF NOT EXISTS delivery_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest_date TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    stats TEXT
+);
+"""
+
+
+def today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+class DeliveryLedger:
+    """SQLite record of who has been sent which day's digest"""
+
+    def __init__(self, path=DELIVERY_LEDGER_PATH, max_attempts=DELIVERY_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Serialized write transaction (BEGIN IMMEDIATE also locks out other processes)"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def plan(self, digest_date, recipients):
+        """Add [(email, city, digest, cursor_to)] to a day's deliveries; recipients already there keep their status"""
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """INSERT OR IGNORE INTO deliveries (digest_date, email, city, digest, cursor_to, available_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [(digest_date, email, city, digest, cursor_to, now, now) for email, city, digest, cursor_to in recipients]
+            )
+            return conn.total_changes - before
+
+    def claim(self, digest_date, limit, lease_seconds=DELIVERY_LEASE_SECONDS):
+        """
+        Lease up to `limit` due recipients: [(email, city, digest, attempts)]
+
+        Due means pending and past its backoff, or 'sending' with an
+        expired lease (its sender died).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            claimed = conn.execute(
+                """SELECT email, city, digest, attempts FROM deliveries
+                   WHERE digest_date = ? AND status IN (?, ?) AND available_at <= ?
+                   ORDER BY city, email LIMIT ?""",
+                (digest_date, STATUS_PENDING, STATUS_SENDING, now, limit)
+            ).fetchall()
+            conn.executemany(
+                """UPDATE deliveries SET status = ?, available_at = ?, updated_at = ?
+                   WHERE digest_date = ? AND email = ? AND city = ?""",
+                [(STATUS_SENDING, now + lease_seconds, now, digest_date, email, city) for email, city, _, _ in claimed]
+            )
+        return claimed
+
+    def mark_sent(self, digest_date, city, emails, message_id=None):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                """UPDATE deliveries SET status = ?, attempts = attempts + 1, message_id = ?, last_error = NULL,
+                       updated_at = ? WHERE digest_date = ? AND email = ? AND city = ?""",
+                [(STATUS_SENT, message_id, now, digest_date, email, city) for email in emails]
+            )
+            # Cursors only ever move forward (a resent older digest can't rewind them)
+            conn.executemany(
+                """INSERT INTO cursors (email, city, last_seen_id, digest_date, updated_at)
+                   SELECT email, city, cursor_to, digest_date, ? FROM deliveries
+                   WHERE digest_date = ? AND email = ? AND city = ? AND cursor_to IS NOT NULL
+                   ON CONFLICT (email, city) DO UPDATE SET
+                       last_seen_id = MAX(cursors.last_seen_id, excluded.last_seen_id),
+                       digest_date = MAX(cursors.digest_date, excluded.digest_date),
+                       updated_at = excluded.updated_at""",
+                [(now, digest_date, email, city) for email in emails]
+            )
+
+    def cursors(self):
+        """{(email, city): last_seen_id} of every subscriber that has had an email"""
+        with self._lock:
+            return {(email, city): last_seen_id for email, city, last_seen_id in self._conn.execute(
+                'SELECT email, city, last_seen_id FROM cursors'
+            ).fetchall()}
+
+    def mark_failed(self, digest_date, city, emails, error, delay=None):
+        """Back to pending after `delay` seconds, or failed for good (delay None / out of attempts)"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                """UPDATE deliveries SET
+                       status = CASE WHEN ? IS NULL OR attempts + 1 >= ? THEN ? ELSE ? END,
+                       attempts = attempts + 1, available_at = ?, last_error = ?, updated_at = ?
+                   WHERE digest_date = ? AND email = ? AND city = ?""",
+                [(delay, self.max_attempts, STATUS_FAILED, STATUS_PENDING, now + (delay or 0), str(error)[:500], now,
+                  digest_date, email, city) for email in emails]
+            )
+
+    def next_retry_in(self, digest_date):
+        """Seconds until the next pending/leased row is due, or None if nothing is left to send"""
+        with self._lock:
+            due = self._conn.execute(
+                'SELECT MIN(available_at) FROM deliveries WHERE digest_date = ? AND status IN (?, ?)',
+                (digest_date, STATUS_PENDING, STATUS_SENDING)
+            ).fetchone()[0]
+        return None if due is None else max(0.0, due - time.time())
+
+    def pending_digests(self, digest_date):
+        """(city, digest) of the emails that still have recipients waiting"""
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(
+                'SELECT DISTINCT city, digest FROM deliveries WHERE digest_date = ? AND status IN (?, ?)',
+                (digest_date, STATUS_PENDING, STATUS_SENDING)
+            ).fetchall()]
+
+    def undelivered(self, digest_date):
+        """How many of a day's recipients are still waiting (pending or in flight)"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM deliveries WHERE digest_date = ? AND status IN (?, ?)',
+                (digest_date, STATUS_PENDING, STATUS_SENDING)
+            ).fetchone()[0]
+
+    def retry_failed(self, digest_date):
+        """Give a day's failed recipients another round of attempts"""
+        with self._transaction() as conn:
+            return conn.execute(
+                'UPDATE deliveries SET status = ?, attempts = 0, available_at = ? WHERE digest_date = ? AND status = ?',
+                (STATUS_PENDING, time.time(), digest_date, STATUS_FAILED)
+            ).rowcount
+
+    def start_run(self, digest_date):
+        with self._transaction() as conn:
+            return conn.execute(
+                'INSERT INTO delivery_runs (digest_date, started_at) VALUES (?, ?)',
+                (digest_date, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            ).lastrowid
+
+    def finish_run(self, run_id, stats):
+        with self._transaction() as conn:
+            conn.execute('UPDATE delivery_runs SET finished_at = ?, stats = ? WHERE id = ?',
+                         (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), json.dumps(stats), run_id))
+
+    def prune(self, keep_days=DELIVERY_KEEP_DAYS):
+        """Forget deliveries and runs older than keep_days"""
+        cutoff = datetime.fromtimestamp(time.time() - keep_days * 86400).strftime('%Y-%m-%d')
+        with self._transaction() as conn:
+            removed = conn.execute('DELETE FROM deliveries WHERE digest_date < ?', (cutoff,)).rowcount
+            conn.execute('DELETE FROM delivery_runs WHERE digest_date < ?', (cutoff,))
+        return removed
+
+    def status(self, digest_date=None):
+        """Per-status counts and the runs of one digest date (default: today)"""
+        digest_date = digest_date or today()
+        with self._lock:
+            counts = dict(self._conn.execute(
+                'SELECT status, COUNT(*) FROM deliveries WHERE digest_date = ? GROUP BY status', (digest_date,)
+            ).fetchall())
+            errors = self._conn.execute(
+                """SELECT email, city, last_error FROM deliveries WHERE digest_date = ? AND status = ?
+                   ORDER BY updated_at DESC LIMIT 20""",
+                (digest_date, STATUS_FAILED)
+            ).fetchall()
+            runs = self._conn.execute(
+                'SELECT id, started_at, finished_at, stats FROM delivery_runs WHERE digest_date = ? ORDER BY id',
+                (digest_date,)
+            ).fetchall()
+        return {
+            'digest_date': digest_date,
+            'recipients': sum(counts.values()),
+            'by_status': counts,
+            'failed': [{'email': email, 'city': city, 'error': error} for email, city, error in errors],
+            'runs': [{'id': run_id, 'started_at': started, 'finished_at': finished,
+                      'stats': json.loads(stats) if stats else None}
+                     for run_id, started, finished, stats in runs],
+        }
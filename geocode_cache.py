@@ -0,0 +1,196 @@
+"""
+Batched, multi-tier geocode cache
+
+/last-week used to look every CSV row up in Supabase's geocode_cache one
+at a time (and upsert it back one at a time). GeocodeResolver answers a
+whole batch of addresses per call, from three tiers:
+
+    1. in-process LRU        (also remembers misses for a while)
+    2. data/geocode_cache.db (local SQLite copy of everything seen)
+    3. Supabase geocode_cache, one `in` query per GEOCODE_QUERY_CHUNK addresses
+
+Hits from a lower tier are copied into the tiers above it. New coordinates
+go through store() and are written to Supabase in one bulk upsert on
+flush().
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'geocode_cache.db'))
+GEOCODE_LRU_SIZE = int(os.getenv('GEOCODE_LRU_SIZE', 50000))
+GEOCODE_MISS_TTL = 3600          # Seconds before an uncached address is asked for again
+GEOCODE_QUERY_CHUNK = 100        # Addresses per Supabase `in` query (keeps the URL short)
+GEOCODE_UPSERT_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode_cache (
+    address TEXT NOT NULL,
+    city TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (address, city)
+) WITHOUT ROWID;
+"""
+
+MISS = (None, None)
+
+
+def cache_city(city):
+    """'austin' -> 'Austin, USA', the city value geocode_cache rows are keyed by"""
+    return f"{city.replace('_', ' ').title()}, USA"
+
+
+class GeocodeResolver:
+    """Resolve (address, city) -> (lat, lng) in bulk through LRU, disk and Supabase tiers"""
+
+    def __init__(self, supabase=None, path=GEOCODE_CACHE_PATH, lru_size=GEOCODE_LRU_SIZE, miss_ttl=GEOCODE_MISS_TTL):
+        self.supabase = supabase
+        self.lru_size = lru_size
+        self.miss_ttl = miss_ttl
+        self.stats = {'memory': 0, 'disk': 0, 'supabase': 0, 'miss': 0, 'queries': 0}
+        self._lru = OrderedDict()  # (address, city) -> ((lat, lng), expires_at or None)
+        self._pending = {}         # (address, city) -> (lat, lng) waiting for flush()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def _remember(self, key, coords, miss=False):
+        self._lru[key] = (coords, time.monotonic() + self.miss_ttl if miss else None)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _from_memory(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                cached = self._lru.get(key)
+                if cached is None:
+                    continue
+                coords, expires_at = cached
+                if expires_at is not None and expires_at < now:
+                    del self._lru[key]
+                    continue
+                self._lru.move_to_end(key)
+                found[key] = coords
+        return found
+
+    def _from_disk(self, city, addresses):
+        found = {}
+        with self._lock:
+            for i in range(0, len(addresses), 900):
+                chunk = addresses[i:i + 900]
+                placeholders = ','.join('?' * len(chunk))
+                for address, lat, lng in self._conn.execute(
+                    f'SELECT address, lat, lng FROM geocode_cache WHERE city = ? AND address IN ({placeholders})',
+                    [city] + chunk
+                ):
+                    found[(address, city)] = (lat, lng)
+        return found
+
+    def _from_supabase(self, city, addresses):
+        found = {}
+        if not self.supabase:
+            return found
+        # Quotes/backslashes can't be expressed in a PostgREST `in` list
+        addresses = [a for a in addresses if '"' not in a and '\\' not in a]
+        for i in range(0, len(addresses), GEOCODE_QUERY_CHUNK):
+            chunk = addresses[i:i + GEOCODE_QUERY_CHUNK]
+            try:
+                result = self.supabase.table('geocode_cache').select('address, lat, lng') \
+                    .eq('city', city).in_('address', chunk).execute()
+                self.stats['queries'] += 1
+            except Exception as e:
+                print(f"Supabase cache read error: {e}")
+                break
+            for row in result.data or []:
+                if row.get('lat') is not None and row.get('lng') is not None:
+                    found[(row['address'], city)] = (row['lat'], row['lng'])
+        return found
+
+    def _save_to_disk(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO geocode_cache (address, city, lat, lng, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(address, city, lat, lng, now) for (address, city), (lat, lng) in items.items()]
+            )
+
+    def resolve_many(self, addresses, city):
+        """
+        Look up many addresses of one city at once
+
+        Returns {address: (lat, lng)}, with (None, None) for addresses no
+        tier knows. Each tier is asked only for what the ones above missed.
+        """
+        keys = list(dict.fromkeys((address, city) for address in addresses if address and address != 'Unknown Address'))
+        results = self._from_memory(keys)
+        self.stats['memory'] += len(results)
+
+        missing = [address for address, _ in keys if (address, city) not in results]
+        if missing:
+            on_disk = self._from_disk(city, missing)
+            self.stats['disk'] += len(on_disk)
+            results.update(on_disk)
+            missing = [address for address in missing if (address, city) not in on_disk]
+
+            remote = self._from_supabase(city, missing) if missing else {}
+            self.stats['supabase'] += len(remote)
+            results.update(remote)
+            self._save_to_disk(remote)
+
+            with self._lock:
+                for key, coords in on_disk.items():
+                    self._remember(key, coords)
+                for key, coords in remote.items():
+                    self._remember(key, coords)
+                for address in missing:
+                    if (address, city) not in remote:
+                        self._remember((address, city), MISS, miss=True)
+                        self.stats['miss'] += 1
+
+        return {address: results.get((address, city), MISS) for address in addresses}
+
+    def resolve(self, address, city):
+        return self.resolve_many([address], city).get(address, MISS)
+
+    def store(self, address, city, lat, lng):
+        """Remember new coordinates; they reach Supabase on the next flush()"""
+        key = (address, city)
+        with self._lock:
+            self._remember(key, (lat, lng))
+            self._pending[key] = (lat, lng)
+
+    def flush(self):
+        """Write stored coordinates to disk and to Supabase in bulk; returns how many were written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        self._save_to_disk(pending)
+        if self.supabase:
+            rows = [{'address': address, 'city': city, 'lat': lat, 'lng': lng}
+                    for (address, city), (lat, lng) in pending.items()]
+            for i in range(0, len(rows), GEOCODE_UPSERT_BATCH):
+                try:
+                    self.supabase.table('geocode_cache').upsert(rows[i:i + GEOCODE_UPSERT_BATCH],
+                                                                on_conflict='address,city').execute()
+                except Exception as e:
+                    print(f"Supabase cache write error: {e}")
+                    # Keep them for the next flush
+                    with self._lock:
+                        for row in rows[i:]:
+                            self._pending.setdefault((row['address'], row['city']), (row['lat'], row['lng']))
+                    break
+        return len(pending)
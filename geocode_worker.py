@@ -0,0 +1,477 @@
+"""
+Background geocoding of permits that have no lat/lng
+
+geocode_address() only ever reads the cache, so most permits never get
+coordinates. After each scraper run GeocodeWorker goes through every
+city's permits without coordinates in the local permit store:
+
+    dedupe addresses -> geocode cache tiers (geocode_cache.py)
+                     -> misses to the backend, behind a fixed-rate limiter
+                        and a daily request quota
+    -> geocode_cache, permit store and Supabase permits updated in bulk
+
+Backends are picked with GEOCODER_BACKEND:
+- census:    US Census Bureau one-line address geocoder (free, no key)
+- nominatim: OpenStreetMap Nominatim, or any server speaking its /search API
+- local:     the stand-in server below, for offline runs and benchmarks
+
+    python geocode_worker.py standin [--port 8089]      # fake Nominatim server
+    python geocode_worker.py bench [--count 500] [--quota 300] [--rate 50] [--concurrency 4]
+"""
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from geocode_cache import cache_city
+from permit_pipeline import PERMITS_CONFLICT_KEY, city_key
+from scrapers.utils import HostRateLimiter, get_session
+
+GEOCODER_BACKEND = os.getenv('GEOCODER_BACKEND', 'census')
+GEOCODER_URL = os.getenv('GEOCODER_URL')                    # Overrides the backend's default endpoint
+GEOCODER_RATE = float(os.getenv('GEOCODER_RATE', 1))        # Requests per second, never exceeded
+GEOCODER_DAILY_QUOTA = int(os.getenv('GEOCODER_DAILY_QUOTA', 2500))
+GEOCODER_CONCURRENCY = int(os.getenv('GEOCODER_CONCURRENCY', 1))  # Requests in flight at once
+GEOCODER_BATCH = 200            # Permits taken from the store per round
+GEOCODER_RETRY_DAYS = 30        # Addresses the backend couldn't find are retried after this long
+GEOCODER_STATE_PATH = os.getenv('GEOCODER_STATE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'geocode_worker.db'))
+STANDIN_PORT = int(os.getenv('GEOCODER_STANDIN_PORT', 8089))
+
+# Columns of a permits upload row (to_supabase_row), so the fingerprint of a
+# geocoded row matches what the next scrape produces
+UPLOAD_COLUMNS = ('permit_number', 'address', 'city', 'permit_type', 'description', 'issue_date',
+                  'estimated_cost', 'status', 'contractor', 'lat', 'lng')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota (
+    day TEXT PRIMARY KEY,
+    used INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS not_found (
+    address TEXT NOT NULL,
+    city TEXT NOT NULL,
+    attempted_at TEXT NOT NULL,
+    PRIMARY KEY (address, city)
+) WITHOUT ROWID;
+"""
+
+
+class BackendError(Exception):
+    """The backend couldn't answer (throttled, down) - the address is tried again later"""
+
+
+class HTTPGeocoder:
+    """Base for backends that answer one address per GET request"""
+    name = None
+    default_url = None
+
+    def __init__(self, url=None, rate=GEOCODER_RATE, timeout=20):
+        self.url = (url or self.default_url).rstrip('/')
+        self.timeout = timeout
+        # Fixed ceiling: the limiter may slow down on 429s but never speeds up past `rate`
+        self.limiter = HostRateLimiter(self.url, rate=rate, min_rate=rate / 8, max_rate=rate)
+
+    def _get(self, path, params):
+        self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = get_session(self.url).get(self.url + path, params=params, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self.limiter.record(None)
+            raise BackendError(str(e))
+        self.limiter.record(response.status_code, time.monotonic() - started, response.headers.get('Retry-After'))
+        if response.status_code != 200:
+            raise BackendError(f"HTTP {response.status_code}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise BackendError(f"Bad JSON: {e}")
+
+    def geocode(self, query):
+        """One-line address -> (lat, lng), or None if the backend doesn't know it"""
+        raise NotImplementedError
+
+
+class CensusGeocoder(HTTPGeocoder):
+    name = 'census'
+    default_url = 'https://geocoding.geo.census.gov/geocoder'
+
+    def geocode(self, query):
+        data = self._get('/locations/onelineaddress',
+                         {'address': query, 'benchmark': 'Public_AR_Current', 'format': 'json'})
+        matches = data.get('result', {}).get('addressMatches') or []
+        if not matches:
+            return None
+        coordinates = matches[0]['coordinates']
+        return float(coordinates['y']), float(coordinates['x'])
+
+
+class NominatimGeocoder(HTTPGeocoder):
+    name = 'nominatim'
+    default_url = 'https://nominatim.openstreetmap.org'
+
+    def geocode(self, query):
+        data = self._get('/search', {'q': query, 'format': 'jsonv2', 'limit': 1, 'countrycodes': 'us'})
+        if not data:
+            return None
+        return float(data[0]['lat']), float(data[0]['lon'])
+
+
+class LocalGeocoder(NominatimGeocoder):
+    """Nominatim client pointed at the stand-in server"""
+    name = 'local'
+    default_url = f'http://127.0.0.1:{STANDIN_PORT}'
+
+
+GEOCODER_BACKENDS = {backend.name: backend for backend in (CensusGeocoder, NominatimGeocoder, LocalGeocoder)}
+
+
+def make_backend(name=GEOCODER_BACKEND, url=GEOCODER_URL, rate=GEOCODER_RATE):
+    """Backend instance by name, or None for GEOCODER_BACKEND=none"""
+    if not name or name == 'none':
+        return None
+    if name not in GEOCODER_BACKENDS:
+        raise ValueError(f"Unknown geocoder backend {name!r} (choose from {', '.join(GEOCODER_BACKENDS)})")
+    return GEOCODER_BACKENDS[name](url, rate=rate)
+
+
+class GeocodeWorker:
+    """Resolves missing permit coordinates with a rate-limited, quota-capped backend"""
+
+    def __init__(self, resolver, backend, store=None, outbox=None,
+                 daily_quota=GEOCODER_DAILY_QUOTA, concurrency=GEOCODER_CONCURRENCY, path=GEOCODER_STATE_PATH):
+        self.resolver = resolver
+        self.backend = backend
+        self.store = store
+        self.outbox = outbox
+        self.daily_quota = daily_quota
+        self.concurrency = max(1, concurrency)
+        self.last_run = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    # ---- daily quota / not-found memory ----
+
+    def quota_used(self, day=None):
+        day = day or datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            row = self._conn.execute('SELECT used FROM quota WHERE day = ?', (day,)).fetchone()
+        return row[0] if row else 0
+
+    def quota_left(self):
+        return max(0, self.daily_quota - self.quota_used())
+
+    def _use_quota(self, count):
+        if not count:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO quota (day, used) VALUES (?, ?) ON CONFLICT (day) DO UPDATE SET used = used + excluded.used',
+                (datetime.now().strftime('%Y-%m-%d'), count)
+            )
+
+    def _recently_not_found(self, addresses, city):
+        cutoff = (datetime.now() - timedelta(days=GEOCODER_RETRY_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+        found = set()
+        with self._lock:
+            for i in range(0, len(addresses), 900):
+                chunk = addresses[i:i + 900]
+                placeholders = ','.join('?' * len(chunk))
+                found.update(address for (address,) in self._conn.execute(
+                    f'SELECT address FROM not_found WHERE city = ? AND attempted_at >= ? AND address IN ({placeholders})',
+                    [city, cutoff] + chunk
+                ))
+        return found
+
+    def _record_not_found(self, addresses, city):
+        if not addresses:
+            return
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO not_found (address, city, attempted_at) VALUES (?, ?, ?)',
+                                   [(address, city, now) for address in addresses])
+
+    # ---- geocoding ----
+
+    def resolve_addresses(self, addresses, city, query_suffix=''):
+        """
+        Coordinates for a batch of addresses of one geocode_cache city
+
+        Cache tiers first; misses go to the backend until the daily quota is
+        spent. Returns ({address: (lat, lng)}, stats).
+        """
+        stats = {'addresses': 0, 'cached': 0, 'geocoded': 0, 'not_found': 0, 'errors': 0, 'quota_exhausted': False}
+        addresses = list(dict.fromkeys(a for a in addresses if a and a != 'Unknown Address'))
+        stats['addresses'] = len(addresses)
+        cached = self.resolver.resolve_many(addresses, city)
+        results = {a: coords for a, coords in cached.items() if coords[0] is not None}
+        stats['cached'] = len(results)
+
+        misses = [a for a in addresses if a not in results]
+        skip = self._recently_not_found(misses, city) if misses else set()
+        misses = [a for a in misses if a not in skip]
+        if not self.backend or not misses:
+            return results, stats
+
+        allowance = self.quota_left()
+        if len(misses) > allowance:
+            stats['quota_exhausted'] = True
+            misses = misses[:allowance]
+
+        not_found = []
+        used = 0
+        pending = iter(misses)
+        progress = threading.Lock()
+
+        def failing():
+            return stats['errors'] >= 10 and stats['errors'] > stats['geocoded']
+
+        def lookup():
+            nonlocal used
+            while not self._stop.is_set():
+                with progress:
+                    address = None if failing() else next(pending, None)
+                    if address is None:
+                        return
+                    used += 1
+                try:
+                    coords = self.backend.geocode(f"{address}{query_suffix}")
+                except BackendError:
+                    with progress:
+                        stats['errors'] += 1
+                    continue
+                with progress:
+                    if coords:
+                        results[address] = coords
+                        stats['geocoded'] += 1
+                    else:
+                        not_found.append(address)
+                if coords:
+                    self.resolver.store(address, city, *coords)
+
+        try:
+            # The backend's limiter paces all threads together; more than one
+            # only helps when a request takes longer than 1/rate seconds
+            threads = [threading.Thread(target=lookup, daemon=True) for _ in range(min(self.concurrency, len(misses)))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if failing():
+                print(f"⚠️  Geocoder backend failing ({stats['errors']} errors), stopping this batch")
+        finally:
+            self._use_quota(used)
+            self._record_not_found(not_found, city)
+            stats['not_found'] = len(not_found)
+            self.resolver.flush()
+        return results, stats
+
+    def geocode_city(self, city_name, state=None):
+        """Fill in coordinates for one city's permits in the local store (and queue them for Supabase)"""
+        city = city_key(city_name)
+        suffix = f", {city_name}, {state}" if state else f", {city_name}"
+        totals = {'permits': 0, 'updated': 0, 'cached': 0, 'geocoded': 0, 'not_found': 0, 'errors': 0}
+        skipped = 0  # Rows still without coordinates stay in the queue, page past them
+        while not self._stop.is_set():
+            rows = self.store.missing_coordinates(city, limit=GEOCODER_BATCH, offset=skipped)
+            if not rows:
+                break
+            coords, stats = self.resolve_addresses([row['address'] for row in rows], cache_city(city), suffix)
+            for key in ('cached', 'geocoded', 'not_found', 'errors'):
+                totals[key] += stats[key]
+            totals['permits'] += len(rows)
+
+            updated = []
+            for row in rows:
+                if row['address'] in coords:
+                    row['lat'], row['lng'] = coords[row['address']]
+                    updated.append({column: row.get(column) for column in UPLOAD_COLUMNS})
+            if updated:
+                self.store.set_coordinates(city, [(row['permit_number'], row['lat'], row['lng']) for row in updated])
+                if self.outbox:
+                    self.outbox.append('permits', updated, on_conflict=PERMITS_CONFLICT_KEY)
+                totals['updated'] += len(updated)
+            skipped += len(rows) - len(updated)
+            if stats['quota_exhausted']:
+                break
+        self.last_run[city] = dict(totals, finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        if totals['permits']:
+            print(f"📍 {city_name}: {totals['updated']}/{totals['permits']} permits geocoded "
+                  f"({totals['cached']} cached, {totals['geocoded']} looked up, {totals['not_found']} not found)")
+        return totals
+
+    def run(self, cities, state_for_city=None):
+        """Geocode each (display) city name in turn until done or the quota runs out"""
+        if not self.backend or not self.store:
+            return
+        print(f"📍 Geocoding missing coordinates for {len(cities)} cities ({self.quota_left()} lookups left today)")
+        for city_name in cities:
+            if self._stop.is_set():
+                break
+            try:
+                self.geocode_city(city_name, state_for_city(city_name) if state_for_city else None)
+            except Exception as e:
+                print(f"⚠️  Geocoding {city_name} failed: {e}")
+            if not self.quota_left():
+                print(f"📍 Daily geocoding quota of {self.daily_quota} used up")
+                break
+
+    def start(self, cities, state_for_city=None, on_done=None):
+        """Run in a background thread, then call on_done(cities); returns False if a run is already going"""
+        if self.running():
+            return False
+        self._stop.clear()
+
+        def run():
+            self.run(cities, state_for_city)
+            if on_done:
+                try:
+                    on_done(cities)
+                except Exception as e:
+                    print(f"⚠️  After-geocoding step failed: {e}")
+
+        self._thread = threading.Thread(target=run, name='geocode-worker', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self):
+        return {
+            'backend': self.backend.name if self.backend else None,
+            'running': self.running(),
+            'daily_quota': self.daily_quota,
+            'quota_used_today': self.quota_used(),
+            'cache': dict(self.resolver.stats),
+            'last_run': self.last_run,
+        }
+
+
+# ---- offline stand-in ----
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Answers Nominatim /search requests with made-up but stable coordinates"""
+    server_version = 'GeocodeStandin/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path != '/search':
+            return self._send(404, {'error': 'not found'})
+        query = parse_qs(url.query).get('q', [''])[0]
+
+        with server.lock:
+            server.requests += 1
+            now = time.monotonic()
+            # Same admission rule as a real provider: more than `max_rate` a second gets a 429
+            server.window = [t for t in server.window if now - t < 1.0] + [now]
+            throttled = len(server.window) > server.max_rate
+            if throttled:
+                server.throttled += 1
+        if throttled:
+            return self._send(429, {'error': 'rate limited'}, {'Retry-After': '1'})
+
+        if server.latency:
+            time.sleep(random.uniform(0.5, 1.5) * server.latency)
+        digest = hashlib.sha1(query.lower().encode('utf-8')).digest()
+        if digest[0] < 256 * server.miss_rate:
+            return self._send(200, [])
+        lat = 25 + digest[1] / 255 * 23 + digest[2] / 65025
+        lon = -123 + digest[3] / 255 * 53 + digest[4] / 65025
+        self._send(200, [{'lat': f"{lat:.6f}", 'lon': f"{lon:.6f}", 'display_name': query}])
+
+
+def serve_standin(port=STANDIN_PORT, latency=0.05, miss_rate=0.1, max_rate=50, background=False):
+    """Start the stand-in geocoder (blocking, or in a daemon thread with background=True)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandinHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.window = []
+    server.requests = server.throttled = 0
+    server.latency, server.miss_rate, server.max_rate = latency, miss_rate, max_rate
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        print(f"📍 Geocoder stand-in on http://127.0.0.1:{server.server_address[1]}/search "
+              f"({latency * 1000:.0f} ms, {miss_rate:.0%} misses, {max_rate}/s limit)")
+        server.serve_forever()
+    return server
+
+
+def benchmark(count=500, quota=300, rate=50, concurrency=4, duplicates=0.2, port=0):
+    """Geocode synthetic addresses against the stand-in and report throughput and quota behavior"""
+    import tempfile
+    from geocode_cache import GeocodeResolver
+
+    server = serve_standin(port=port, background=True)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    workdir = tempfile.mkdtemp(prefix='geocode-bench-')
+    resolver = GeocodeResolver(path=os.path.join(workdir, 'cache.db'))
+    worker = GeocodeWorker(resolver, LocalGeocoder(url, rate=rate), daily_quota=quota, concurrency=concurrency,
+                           path=os.path.join(workdir, 'worker.db'))
+
+    unique = max(1, int(count * (1 - duplicates)))
+    addresses = [f"{i % unique + 1} Bench St" for i in range(count)]
+    for label in ('cold', 'warm'):
+        started = time.monotonic()
+        results, stats = worker.resolve_addresses(addresses, 'Bench, USA', ', Austin, TX')
+        elapsed = time.monotonic() - started
+        print(f"{label}: {stats['addresses']} unique addresses in {elapsed:.2f}s "
+              f"({stats['geocoded'] / elapsed if elapsed else 0:.1f} lookups/s) - {stats['cached']} cached, "
+              f"{stats['geocoded']} geocoded, {stats['not_found']} not found, {stats['errors']} errors, "
+              f"quota {worker.quota_used()}/{quota}{' (exhausted)' if stats['quota_exhausted'] else ''}")
+    print(f"stand-in: {server.requests} requests, {server.throttled} throttled")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Geocoder stand-in server and offline benchmark')
+    sub = parser.add_subparsers(dest='command', required=True)
+    standin = sub.add_parser('standin')
+    standin.add_argument('--port', type=int, default=STANDIN_PORT)
+    standin.add_argument('--latency', type=float, default=0.05)
+    standin.add_argument('--miss-rate', type=float, default=0.1)
+    standin.add_argument('--max-rate', type=float, default=50)
+    bench = sub.add_parser('bench')
+    bench.add_argument('--count', type=int, default=500)
+    bench.add_argument('--quota', type=int, default=300)
+    bench.add_argument('--rate', type=float, default=50)
+    bench.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == 'standin':
+        serve_standin(args.port, args.latency, args.miss_rate, args.max_rate)
+    else:
+        benchmark(args.count, args.quota, args.rate, args.concurrency)
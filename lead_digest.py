@@ -0,0 +1,90 @@
+"""
+Per-run cache of the daily email's city digests
+
+send_daily_leads builds one DigestCache per run. Each city's leads are
+loaded and its HTML table rendered once per (city, digest date, filter
+signature), however many subscriber groups need them - a single-city
+email and the all-cities bundle share the same fragment, and the bundle
+is assembled from the 21 cached city fragments instead of re-reading
+every city for every bundle group.
+
+`since` selects the "new since last delivery" leads: an (after, upto)
+range of permit ids from the store's first-seen index. Subscribers whose
+cursors sit at the same place share those results like everyone else.
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime
+
+
+def filter_signature(filters):
+    """Stable short hash of a filter dict ('' for no filters)"""
+    if not filters:
+        return ''
+    payload = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def digest_key(signature, after, upto):
+    """Delivery ledger key of one email's content: filter signature plus cursor range (none before a first email)"""
+    return signature if after is None else f"{signature}|{after}|{upto}"
+
+
+def parse_digest_key(key):
+    """digest_key() -> (signature, since), since being None or (after, upto)"""
+    signature, _, cursor = key.partition('|')
+    if not cursor:
+        return signature, None
+    after, upto = cursor.split('|')
+    return signature, (int(after), int(upto))
+
+
+class DigestCache:
+    """Loads and renders each city's lead table once per (city, date, filters, since)"""
+
+    def __init__(self, load_leads, render, date=None):
+        self.load_leads = load_leads    # (city, filters, since) -> [lead dicts]
+        self.render = render            # [lead dicts] -> HTML table
+        self.date = date or datetime.now().strftime('%Y-%m-%d')
+        self.stats = {'loads': 0, 'renders': 0, 'hits': 0}
+        self._leads = {}
+        self._fragments = {}
+        self._lock = threading.RLock()
+
+    def _key(self, city, filters, since):
+        return city.lower(), self.date, filter_signature(filters), since
+
+    def leads(self, city, filters=None, since=None):
+        key = self._key(city, filters, since)
+        with self._lock:
+            if key in self._leads:
+                self.stats['hits'] += 1
+                return self._leads[key]
+            self.stats['loads'] += 1
+            leads = self._leads[key] = self.load_leads(city, filters, since) or []
+            return leads
+
+    def fragment(self, city, filters=None, since=None):
+        """Rendered lead table of one city, or None if it has no leads"""
+        key = self._key(city, filters, since)
+        with self._lock:
+            if key in self._fragments:
+                self.stats['hits'] += 1
+                return self._fragments[key]
+            leads = self.leads(city, filters, since)
+            if leads:
+                self.stats['renders'] += 1
+            fragment = self._fragments[key] = self.render(leads) if leads else None
+            return fragment
+
+    def bundle(self, cities, filters=None, since=None):
+        """(HTML of the cities with leads, one section each, [those cities])"""
+        sections = []
+        cities_with_data = []
+        for city in cities:
+            fragment = self.fragment(city, filters, since)
+            if fragment:
+                sections.append(f"<h3 style='color: #4a5568; margin: 24px 0 8px;'>{city}</h3>{fragment}")
+                cities_with_data.append(city)
+        return ''.join(sections), cities_with_data
@@ -0,0 +1,160 @@
+"""
+Batched SendGrid delivery for the daily leads emails
+
+Recipients who get identical content (same subject and HTML) share one
+/mail/send request: each one becomes its own personalization, so nobody
+sees the other addresses, and a request carries up to
+SENDGRID_MAX_PERSONALIZATIONS of them. Requests go out over one reused
+API client from a small thread pool (EMAIL_SEND_CONCURRENCY), so a few
+thousand subscribers take a handful of requests instead of one each.
+
+Recipients are leased from the DeliveryLedger (delivery_ledger.py) and
+the outcome of every request is written back to it. Network errors, 429s
+and 5xx responses are retried with exponential backoff; other rejections
+fail their recipients straight away.
+"""
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sendgrid import SendGridAPIClient
+from sendgrid.helpers.mail import Mail, Email, To
+
+SENDGRID_MAX_PERSONALIZATIONS = 1000    # SendGrid's per-request limit
+EMAIL_BATCH_SIZE = min(int(os.getenv('EMAIL_BATCH_SIZE', SENDGRID_MAX_PERSONALIZATIONS)), SENDGRID_MAX_PERSONALIZATIONS)
+EMAIL_SEND_CONCURRENCY = int(os.getenv('EMAIL_SEND_CONCURRENCY', 8))
+EMAIL_RETRY_BASE = 2.0          # Seconds before the first retry, doubling after each failure
+EMAIL_RETRY_MAX = 60.0
+EMAIL_RUN_DEADLINE = int(os.getenv('EMAIL_RUN_DEADLINE', 1800))  # Seconds a run keeps waiting on retries
+
+
+def batch_message(from_email, subject, html, emails):
+    """One Mail with a personalization per recipient"""
+    return Mail(
+        from_email=Email(from_email),
+        to_emails=[To(email) for email in emails],
+        subject=subject,
+        html_content=html,
+        is_multiple=True,
+    )
+
+
+class SendError(Exception):
+    """Non-2xx answer from SendGrid that didn't raise on its own"""
+
+    def __init__(self, status_code):
+        super().__init__(f"SendGrid returned {status_code}")
+        self.status_code = status_code
+
+
+def is_transient(error):
+    """Whether a failed send is worth retrying (no status = network error)"""
+    status = getattr(error, 'status_code', None)
+    return status is None or status == 429 or status >= 500
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+
+class LeadMailer:
+    """Sends each distinct email to its recipients in batched, concurrent SendGrid requests"""
+
+    def __init__(self, api_key, from_email, batch_size=EMAIL_BATCH_SIZE, concurrency=EMAIL_SEND_CONCURRENCY,
+                 client=None):
+        self.from_email = from_email
+        self.batch_size = max(1, min(batch_size, SENDGRID_MAX_PERSONALIZATIONS))
+        self.concurrency = max(1, concurrency)
+        self.client = client or SendGridAPIClient(api_key)
+
+    def _send_batch(self, job):
+        """(emails, message_id, error, latency) of one /mail/send request"""
+        subject, html, emails = job
+        started = time.monotonic()
+        try:
+            response = self.client.send(batch_message(self.from_email, subject, html, emails))
+            status = getattr(response, 'status_code', 202)
+            if status >= 300:
+                raise SendError(status)
+            headers = getattr(response, 'headers', None) or {}
+            return emails, headers.get('X-Message-Id'), None, time.monotonic() - started
+        except Exception as e:
+            return emails, None, e, time.monotonic() - started
+
+    def deliver(self, ledger, digest_date, contents, deadline=EMAIL_RUN_DEADLINE):
+        """
+        Send a day's undelivered recipients their email
+
+        contents: {(city, digest): (subject, html)} for every email in the ledger.
+        Runs until every recipient is sent or failed for good (or the
+        deadline passes); returns the run's stats, which are also stored
+        in the ledger.
+        """
+        run_id = ledger.start_run(digest_date)
+        stats = {'sent': 0, 'failed': 0, 'retried': 0, 'requests': 0, 'failed_requests': 0}
+        latencies = []
+        started = time.monotonic()
+        stop_at = started + deadline
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='sendgrid') as executor:
+            while time.monotonic() < stop_at:
+                claimed = ledger.claim(digest_date, self.batch_size * self.concurrency)
+                if not claimed:
+                    wait = ledger.next_retry_in(digest_date)
+                    if wait is None:
+                        break
+                    time.sleep(min(max(wait, 0.05), max(0.0, stop_at - time.monotonic())))
+                    continue
+
+                groups = {}
+                for email, city, digest, attempts in claimed:
+                    groups.setdefault((city, digest), []).append((email, attempts))
+                jobs, job_meta = [], []
+                for (city, digest), recipients in groups.items():
+                    if (city, digest) not in contents:
+                        ledger.mark_failed(digest_date, city, [email for email, _ in recipients], f"No email built for {city}")
+                        stats['failed'] += len(recipients)
+                        continue
+                    subject, html = contents[(city, digest)]
+                    for i in range(0, len(recipients), self.batch_size):
+                        chunk = recipients[i:i + self.batch_size]
+                        jobs.append((subject, html, [email for email, _ in chunk]))
+                        job_meta.append((city, max(attempts for _, attempts in chunk)))
+
+                for (emails, message_id, error, latency), (city, attempts) in zip(executor.map(self._send_batch, jobs),
+                                                                                  job_meta):
+                    stats['requests'] += 1
+                    latencies.append(latency)
+                    if not error:
+                        ledger.mark_sent(digest_date, city, emails, message_id)
+                        stats['sent'] += len(emails)
+                        continue
+                    stats['failed_requests'] += 1
+                    if is_transient(error) and attempts + 1 < ledger.max_attempts:
+                        delay = min(EMAIL_RETRY_MAX, EMAIL_RETRY_BASE * 2 ** attempts) * random.uniform(0.8, 1.2)
+                        ledger.mark_failed(digest_date, city, emails, error, delay)
+                        stats['retried'] += len(emails)
+                        print(f"⚠️  SendGrid batch of {len(emails)} failed ({error}), retrying in {delay:.1f}s")
+                    else:
+                        ledger.mark_failed(digest_date, city, emails, error)
+                        stats['failed'] += len(emails)
+                        print(f"❌ SendGrid batch of {len(emails)} failed after {latency:.1f}s: {error}")
+
+        seconds = time.monotonic() - started
+        stats.update({
+            'seconds': round(seconds, 2),
+            'emails_per_second': round(stats['sent'] / seconds, 1) if seconds else None,
+            'latency_p50': _percentile(latencies, 0.5),
+            'latency_p95': _percentile(latencies, 0.95),
+            'latency_max': round(max(latencies), 3) if latencies else None,
+            'unfinished': ledger.undelivered(digest_date),
+        })
+        ledger.finish_run(run_id, stats)
+        print(f"📧 Sent {stats['sent']} emails in {stats['requests']} requests "
+              f"({stats['failed']} failed, {stats['unfinished']} unfinished, {stats['seconds']}s, "
+              f"p95 {stats['latency_p95']}s)")
+        return stats
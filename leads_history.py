@@ -0,0 +1,315 @@
+"""
+Delta-compressed history of the daily leads CSVs
+
+Each leads/<city>/<date>/<date>_<city>.csv repeats ~90 days of the same
+permits, so the tree grows ~90x faster than the real data. The history
+keeps every distinct permit row once (its values as compact JSON, zlib
+compressed when that helps, column names stored once per layout) and, per
+city and day, only the delta against the previous day: which permits were
+added, changed or removed. Any day's full snapshot is rebuilt lazily from the
+deltas, so old daily CSVs can be deleted (compact()) without losing data.
+
+    layouts   distinct CSV column lists
+    versions  one row per distinct (city, permit_number, row content)
+    deltas    (city, date, permit_number) -> op add/change/remove + version
+    days      columns and row count of each recorded day
+
+Readers use iter_leads_rows(), which streams the CSV while it is still on
+disk and the reconstructed snapshot once it has been compacted away.
+"""
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+LEADS_HISTORY_PATH = os.getenv('LEADS_HISTORY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'leads_history.db'))
+LEADS_CSV_KEEP_DAYS = int(os.getenv('LEADS_CSV_KEEP_DAYS', 7))  # Newest daily CSVs kept on disk per city
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS layouts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    columns TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    city TEXT NOT NULL,
+    permit_key TEXT NOT NULL,
+    row_hash TEXT NOT NULL,
+    issue_date TEXT,
+    layout_id INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    UNIQUE (city, permit_key, row_hash)
+);
+CREATE TABLE IF NOT EXISTS deltas (
+    city TEXT NOT NULL,
+    date TEXT NOT NULL,
+    permit_key TEXT NOT NULL,
+    op TEXT NOT NULL,
+    version_id INTEGER,
+    PRIMARY KEY (city, permit_key, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS days (
+    city TEXT NOT NULL,
+    date TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    changed INTEGER NOT NULL,
+    removed INTEGER NOT NULL,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (city, date)
+);
+"""
+
+ISSUE_DATE_COLUMNS = ('issued_date', 'issue_date', 'date')
+COMPRESS_MIN_BYTES = 200  # Shorter rows don't get smaller with zlib
+
+
+def _encode(values):
+    """Row values as compact JSON, zlib-compressed when that actually helps"""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, 9)
+        if len(packed) < len(raw):
+            return packed
+    return raw
+
+
+def _decode(blob):
+    if blob[:1] == b'x':  # zlib header - JSON text never starts with 'x'
+        blob = zlib.decompress(blob)
+    return json.loads(blob)
+
+
+def _permit_key(row, row_hash):
+    """permit_number when the row has one, otherwise the row's own hash"""
+    return (row.get('permit_number') or '').strip() or f"#{row_hash}"
+
+
+def _issue_date(row):
+    for column in ISSUE_DATE_COLUMNS:
+        if row.get(column):
+            return str(row[column])[:10]
+    return None
+
+
+class LeadsHistory:
+    """SQLite store of leads CSV versions and per-day deltas"""
+
+    def __init__(self, path=LEADS_HISTORY_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._layouts = {}  # columns tuple -> id
+        self._layout_columns = {}  # id -> columns list
+
+    def _layout_id(self, columns):
+        key = tuple(columns)
+        if key not in self._layouts:
+            encoded = json.dumps(list(columns))
+            self._conn.execute('INSERT OR IGNORE INTO layouts (columns) VALUES (?)', (encoded,))
+            self._layouts[key] = self._conn.execute('SELECT id FROM layouts WHERE columns = ?', (encoded,)).fetchone()[0]
+        return self._layouts[key]
+
+    def _row(self, layout_id, blob):
+        columns = self._layout_columns.get(layout_id)
+        if columns is None:
+            with self._lock:
+                encoded = self._conn.execute('SELECT columns FROM layouts WHERE id = ?', (layout_id,)).fetchone()[0]
+            columns = self._layout_columns[layout_id] = json.loads(encoded)
+        return dict(zip(columns, _decode(blob)))
+
+    def _state(self, city, date, inclusive=False):
+        """{permit_key: version_id} of the city's snapshot just before a date (or as of it, if inclusive)"""
+        rows = self._conn.execute(
+            f"""SELECT d.permit_key, d.op, d.version_id FROM deltas d
+               WHERE d.city = ? AND d.date = (
+                   SELECT MAX(date) FROM deltas WHERE city = d.city AND permit_key = d.permit_key
+                   AND date {'<=' if inclusive else '<'} ?)""",
+            (city, date)
+        ).fetchall()
+        return {key: version_id for key, op, version_id in rows if op != 'remove'}
+
+    def days(self, city):
+        """Recorded days for a city, newest first: [(date, {'rows', 'added', 'changed', 'removed'})]"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT date, rows, added, changed, removed FROM days WHERE city = ? ORDER BY date DESC', (city,)
+            ).fetchall()
+        return [(date, {'rows': n, 'added': a, 'changed': c, 'removed': r}) for date, n, a, c, r in rows]
+
+    def has_day(self, city, date):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM days WHERE city = ? AND date = ?', (city, date)).fetchone() is not None
+
+    def record_day(self, city, date, rows, columns=None, incremental=False):
+        """
+        Record a city's full leads list for a date as a delta against the day before
+
+        An incremental day (a scrape of only the permits since the scraper's
+        watermark) is merged into the day before: its rows are added or
+        changed and nothing is removed. Re-recording the newest day replaces
+        it; days older than the newest recorded one are rejected (the history
+        is append-only).
+        """
+        with self._lock:
+            newest = self._conn.execute('SELECT MAX(date) FROM days WHERE city = ?', (city,)).fetchone()[0]
+            if newest and date < newest:
+                print(f"⚠️  {city}: not recording {date} in leads history, {newest} is already recorded")
+                return None
+
+            previous = self._state(city, date)
+            current = {}
+            columns = list(columns or [])
+            with self._conn:
+                for row in rows:
+                    # DictReader puts surplus fields of ragged lines under None
+                    row = {k: v for k, v in row.items() if k is not None}
+                    if not columns:
+                        columns = list(row)
+                    layout = list(row)
+                    payload = json.dumps(row, sort_keys=True, default=str)
+                    row_hash = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+                    key = _permit_key(row, row_hash)
+                    self._conn.execute(
+                        'INSERT OR IGNORE INTO versions (city, permit_key, row_hash, issue_date, layout_id, data) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (city, key, row_hash, _issue_date(row), self._layout_id(layout), _encode([row[c] for c in layout]))
+                    )
+                    current[key] = self._conn.execute(
+                        'SELECT id FROM versions WHERE city = ? AND permit_key = ? AND row_hash = ?', (city, key, row_hash)
+                    ).fetchone()[0]
+
+                if incremental:
+                    # Only new and updated permits were scraped - the rest carry over,
+                    # including what an earlier run already recorded for this date
+                    current = {**self._state(city, date, inclusive=True), **current}
+
+                deltas = []
+                for key, version_id in current.items():
+                    if key not in previous:
+                        deltas.append((city, date, key, 'add', version_id))
+                    elif previous[key] != version_id:
+                        deltas.append((city, date, key, 'change', version_id))
+                removed = [(city, date, key, 'remove', None) for key in previous if key not in current]
+
+                self._conn.execute('DELETE FROM deltas WHERE city = ? AND date = ?', (city, date))
+                self._conn.executemany('INSERT INTO deltas (city, date, permit_key, op, version_id) VALUES (?, ?, ?, ?, ?)',
+                                       deltas + removed)
+                added = sum(1 for d in deltas if d[3] == 'add')
+                summary = {'rows': len(current), 'added': added, 'changed': len(deltas) - added, 'removed': len(removed)}
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO days (city, date, columns, rows, added, changed, removed, recorded_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (city, date, json.dumps(columns), summary['rows'], summary['added'], summary['changed'],
+                     summary['removed'], datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+        return summary
+
+    def record_csv(self, city, date, path, incremental=False):
+        """Record a leads CSV file as the city's list for that date (or its additions, if incremental)"""
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            reader = csv.DictReader(f)
+            return self.record_day(city, date, reader, reader.fieldnames, incremental)
+
+    def columns(self, city, date):
+        with self._lock:
+            row = self._conn.execute('SELECT columns FROM days WHERE city = ? AND date = ?', (city, date)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def snapshot(self, city, date):
+        """
+        Lazily rebuild a city's leads list as of a date (newest issue date first)
+
+        Yields the rows as dicts, decompressing one at a time.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                """SELECT v.layout_id, v.data FROM deltas d JOIN versions v ON v.id = d.version_id
+                   WHERE d.city = ? AND d.op != 'remove' AND d.date = (
+                       SELECT MAX(date) FROM deltas WHERE city = d.city AND permit_key = d.permit_key AND date <= ?)
+                   ORDER BY v.issue_date DESC, d.permit_key""",
+                (city, date)
+            )
+            blobs = cursor.fetchall()
+        for layout_id, blob in blobs:
+            yield self._row(layout_id, blob)
+
+    def delta(self, city, date):
+        """What changed on a date: {'added': [...], 'changed': [...], 'removed': [permit keys]}"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT d.op, d.permit_key, v.layout_id, v.data FROM deltas d LEFT JOIN versions v ON v.id = d.version_id
+                   WHERE d.city = ? AND d.date = ?""",
+                (city, date)
+            ).fetchall()
+        result = {'added': [], 'changed': [], 'removed': []}
+        for op, key, layout_id, blob in rows:
+            if op == 'remove':
+                result['removed'].append(key)
+            else:
+                result['added' if op == 'add' else 'changed'].append(self._row(layout_id, blob))
+        return result
+
+    def import_leads(self, manifest):
+        """Record every CSV in the leads manifest that isn't in the history yet (oldest first)"""
+        recorded = 0
+        for city, dates in sorted(manifest.snapshot().items()):
+            for date, entry in sorted(dates.items()):
+                path = manifest.full_path(entry)
+                if entry.get('archived') or not os.path.exists(path) or self.has_day(city, date):
+                    continue
+                try:
+                    if self.record_csv(city, date, path):
+                        recorded += 1
+                except (OSError, csv.Error) as e:
+                    print(f"⚠️  Could not add {entry['path']} to leads history: {e}")
+        if recorded:
+            print(f"🗜️  Added {recorded} leads CSVs to the leads history")
+        return recorded
+
+    def compact(self, manifest, keep_days=LEADS_CSV_KEEP_DAYS):
+        """
+        Delete daily CSVs beyond the newest keep_days per city
+
+        Only files whose day is recorded in the history are removed; their
+        manifest entries are marked archived and readers rebuild them from
+        the history via iter_leads_rows().
+        """
+        removed = 0
+        freed = 0
+        for city, dates in manifest.snapshot().items():
+            for date, entry in sorted(dates.items(), reverse=True)[keep_days:]:
+                path = manifest.full_path(entry)
+                if entry.get('archived') or not self.has_day(city, date) or not os.path.exists(path):
+                    continue
+                os.remove(path)
+                try:
+                    os.rmdir(os.path.dirname(path))
+                except OSError:
+                    pass  # Folder still has other files
+                manifest.mark_archived(city, date)
+                removed += 1
+                freed += entry.get('bytes', 0)
+        if removed:
+            print(f"🗜️  Compacted {removed} old leads CSVs into the history ({freed / 1e6:.1f} MB freed)")
+        return removed
+
+
+def iter_leads_rows(manifest, history, city, date, entry):
+    """Rows of a city's leads for a date - from the CSV if it's on disk, else rebuilt from the history"""
+    path = manifest.full_path(entry)
+    if not entry.get('archived') and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            yield from csv.DictReader(f)
+    elif history:
+        yield from history.snapshot(city, date)
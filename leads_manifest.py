@@ -0,0 +1,174 @@
+"""
+Manifest of the leads/<city>/<date>/<date>_<city>.csv files
+
+Readers (get_leads_for_city, the fallback, the admin views) used to list
+directories and read every CSV on each call. The manifest keeps one entry
+per city/date instead - path (relative to the leads root), row count, byte
+size, columns, min/max issue date and checksum - stored as
+leads/manifest.json and updated (atomically, temp file + rename) whenever a
+leads CSV is written. Lookups are served from
+memory; the file is re-read only when another process has changed it.
+"""
+import csv
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+MANIFEST_NAME = 'manifest.json'
+ISSUE_DATE_COLUMNS = ('issued_date', 'issue_date', 'date')
+
+
+def describe_csv(path):
+    """Row count, size, columns, issue date range and sha256 of a CSV in one pass"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+
+    rows = 0
+    min_date = max_date = None
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        date_index = next((columns.index(name) for name in ISSUE_DATE_COLUMNS if name in columns), None)
+        for row in reader:
+            if not row:
+                continue
+            rows += 1
+            if date_index is not None and date_index < len(row):
+                value = row[date_index][:10]
+                if len(value) == 10 and value[4] == '-' and value[7] == '-':
+                    min_date = value if min_date is None or value < min_date else min_date
+                    max_date = value if max_date is None or value > max_date else max_date
+
+    return {
+        'path': path,
+        'rows': rows,
+        'bytes': os.path.getsize(path),
+        'columns': columns,
+        'min_issue_date': min_date,
+        'max_issue_date': max_date,
+        'sha256': digest.hexdigest(),
+        'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+class LeadsManifest:
+    """In-memory view of leads/manifest.json: {city: {date: entry}}"""
+
+    def __init__(self, leads_root='leads'):
+        self.leads_root = leads_root
+        self.path = os.path.join(leads_root, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._mtime = None
+        if os.path.exists(self.path):
+            self._reload()
+        elif os.path.isdir(leads_root):
+            self.rebuild()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f).get('cities', {})
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not read leads manifest {self.path}: {e}")
+
+    def _save(self):
+        os.makedirs(self.leads_root, exist_ok=True)
+        tmp_path = f"{self.path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'cities': self._entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def record(self, city, date, path):
+        """Add or refresh the entry for a CSV that was just written"""
+        entry = describe_csv(path)
+        entry['path'] = os.path.relpath(path, self.leads_root)
+        with self._lock:
+            self._reload()  # Pick up entries other processes added first
+            self._entries.setdefault(city, {})[date] = entry
+            self._save()
+        return entry
+
+    def rebuild(self):
+        """Rescan the whole leads tree (first start, or after manual edits)"""
+        entries = {}
+        for city in sorted(os.listdir(self.leads_root)):
+            city_path = os.path.join(self.leads_root, city)
+            if not os.path.isdir(city_path):
+                continue
+            for date in sorted(os.listdir(city_path)):
+                date_path = os.path.join(city_path, date)
+                if not os.path.isdir(date_path):
+                    continue
+                csv_files = sorted(f for f in os.listdir(date_path) if f.endswith('.csv'))
+                if not csv_files:
+                    continue
+                # Prefer the canonical <date>_<city>.csv over partial/other files
+                name = f"{date}_{city}.csv" if f"{date}_{city}.csv" in csv_files else csv_files[0]
+                try:
+                    entry = describe_csv(os.path.join(date_path, name))
+                    entry['path'] = os.path.join(city, date, name)
+                    entries.setdefault(city, {})[date] = entry
+                except OSError as e:
+                    print(f"⚠️  Skipping {name} in leads manifest: {e}")
+        with self._lock:
+            # CSVs compacted into the leads history are gone from disk but still listed
+            for city, dates in self._entries.items():
+                for date, entry in dates.items():
+                    if entry.get('archived') and date not in entries.get(city, {}):
+                        entries.setdefault(city, {})[date] = entry
+            self._entries = entries
+            self._save()
+        print(f"📒 Leads manifest rebuilt: {sum(len(d) for d in entries.values())} files in {len(entries)} cities")
+
+    def mark_archived(self, city, date):
+        """Flag an entry whose CSV was deleted after being compacted into the leads history"""
+        with self._lock:
+            self._reload()
+            entry = self._entries.get(city, {}).get(date)
+            if entry:
+                entry['archived'] = True
+                self._save()
+
+    def full_path(self, entry):
+        """Entry paths are stored relative to the leads root"""
+        return os.path.join(self.leads_root, entry['path'])
+
+    def cities(self):
+        with self._lock:
+            self._reload()
+            return sorted(self._entries)
+
+    def dates(self, city):
+        """City's entries, newest date first, as (date, entry) pairs"""
+        with self._lock:
+            self._reload()
+            return sorted(self._entries.get(city, {}).items(), reverse=True)
+
+    def get(self, city, date):
+        with self._lock:
+            self._reload()
+            return self._entries.get(city, {}).get(date)
+
+    def latest(self, city):
+        """(date, entry) of the city's newest CSV, or (None, None)"""
+        dates = self.dates(city)
+        return dates[0] if dates else (None, None)
+
+    def snapshot(self):
+        """Copy of every entry, {city: {date: entry}}"""
+        with self._lock:
+            self._reload()
+            return {city: dict(dates) for city, dates in self._entries.items()}
@@ -0,0 +1,114 @@
+"""
+Local fingerprint index of permits already sent to Supabase
+
+Every run re-scrapes a 90-day window, so most rows are identical to what
+the permits table already holds. The index keeps a hash of each permit's
+normalized Supabase row, keyed by (city, permit_number), and diff() splits
+a batch into new, changed and unchanged rows - only the first two need to
+be uploaded.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+FINGERPRINTS_PATH = os.getenv('FINGERPRINTS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'permit_fingerprints.db'))
+SQLITE_MAX_VARIABLES = 900  # Stay under SQLite's bound-parameter limit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    city TEXT NOT NULL,
+    permit_number TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (city, permit_number)
+) WITHOUT ROWID;
+"""
+
+
+# Coordinates are left out: the geocode worker queues its own lat/lng
+# updates, and a re-scrape without them must not look changed
+UNHASHED_COLUMNS = ('lat', 'lng')
+
+
+def row_fingerprint(row):
+    """Stable hash of a Supabase row (key order and float formatting don't matter)"""
+    row = {key: value for key, value in row.items() if key not in UNHASHED_COLUMNS}
+    payload = json.dumps(row, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class FingerprintIndex:
+    """SQLite map of (city, permit_number) -> hash of the last row sent"""
+
+    def __init__(self, path=FINGERPRINTS_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def _known_hashes(self, city, permit_numbers):
+        known = {}
+        with self._lock:
+            for i in range(0, len(permit_numbers), SQLITE_MAX_VARIABLES):
+                chunk = permit_numbers[i:i + SQLITE_MAX_VARIABLES]
+                placeholders = ','.join('?' * len(chunk))
+                known.update(self._conn.execute(
+                    f'SELECT permit_number, hash FROM fingerprints WHERE city = ? AND permit_number IN ({placeholders})',
+                    [city] + chunk
+                ).fetchall())
+        return known
+
+    def diff(self, city, rows):
+        """
+        Split one city's Supabase rows by what the index has seen
+
+        Returns (new_rows, changed_rows, unchanged_count). The outbox
+        drainer calls record() once Supabase has accepted the rows, so a
+        batch that is parked or dropped is sent again by the next run.
+        """
+        known = self._known_hashes(city, [row['permit_number'] for row in rows])
+        new_rows, changed_rows, unchanged = [], [], 0
+        for row in rows:
+            previous = known.get(row['permit_number'])
+            if previous is None:
+                new_rows.append(row)
+            elif previous != row_fingerprint(row):
+                changed_rows.append(row)
+            else:
+                unchanged += 1
+        return new_rows, changed_rows, unchanged
+
+    def record(self, city, rows):
+        """Remember the hashes of rows that Supabase has accepted"""
+        if not rows:
+            return
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO fingerprints (city, permit_number, hash, first_seen, updated_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (city, permit_number) DO UPDATE SET
+                       hash = excluded.hash, updated_at = excluded.updated_at""",
+                [(city, row['permit_number'], row_fingerprint(row), now, now) for row in rows]
+            )
+
+    def forget(self, city=None):
+        """Drop fingerprints (one city or all) so the next run re-sends every row"""
+        with self._lock, self._conn:
+            if city:
+                return self._conn.execute('DELETE FROM fingerprints WHERE city = ?', (city,)).rowcount
+            return self._conn.execute('DELETE FROM fingerprints').rowcount
+
+    def count(self, city=None):
+        with self._lock:
+            if city:
+                return self._conn.execute('SELECT COUNT(*) FROM fingerprints WHERE city = ?', (city,)).fetchone()[0]
+            return self._conn.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0]
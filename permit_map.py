@@ -0,0 +1,174 @@
+"""
+Viewport queries for the permit map
+
+The map asks for one bounding box at one zoom level and gets GeoJSON back.
+Zoomed in (MAP_POINTS_MIN_ZOOM and up) and with at most MAP_POINT_LIMIT
+permits in view, it gets the permits themselves. Otherwise it gets grid
+clusters: every Web Mercator tile overlapping the box is split into
+MAP_CLUSTER_CELL_PX-pixel cells and only each non-empty cell's centroid
+and count are sent.
+
+Both read the local permit store's R-tree (permits_geo), so a query only
+touches the permits in view. Cluster results are cached per tile and
+filter set until the store ingests new rows for the cities involved, so
+panning mostly re-serves tiles that were already computed.
+"""
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+MAP_POINTS_MIN_ZOOM = int(os.getenv('MAP_POINTS_MIN_ZOOM', 14))
+MAP_POINT_LIMIT = int(os.getenv('MAP_POINT_LIMIT', 500))
+MAP_CLUSTER_CACHE_TILES = int(os.getenv('MAP_CLUSTER_CACHE_TILES', 20000))
+MAP_CLUSTER_CELL_PX = 64
+MAP_MAX_TILES = 256          # Tiles per request - a box bigger than this at its zoom is refused
+TILE_SIZE_PX = 256
+MAX_LATITUDE = 85.0511287798  # Web Mercator cut-off
+
+
+def parse_bbox(value):
+    """'west,south,east,north' -> tuple of floats; raises ValueError"""
+    try:
+        west, south, east, north = (float(part) for part in (value or '').split(','))
+    except ValueError:
+        raise ValueError("bbox must be west,south,east,north in degrees")
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("bbox is out of range")
+    if west > east:
+        raise ValueError("bbox crossing the antimeridian is not supported")
+    return west, south, east, north
+
+
+def lng_to_x(lng, zoom):
+    return (lng + 180.0) / 360.0 * (2 ** zoom)
+
+
+def lat_to_y(lat, zoom):
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    radians = math.radians(lat)
+    return (1.0 - math.log(math.tan(radians) + 1.0 / math.cos(radians)) / math.pi) / 2.0 * (2 ** zoom)
+
+
+def x_to_lng(x, zoom):
+    return x / (2 ** zoom) * 360.0 - 180.0
+
+
+def y_to_lat(y, zoom):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / (2 ** zoom)))))
+
+
+def tile_bounds(zoom, x, y):
+    """(west, south, east, north) of a slippy-map tile"""
+    return x_to_lng(x, zoom), y_to_lat(y + 1, zoom), x_to_lng(x + 1, zoom), y_to_lat(y, zoom)
+
+
+def tiles_for_bbox(bbox, zoom, max_tiles=None):
+    """(x, y) of every tile at `zoom` that overlaps the box; ValueError if there are more than max_tiles"""
+    west, south, east, north = bbox
+    last = 2 ** zoom - 1
+    x0, x1 = int(lng_to_x(west, zoom)), min(int(lng_to_x(east, zoom)), last)
+    y0, y1 = int(lat_to_y(north, zoom)), min(int(lat_to_y(south, zoom)), last)
+    count = (x1 - x0 + 1) * (y1 - y0 + 1)
+    if max_tiles is not None and count > max_tiles:
+        raise ValueError(f"bbox covers {count} tiles at zoom {zoom}, zoom out or shrink it")
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def _feature(lng, lat, properties):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lng, lat]}, 'properties': properties}
+
+
+def permit_feature(row):
+    """Permit row -> GeoJSON point with the /last-week fields as properties"""
+    return _feature(row['lng'], row['lat'], {
+        'id': row['id'],
+        'city': row['city'],
+        'address': row['address'],
+        'permit_number': row['permit_number'],
+        'type': row.get('permit_type') or 'Permit',
+        'description': row.get('description') or '',
+        'date': row.get('issue_date') or '',
+        'value': row.get('estimated_cost') or '',
+    })
+
+
+class PermitMap:
+    """Viewport -> GeoJSON over a PermitStore, with a per-tile cluster cache"""
+
+    def __init__(self, store, cache_tiles=MAP_CLUSTER_CACHE_TILES):
+        self.store = store
+        self.cache_tiles = cache_tiles
+        self.stats = {'tile_hits': 0, 'tile_misses': 0}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _generation(self, filters):
+        """Store version the cached tiles for these filters depend on"""
+        if filters.get('cities'):
+            return tuple(self.store.city_generations.get(city, 0) for city in filters['cities'])
+        return self.store.generation
+
+    def tile_clusters(self, zoom, x, y, filters):
+        """Cluster cells of one tile: [{'lat', 'lng', 'count', 'id'}]"""
+        key = (zoom, x, y, json.dumps(filters, sort_keys=True))
+        generation = self._generation(filters)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == generation:
+                self._cache.move_to_end(key)
+                self.stats['tile_hits'] += 1
+                return cached[1]
+            self.stats['tile_misses'] += 1
+
+        west, south, east, north = tile_bounds(zoom, x, y)
+        cells_per_side = TILE_SIZE_PX // MAP_CLUSTER_CELL_PX
+        cells = self.store.bbox_clusters((west, south, east, north),
+                                         (north - south) / cells_per_side, (east - west) / cells_per_side, filters)
+
+        with self._lock:
+            self._cache[key] = (generation, cells)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_tiles:
+                self._cache.popitem(last=False)
+        return cells
+
+    def features(self, bbox, zoom, filters=None):
+        """GeoJSON FeatureCollection of permits or clusters for one map viewport"""
+        filters = filters or {}
+        zoom = max(0, min(int(zoom), 22))
+        if zoom >= MAP_POINTS_MIN_ZOOM:
+            rows = self.store.in_bbox(bbox, filters, limit=MAP_POINT_LIMIT + 1)
+            if len(rows) <= MAP_POINT_LIMIT or zoom >= 18:
+                return {
+                    'type': 'FeatureCollection',
+                    'mode': 'points',
+                    'zoom': zoom,
+                    'total': min(len(rows), MAP_POINT_LIMIT),
+                    'truncated': len(rows) > MAP_POINT_LIMIT,
+                    'features': [permit_feature(row) for row in rows[:MAP_POINT_LIMIT]],
+                }
+
+        tiles = tiles_for_bbox(bbox, zoom, MAP_MAX_TILES)
+        west, south, east, north = bbox
+        features = []
+        total = 0
+        for x, y in tiles:
+            for cell in self.tile_clusters(zoom, x, y, filters):
+                if not (west <= cell['lng'] <= east and south <= cell['lat'] <= north):
+                    continue
+                total += cell['count']
+                # maplibre/MapTiler cluster layers style on `cluster` and `point_count`
+                features.append(_feature(cell['lng'], cell['lat'], {
+                    'cluster': cell['count'] > 1,
+                    'point_count': cell['count'],
+                    'id': cell['id'] if cell['count'] == 1 else None,
+                }))
+        return {
+            'type': 'FeatureCollection',
+            'mode': 'clusters',
+            'zoom': zoom,
+            'total': total,
+            'features': features,
+        }
@@ -0,0 +1,259 @@
+"""
+Streaming pipeline from a city scraper to the leads CSV and Supabase
+
+    scraper.iter_permits() batches -> normalize -> validate -> CSV writer
+                                                            -> upload outbox
+
+Batches flow through as they are fetched, so a city never holds more than a
+few batches in memory. Supabase rows are checked against the fingerprint
+index (permit_fingerprints.py) and only new or changed ones go to the
+durable upload outbox (upload_outbox.py), whose background drainer uploads
+them, so Supabase latency never holds up the scrape.
+"""
+import csv
+import os
+import re
+from datetime import datetime
+
+from geocode_cache import cache_city
+
+# Columns of leads/<city>/<date>/<date>_<city>.csv - the scraper output
+# names that get_leads_for_city() and the email digests read
+CSV_FIELDS = ['permit_number', 'address', 'type', 'value', 'issued_date', 'status', 'description', 'contractor',
+              'zip_code']
+
+PERMITS_CONFLICT_KEY = 'permit_number,city'
+
+
+class ScrapeStopped(Exception):
+    """The scraper pool stopped the city (run deadline) - its CSV is discarded"""
+
+
+def city_key(city_name):
+    """'San Antonio' -> 'sanantonio' (leads folder and Supabase city value)"""
+    return city_name.lower().replace(' ', '')
+
+
+def parse_cost(value):
+    """'$1,234.50' / 1234.5 -> 1234.5, or None if there is no usable number"""
+    if value in (None, ''):
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return float(value)
+        return float(str(value).replace('$', '').replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+_ZIP = re.compile(r'^(\d{5})(?:-\d{4})?$')
+_ADDRESS_ZIP = re.compile(r'\s(\d{5})(?:-\d{4})?(?:,?\s*USA?)?$', re.IGNORECASE)
+
+
+def parse_zip(value, address=''):
+    """'37206-1234' -> '37206'; else a zip at the end of the address ('..., TN 37206'), or ''"""
+    match = _ZIP.match(str(value or '').strip()) or _ADDRESS_ZIP.search(str(address or '').strip())
+    return match.group(1) if match else ''
+
+
+def parse_date(value):
+    """First 10 chars as YYYY-MM-DD, or None"""
+    value = str(value or '')[:10]
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return value
+    except ValueError:
+        return None
+
+
+def normalize_permit(permit):
+    """Map the different scraper output shapes onto CSV_FIELDS"""
+    def first(*keys, default=''):
+        for key in keys:
+            value = permit.get(key)
+            if value not in (None, ''):
+                return value
+        return default
+
+    row = {
+        'permit_number': str(first('permit_number', 'permit_id')).strip(),
+        'address': str(first('address', default='N/A')).strip(),
+        'type': first('type', 'permit_type', 'work_type', default='N/A'),
+        'value': first('value', 'permit_value', 'estimated_cost'),
+        'issued_date': first('issued_date', 'issue_date', 'date', default='N/A'),
+        'status': first('status', default='N/A'),
+        'description': first('description'),
+        'contractor': first('contractor'),
+    }
+    row['zip_code'] = parse_zip(first('zip_code', 'zip', 'zipcode', 'postal_code'), row['address'])
+    # Geocoded scrapers may already carry coordinates
+    for key in ('lat', 'lng'):
+        if permit.get(key) not in (None, ''):
+            row[key] = permit[key]
+    return row
+
+
+def validate_permit(row):
+    """Reason string if the row can't be stored, otherwise None"""
+    if not row['permit_number']:
+        return 'missing permit number'
+    if not row['address'] or row['address'] == 'N/A':
+        return 'missing address'
+    return None
+
+
+def to_supabase_row(row, city):
+    """Normalized row -> permits table columns"""
+    record = {
+        'permit_number': row['permit_number'],
+        'address': row['address'],
+        'city': city,
+        'permit_type': row['type'] or 'Permit',
+        'description': row['description'],
+        'issue_date': parse_date(row['issued_date']),
+        'estimated_cost': parse_cost(row['value']),
+        'status': row['status'],
+        'contractor': row['contractor'] or None,
+    }
+    # Only send coordinates and zip codes we have - upserting nulls would wipe them
+    for key in ('lat', 'lng', 'zip_code'):
+        if row.get(key) not in (None, ''):
+            record[key] = row[key]
+    return record
+
+
+class LeadsCSVWriter:
+    """Writes today's leads CSV incrementally, published atomically on close"""
+
+    def __init__(self, city, leads_root='leads', date=None, manifest=None, history=None):
+        date = date or datetime.now().strftime('%Y-%m-%d')
+        self.city = city
+        self.date = date
+        self.manifest = manifest
+        self.history = history
+        self.path = os.path.join(leads_root, city, date, f"{date}_{city}.csv")
+        self.tmp_path = f"{self.path}.tmp"
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.tmp_path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerows(rows)
+        self.count += len(rows)
+
+    def close(self, publish=True, incremental=False):
+        """Move the finished file into place (or discard it); incremental files only hold new permits"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if publish:
+            os.replace(self.tmp_path, self.path)
+            if self.manifest:
+                self.manifest.record(self.city, self.date, self.path)
+            if self.history:
+                self.history.record_csv(self.city, self.date, self.path, incremental)
+        else:
+            os.remove(self.tmp_path)
+
+
+def _permit_batches(scraper, batch_size):
+    """iter_permits() for engine-based scrapers, run() split into batches for the rest"""
+    if hasattr(scraper, 'iter_permits'):
+        yield from scraper.iter_permits(batch_size=batch_size)
+        return
+    permits = scraper.run() or []
+    for i in range(0, len(permits), batch_size):
+        yield permits[i:i + batch_size]
+
+
+def _fill_coordinates(geocoder, city, records):
+    """Copy cached lat/lng onto the records that came without them"""
+    missing = [record for record in records if record.get('lat') is None or record.get('lng') is None]
+    if not missing:
+        return
+    coords = geocoder.resolve_many([record['address'] for record in missing], cache_city(city))
+    for record in missing:
+        lat, lng = coords.get(record['address'], (None, None))
+        if lat is not None and lng is not None:
+            record['lat'], record['lng'] = lat, lng
+
+
+def run_pipeline(city_name, scraper, outbox=None, fingerprints=None, manifest=None, store=None,
+                 history=None, geocoder=None, leads_root='leads', batch_size=500, resend=False):
+    """
+    Stream one city's permits into its leads CSV and the Supabase upload outbox
+
+    With a fingerprint index only new or changed rows are queued (resend
+    queues everything, e.g. for a forced full refresh). Returns a dict of
+    counts: scraped, invalid, written (CSV rows), queued (rows handed to the
+    outbox), new, changed and unchanged, plus csv_path when a file was written.
+    The leads manifest and leads history, if given, are updated when the CSV
+    is published (an incremental scrape's CSV is merged into the history),
+    and every valid row is written to the local permit store, if given. Rows
+    without coordinates get them from the geocode cache, if given, so permits
+    at already geocoded addresses are on the map right away.
+
+    Raises ScrapeStopped, without publishing the CSV, once the scraper's
+    stop_event (set by the scraper pool at its deadline) is set.
+    """
+    city = city_key(city_name)
+    stop_event = getattr(scraper, 'stop_event', None)
+    writer = LeadsCSVWriter(city, leads_root, manifest=manifest, history=history)
+    stats = {'scraped': 0, 'invalid': 0, 'written': 0, 'queued': 0, 'new': 0, 'changed': 0, 'unchanged': 0}
+    published = False
+
+    try:
+        for batch in _permit_batches(scraper, batch_size):
+            if stop_event and stop_event.is_set():
+                raise ScrapeStopped(f"{city_name} stopped after {stats['scraped']} permits")
+            stats['scraped'] += len(batch)
+            rows = []
+            for permit in batch:
+                row = normalize_permit(permit)
+                if validate_permit(row):
+                    stats['invalid'] += 1
+                    continue
+                rows.append(row)
+
+            writer.write(rows)
+            records = [to_supabase_row(row, city) for row in rows]
+            if geocoder:
+                _fill_coordinates(geocoder, city, records)
+            if store:
+                store.ingest(records, source='scraper')
+            if outbox:
+                if fingerprints:
+                    new_rows, changed_rows, unchanged = fingerprints.diff(city, records)
+                    stats['new'] += len(new_rows)
+                    stats['changed'] += len(changed_rows)
+                    if not resend:
+                        stats['unchanged'] += unchanged
+                        records = new_rows + changed_rows
+                stats['queued'] += outbox.append('permits', records, on_conflict=PERMITS_CONFLICT_KEY)
+        if stop_event and stop_event.is_set():
+            raise ScrapeStopped(f"{city_name} stopped after {stats['scraped']} permits")
+        published = True
+    finally:
+        # Scrapers decide on an incremental run once iteration starts
+        writer.close(publish=published, incremental=getattr(scraper, 'incremental', False))
+
+    stats['written'] = writer.count
+    if writer.count:
+        stats['csv_path'] = writer.path
+        print(f"💾 Saved {writer.count} permits to {writer.path}")
+    if stats['invalid']:
+        print(f"⚠️  Skipped {stats['invalid']} permits without a permit number or address")
+    if outbox and fingerprints:
+        print(f"📤 Queued {stats['queued']} permits for Supabase upload "
+              f"({stats['new']} new, {stats['changed']} changed, {stats['unchanged']} unchanged skipped)")
+    elif outbox:
+        print(f"📤 Queued {stats['queued']} permits for Supabase upload")
+    return stats
@@ -0,0 +1,130 @@
+"""
+Filtered, cursor-paginated permit queries for /api/permits
+
+Pages are ordered by (issue_date, id) newest first and continued with an
+opaque keyset cursor instead of an offset, so page 100 costs the same as
+page 1 - Supabase walks idx_permits_city_date_id, the local store its
+(city, issue_date) index. A cursor encodes the last row of its page, the
+source it came from and a hash of the filters, and is rejected if either
+changes.
+"""
+import base64
+import hashlib
+import json
+
+from permit_pipeline import parse_cost, parse_date
+
+PERMITS_PAGE_DEFAULT = 50
+PERMITS_PAGE_MAX = 500
+PERMIT_QUERY_COLUMNS = ('id, permit_number, address, city, state, zip_code, permit_type, description, issue_date, '
+                        'estimated_cost, status, contractor, lat, lng')
+
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def parse_filters(args):
+    """Request args -> filters dict; raises ValueError on a malformed value"""
+    filters = {
+        'cities': [city.lower() for city in _split(args.get('cities') or args.get('city'))],
+        'permit_types': _split(args.get('permit_type')),
+        'statuses': _split(args.get('status')),
+    }
+    for key in ('min_cost', 'max_cost'):
+        if args.get(key):
+            filters[key] = parse_cost(args[key])
+            if filters[key] is None:
+                raise ValueError(f"{key} must be a number")
+    for key in ('since', 'until'):
+        if args.get(key):
+            filters[key] = parse_date(args[key])
+            if filters[key] is None:
+                raise ValueError(f"{key} must be a YYYY-MM-DD date")
+    return {key: value for key, value in filters.items() if value not in (None, [])}
+
+
+def _filters_hash(filters, source):
+    payload = json.dumps([filters, source], sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def encode_cursor(row, filters, source):
+    payload = json.dumps([row['issue_date'], row['id'], source, _filters_hash(filters, source)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, filters):
+    """Cursor -> (source, (issue_date, id)); raises ValueError if it's corrupt or from other filters"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        issue_date, row_id, source, digest = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if digest != _filters_hash(filters, source):
+        raise ValueError("Cursor belongs to a different query - start again without it")
+    return source, (issue_date, row_id)
+
+
+def supabase_page(supabase, filters, after=None, limit=PERMITS_PAGE_DEFAULT):
+    """One page from the Supabase permits table, same contract as PermitStore.page()"""
+    query = supabase.table('permits').select(PERMIT_QUERY_COLUMNS).not_.is_('issue_date', 'null')
+    if filters.get('cities'):
+        query = query.in_('city', filters['cities'])
+    if filters.get('permit_types'):
+        query = query.in_('permit_type', filters['permit_types'])
+    if filters.get('statuses'):
+        query = query.in_('status', filters['statuses'])
+    if filters.get('min_cost') is not None:
+        query = query.gte('estimated_cost', filters['min_cost'])
+    if filters.get('max_cost') is not None:
+        query = query.lte('estimated_cost', filters['max_cost'])
+    if filters.get('since'):
+        query = query.gte('issue_date', filters['since'])
+    if filters.get('until'):
+        query = query.lte('issue_date', filters['until'])
+    if after:
+        query = query.or_(f"issue_date.lt.{after[0]},and(issue_date.eq.{after[0]},id.lt.{after[1]})")
+    return query.order('issue_date', desc=True).order('id', desc=True).limit(limit).execute().data or []
+
+
+def query_permits(filters, store, supabase=None, cursor=None, limit=PERMITS_PAGE_DEFAULT, source=None):
+    """
+    One page of permits plus the cursor for the next one
+
+    source is 'supabase' or 'local' (default: Supabase when connected).
+    A first page falls back to the local store if Supabase fails; later
+    pages stay on the source their cursor came from.
+    """
+    limit = max(1, min(int(limit), PERMITS_PAGE_MAX))
+    after = None
+    if cursor:
+        source, after = decode_cursor(cursor, filters)
+    source = source or ('supabase' if supabase else 'local')
+    if source not in ('supabase', 'local'):
+        raise ValueError("source must be 'supabase' or 'local'")
+
+    # One extra row tells whether there is a next page
+    rows = None
+    if source == 'supabase' and supabase:
+        try:
+            rows = supabase_page(supabase, filters, after, limit + 1)
+        except Exception as e:
+            print(f"Supabase error in permits query: {e}")
+            if cursor:
+                raise
+    if rows is None:
+        if source == 'supabase' and cursor:
+            raise RuntimeError('Supabase not connected')
+        source = 'local'
+        columns = [column.strip() for column in PERMIT_QUERY_COLUMNS.split(',')]
+        rows = [{column: row.get(column) for column in columns} for row in store.page(filters, after, limit + 1)]
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'permits': rows,
+        'count': len(rows),
+        'next_cursor': encode_cursor(rows[-1], filters, source) if has_more else None,
+        'source': source,
+    }
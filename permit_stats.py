@@ -0,0 +1,72 @@
+"""
+Cached permit counts for the admin views
+
+Counts are maintained at ingest time on both sides - permit_daily_counts in
+the local permit store (SQLite triggers) and in Supabase (triggers plus the
+permit_city_counts() RPC, see supabase_setup.sql) - so reading them never
+counts the permits table. PermitStats keeps the combined result for
+PERMIT_STATS_TTL seconds; the scraper run calls invalidate() when it ends.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+PERMIT_STATS_TTL = int(os.getenv('PERMIT_STATS_TTL', 300))
+
+
+class PermitStats:
+    """Per-city permit counts from the local store and Supabase, behind a TTL cache"""
+
+    def __init__(self, store, supabase=None, ttl=PERMIT_STATS_TTL):
+        self.store = store
+        self.supabase = supabase
+        self.ttl = ttl
+        self._cached = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0
+
+    def summary(self, refresh=False):
+        """{'local_store': {...}, 'supabase': {...}, 'generated_at', 'cached'}"""
+        with self._lock:
+            if not refresh and self._cached is not None and time.monotonic() < self._expires_at:
+                return dict(self._cached, cached=True)
+
+            local = self.store.city_summary()
+            result = {
+                'local_store': {'cities': local, 'total': sum(city['permits'] for city in local.values())},
+                'supabase': self._supabase_counts(local) if self.supabase else None,
+                'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._cached = result
+            self._expires_at = time.monotonic() + self.ttl
+            return dict(result, cached=False)
+
+    def _supabase_counts(self, local):
+        try:
+            rows = self.supabase.rpc('permit_city_counts', {}).execute().data or []
+            cities = {row['city']: row['permits'] for row in rows}
+            return {
+                'cities': cities,
+                'total': sum(cities.values()),
+                'details': {row['city']: row for row in rows},
+                'source': 'rpc',
+            }
+        except Exception as e:
+            print(f"⚠️  permit_city_counts RPC unavailable ({e}), counting per city")
+
+        # RPC not deployed yet - HEAD requests with an exact count, no rows transferred
+        try:
+            cities = {}
+            for city in local:
+                result = self.supabase.table('permits').select('id', count='exact', head=True).eq('city', city).execute()
+                cities[city] = result.count or 0
+            total = self.supabase.table('permits').select('id', count='exact', head=True).execute().count or 0
+            return {'cities': cities, 'total': total, 'source': 'count'}
+        except Exception as e:
+            print(f"Error getting Supabase stats: {e}")
+            return {'error': str(e)}
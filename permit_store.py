@@ -0,0 +1,466 @@
+"""
+Local SQLite permit store - the on-box system of record for permits
+
+Mirrors the Supabase `permits` table (supabase_setup.sql) in one WAL-mode
+SQLite file, indexed on (city, issue_date), so /last-week, the lead emails
+and the admin views can answer in milliseconds from local disk even when
+Supabase is slow or down.
+
+Rows come in two ways:
+- ingest(): the scraper pipeline writes every normalized batch
+- import_leads(): one-off/backfill import of the leads/<city>/<date> CSVs,
+  whatever header layout they were written with
+
+Run `python permit_store.py` to import the existing leads/ tree.
+"""
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+from permit_pipeline import city_key, normalize_permit, to_supabase_row, validate_permit
+
+PERMIT_STORE_PATH = os.getenv('PERMIT_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'permits.db'))
+
+# Columns of the Supabase permits table (minus the id / scraped_at defaults)
+PERMIT_COLUMNS = [
+    'permit_number', 'address', 'city', 'state', 'zip_code', 'permit_type', 'description', 'issue_date',
+    'estimated_cost', 'status', 'owner_name', 'contractor', 'contractor_phone', 'lat', 'lng', 'source',
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS permits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    permit_number TEXT,
+    address TEXT NOT NULL,
+    city TEXT NOT NULL,
+    state TEXT DEFAULT 'USA',
+    zip_code TEXT,
+    permit_type TEXT,
+    description TEXT,
+    issue_date TEXT,
+    estimated_cost REAL,
+    status TEXT,
+    owner_name TEXT,
+    contractor TEXT,
+    contractor_phone TEXT,
+    lat REAL,
+    lng REAL,
+    scraped_at TEXT,
+    source TEXT,
+    UNIQUE (permit_number, city)
+);
+CREATE INDEX IF NOT EXISTS idx_permits_city_date ON permits (city, issue_date);
+
+-- Per-city/per-day permit counts, kept current by the triggers below so the
+-- admin stats never scan the permits table ('' = no issue date)
+CREATE TABLE IF NOT EXISTS permit_daily_counts (
+    city TEXT NOT NULL,
+    issue_date TEXT NOT NULL,
+    permits INTEGER NOT NULL,
+    PRIMARY KEY (city, issue_date)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS permits_count_insert AFTER INSERT ON permits BEGIN
+    INSERT INTO permit_daily_counts (city, issue_date, permits) VALUES (NEW.city, COALESCE(NEW.issue_date, ''), 1)
+    ON CONFLICT (city, issue_date) DO UPDATE SET permits = permits + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS permits_count_delete AFTER DELETE ON permits BEGIN
+    UPDATE permit_daily_counts SET permits = permits - 1
+    WHERE city = OLD.city AND issue_date = COALESCE(OLD.issue_date, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS permits_count_update AFTER UPDATE OF city, issue_date ON permits
+WHEN OLD.city IS NOT NEW.city OR OLD.issue_date IS NOT NEW.issue_date BEGIN
+    UPDATE permit_daily_counts SET permits = permits - 1
+    WHERE city = OLD.city AND issue_date = COALESCE(OLD.issue_date, '');
+    INSERT INTO permit_daily_counts (city, issue_date, permits) VALUES (NEW.city, COALESCE(NEW.issue_date, ''), 1)
+    ON CONFLICT (city, issue_date) DO UPDATE SET permits = permits + 1;
+END;
+
+-- Spatial index over the geocoded permits (id = permits.id) for the map's bbox queries
+CREATE VIRTUAL TABLE IF NOT EXISTS permits_geo USING rtree (id, min_lat, max_lat, min_lng, max_lng);
+
+CREATE TRIGGER IF NOT EXISTS permits_geo_insert AFTER INSERT ON permits
+WHEN NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL BEGIN
+    INSERT OR REPLACE INTO permits_geo VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lng, NEW.lng);
+END;
+
+CREATE TRIGGER IF NOT EXISTS permits_geo_update AFTER UPDATE OF lat, lng ON permits
+WHEN OLD.lat IS NOT NEW.lat OR OLD.lng IS NOT NEW.lng BEGIN
+    DELETE FROM permits_geo WHERE id = OLD.id;
+    INSERT INTO permits_geo SELECT NEW.id, NEW.lat, NEW.lat, NEW.lng, NEW.lng
+    WHERE NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS permits_geo_delete AFTER DELETE ON permits BEGIN
+    DELETE FROM permits_geo WHERE id = OLD.id;
+END;
+
+-- When each permit was first stored, for the "new since your last email" selection. permits.id
+-- is AUTOINCREMENT, so ids are handed out in first-seen order and a delivery cursor is just the
+-- highest id a subscriber has been sent; an upsert of a known permit doesn't touch this table
+CREATE TABLE IF NOT EXISTS permit_first_seen (
+    city TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    first_seen TEXT NOT NULL,
+    PRIMARY KEY (city, id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS permits_first_seen_insert AFTER INSERT ON permits BEGIN
+    INSERT OR IGNORE INTO permit_first_seen (city, id, first_seen)
+    VALUES (NEW.city, NEW.id, COALESCE(NEW.scraped_at, datetime('now', 'localtime')));
+END;
+
+CREATE TRIGGER IF NOT EXISTS permits_first_seen_delete AFTER DELETE ON permits BEGIN
+    DELETE FROM permit_first_seen WHERE city = OLD.city AND id = OLD.id;
+END;
+
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    imported_at TEXT NOT NULL
+);
+"""
+
+# Columns kept from the stored row when the new one doesn't have them
+# (a scrape without coordinates must not wipe a geocode)
+KEEP_EXISTING = ('lat', 'lng', 'zip_code', 'owner_name', 'contractor_phone')
+
+
+@lru_cache(maxsize=None)
+def _upsert_sql(present):
+    """Upsert that only overwrites the columns an incoming row carries - a partial row can't erase the rest"""
+    updates = []
+    for column in PERMIT_COLUMNS:
+        if column in ('permit_number', 'city') or column not in present:
+            continue
+        if column in KEEP_EXISTING:
+            updates.append(f"{column} = COALESCE(excluded.{column}, permits.{column})")
+        else:
+            updates.append(f"{column} = excluded.{column}")
+    updates.append("scraped_at = excluded.scraped_at")
+    columns = PERMIT_COLUMNS + ['scraped_at']
+    return (f"INSERT INTO permits ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (permit_number, city) DO UPDATE SET {', '.join(updates)}")
+
+
+def csv_permit_row(raw, city):
+    """Any leads CSV layout (Austin date/city/permit_type, Nashville type/value, the 14-column export) -> permits row"""
+    normalized = normalize_permit(raw)
+    if validate_permit(normalized):
+        return None
+    row = to_supabase_row(normalized, city)
+    for column in ('owner_name', 'contractor_phone'):
+        if raw.get(column):
+            row[column] = raw[column]
+    return row
+
+
+def _filter_conditions(filters, alias=''):
+    """SQL conditions + params for the /api/permits filters, except the city list"""
+    conditions, params = [], []
+    for column, key in (('permit_type', 'permit_types'), ('status', 'statuses')):
+        if filters.get(key):
+            conditions.append(f"{alias}{column} IN ({','.join('?' * len(filters[key]))})")
+            params += filters[key]
+    for column, op, key in (('estimated_cost', '>=', 'min_cost'), ('estimated_cost', '<=', 'max_cost'),
+                            ('issue_date', '>=', 'since'), ('issue_date', '<=', 'until')):
+        if filters.get(key) is not None:
+            conditions.append(f"{alias}{column} {op} ?")
+            params.append(filters[key])
+    return conditions, params
+
+
+class PermitStore:
+    """SQLite copy of the permits table with bulk ingest and the read queries the app needs"""
+
+    def __init__(self, path=PERMIT_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        # Bumped on every ingest so caches built from the store (map clusters) know they're stale
+        self.generation = 0
+        self.city_generations = {}
+        self._backfill_derived()
+
+    def _backfill_derived(self):
+        """Seed the trigger-maintained tables for a store created before their triggers existed"""
+        with self._lock, self._conn:
+            if not self._conn.execute('SELECT 1 FROM permit_daily_counts LIMIT 1').fetchone():
+                self._conn.execute(
+                    "INSERT INTO permit_daily_counts (city, issue_date, permits) "
+                    "SELECT city, COALESCE(issue_date, ''), COUNT(*) FROM permits GROUP BY city, COALESCE(issue_date, '')"
+                )
+            if not self._conn.execute('SELECT 1 FROM permits_geo LIMIT 1').fetchone():
+                self._conn.execute(
+                    "INSERT INTO permits_geo SELECT id, lat, lat, lng, lng FROM permits "
+                    "WHERE lat IS NOT NULL AND lng IS NOT NULL"
+                )
+            if not self._conn.execute('SELECT 1 FROM permit_first_seen LIMIT 1').fetchone():
+                self._conn.execute(
+                    "INSERT INTO permit_first_seen SELECT city, id, COALESCE(scraped_at, datetime('now', 'localtime')) "
+                    "FROM permits"
+                )
+
+    def ingest(self, rows, source=None):
+        """Bulk upsert permits-table rows (e.g. to_supabase_row output); returns the row count"""
+        if not rows:
+            return 0
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        batches = {}    # Rows grouped by the columns they carry, one upsert statement each
+        for row in rows:
+            record = dict(row)
+            if source and not record.get('source'):
+                record['source'] = source
+            present = frozenset(column for column in PERMIT_COLUMNS if column in record)
+            batches.setdefault(present, []).append([record.get(column) for column in PERMIT_COLUMNS] + [now])
+        with self._lock, self._conn:
+            for present, values in batches.items():
+                self._conn.executemany(_upsert_sql(present), values)
+            self.generation += 1
+            for city in {row.get('city') for row in rows}:
+                self.city_generations[city] = self.generation
+        return len(rows)
+
+    def set_coordinates(self, city, coordinates):
+        """Write geocodes [(permit_number, lat, lng)] of a city's permits, leaving the rest of each row alone"""
+        if not coordinates:
+            return 0
+        with self._lock, self._conn:
+            updated = self._conn.executemany(
+                'UPDATE permits SET lat = ?, lng = ? WHERE city = ? AND permit_number = ?',
+                [(lat, lng, city, permit_number) for permit_number, lat, lng in coordinates]
+            ).rowcount
+            self.generation += 1
+            self.city_generations[city] = self.generation
+        return updated
+
+    def import_csv(self, path, city, sha256=None, batch_size=1000):
+        """Import one leads CSV (skipped if this exact file was imported before)"""
+        if sha256:
+            with self._lock:
+                seen = self._conn.execute('SELECT sha256 FROM imported_files WHERE path = ?', (path,)).fetchone()
+            if seen and seen['sha256'] == sha256:
+                return 0
+
+        imported = 0
+        batch = []
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            for raw in csv.DictReader(f):
+                row = csv_permit_row(raw, city)
+                if row:
+                    batch.append(row)
+                if len(batch) >= batch_size:
+                    imported += self.ingest(batch, source='leads_csv')
+                    batch = []
+        imported += self.ingest(batch, source='leads_csv')
+
+        if sha256:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO imported_files (path, sha256, rows, imported_at) VALUES (?, ?, ?, ?)',
+                    (path, sha256, imported, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+        return imported
+
+    def import_leads(self, manifest):
+        """Import every CSV the leads manifest knows about, oldest first so newer data wins"""
+        total = 0
+        files = 0
+        for city, dates in sorted(manifest.snapshot().items()):
+            for date, entry in sorted(dates.items()):
+                try:
+                    count = self.import_csv(manifest.full_path(entry), city_key(city), entry.get('sha256'))
+                except (OSError, csv.Error) as e:
+                    print(f"⚠️  Could not import {entry['path']}: {e}")
+                    continue
+                if count:
+                    files += 1
+                    total += count
+        print(f"🗄️  Imported {total} permits from {files} leads CSVs into {self.path}")
+        return total
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def recent(self, cities, since=None, limit=500):
+        """Newest permits for one or more cities (issue_date >= since), newest first"""
+        if isinstance(cities, str):
+            cities = [cities]
+        placeholders = ','.join('?' * len(cities))
+        sql = f"SELECT * FROM permits WHERE city IN ({placeholders})"
+        params = list(cities)
+        if since:
+            sql += " AND issue_date >= ?"
+            params.append(since)
+        sql += " ORDER BY issue_date DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return self._query(sql, params)
+
+    def iter_recent(self, cities, since=None, batch_size=1000):
+        """Like recent() but unbounded, read in keyset-paginated batches of (issue_date, id)"""
+        if isinstance(cities, str):
+            cities = [cities]
+        placeholders = ','.join('?' * len(cities))
+        base = f"SELECT * FROM permits WHERE city IN ({placeholders})"
+        params = list(cities)
+        if since:
+            base += " AND issue_date >= ?"
+            params.append(since)
+        cursor = None
+        while True:
+            sql, page_params = base, list(params)
+            if cursor:
+                sql += " AND (issue_date < ? OR (issue_date = ? AND id < ?))"
+                page_params += [cursor[0], cursor[0], cursor[1]]
+            rows = self._query(sql + " ORDER BY issue_date DESC, id DESC LIMIT ?", page_params + [batch_size])
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            cursor = (rows[-1]['issue_date'], rows[-1]['id'])
+
+    def page(self, filters, after=None, limit=50):
+        """
+        One page of permits matching `filters`, ordered (issue_date, id) newest first
+
+        `after` is the (issue_date, id) of the last row of the previous page.
+        Each city is read as its own (city, issue_date) index range capped at
+        `limit` rows and the ranges are merged, so a page costs the same at
+        any depth. Rows without an issue date are left out.
+        """
+        conditions, params = _filter_conditions(filters)
+        conditions.insert(0, 'issue_date IS NOT NULL')
+        if after:
+            conditions.append("(issue_date < ? OR (issue_date = ? AND id < ?))")
+            params += [after[0], after[0], after[1]]
+
+        order = "ORDER BY issue_date DESC, id DESC LIMIT ?"
+        cities = filters.get('cities')
+        if not cities:
+            return self._query(f"SELECT * FROM permits WHERE {' AND '.join(conditions)} {order}", params + [limit])
+        ranges = ' UNION ALL '.join(
+            f"SELECT * FROM (SELECT * FROM permits WHERE city = ? AND {' AND '.join(conditions)} {order})"
+            for _ in cities
+        )
+        range_params = []
+        for city in cities:
+            range_params += [city] + params + [limit]
+        return self._query(f"SELECT * FROM ({ranges}) {order}", range_params + [limit])
+
+    def _bbox_where(self, bbox, filters, tile=False):
+        """
+        FROM/WHERE over the R-tree for a (west, south, east, north) box plus filters
+
+        The R-tree rounds its float32 boxes outward, so the exact coordinates
+        are checked too. tile=True leaves out the east and south edges, so
+        a permit on the line between two tiles is counted in only one.
+        """
+        west, south, east, north = bbox
+        conditions, params = _filter_conditions(filters, 'p.')
+        if tile:
+            conditions += ['p.lng >= ?', 'p.lng < ?', 'p.lat > ?', 'p.lat <= ?']
+        else:
+            conditions += ['p.lng >= ?', 'p.lng <= ?', 'p.lat >= ?', 'p.lat <= ?']
+        params += [west, east, south, north]
+        if filters.get('cities'):
+            conditions.append(f"p.city IN ({','.join('?' * len(filters['cities']))})")
+            params += filters['cities']
+        # CROSS JOIN keeps the R-tree as the outer loop, the box is always the selective part
+        sql = ("FROM permits_geo g CROSS JOIN permits p ON p.id = g.id "
+               "WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lng >= ? AND g.min_lng <= ?")
+        for condition in conditions:
+            sql += f" AND {condition}"
+        return sql, [south, north, west, east] + params
+
+    def in_bbox(self, bbox, filters=None, limit=500):
+        """Geocoded permits inside the box, newest first"""
+        where, params = self._bbox_where(bbox, filters or {})
+        return self._query(f"SELECT p.* {where} ORDER BY p.issue_date DESC, p.id DESC LIMIT ?", params + [limit])
+
+    def bbox_clusters(self, bbox, cell_lat, cell_lng, filters=None):
+        """
+        Permits inside a map tile's box grouped into a cell_lat x cell_lng degree grid
+
+        Returns [{'lat', 'lng', 'count', 'id'}] with the centroid of each
+        non-empty cell (id is the permit's when the cell holds just one).
+        """
+        west, south, _, _ = bbox
+        where, params = self._bbox_where(bbox, filters or {}, tile=True)
+        return self._query(
+            f"SELECT AVG(p.lat) AS lat, AVG(p.lng) AS lng, COUNT(*) AS count, MIN(p.id) AS id {where} "
+            f"GROUP BY CAST((p.lat - ?) / ? AS INTEGER), CAST((p.lng - ?) / ? AS INTEGER)",
+            params + [south, cell_lat, west, cell_lng]
+        )
+
+    def geocoded(self, city):
+        """All of a city's permits with coordinates, in id order (the map tile builder's input)"""
+        return self._query(
+            'SELECT * FROM permits WHERE city = ? AND lat IS NOT NULL AND lng IS NOT NULL ORDER BY id', (city,)
+        )
+
+    def missing_coordinates(self, city, limit=1000, offset=0):
+        """City's permits that have no lat/lng yet, newest first (the geocoding worker's queue)"""
+        return self._query(
+            'SELECT * FROM permits WHERE city = ? AND lat IS NULL ORDER BY issue_date DESC, id DESC LIMIT ? OFFSET ?',
+            (city, limit, offset)
+        )
+
+    def first_seen_mark(self):
+        """Highest permit id stored so far - the cursor a delivery made now advances to"""
+        return self._query('SELECT COALESCE(MAX(id), 0) AS id FROM permit_first_seen')[0]['id']
+
+    def first_seen_between(self, city, after, upto, limit=5000):
+        """City's permits first seen after cursor `after` up to `upto` (ids), in first-seen order"""
+        return self._query(
+            "SELECT p.*, f.first_seen FROM permit_first_seen f JOIN permits p ON p.id = f.id "
+            "WHERE f.city = ? AND f.id > ? AND f.id <= ? ORDER BY f.id LIMIT ?",
+            (city, after, upto, limit)
+        )
+
+    def count(self, city=None):
+        if city:
+            sql, params = 'SELECT COALESCE(SUM(permits), 0) AS n FROM permit_daily_counts WHERE city = ?', (city,)
+        else:
+            sql, params = 'SELECT COALESCE(SUM(permits), 0) AS n FROM permit_daily_counts', ()
+        return self._query(sql, params)[0]['n']
+
+    def daily_counts(self, city=None, since=None):
+        """[{'city', 'issue_date', 'permits'}] from the trigger-maintained counts table"""
+        sql = "SELECT city, issue_date, permits FROM permit_daily_counts WHERE permits > 0 AND issue_date != ''"
+        params = []
+        if city:
+            sql += " AND city = ?"
+            params.append(city)
+        if since:
+            sql += " AND issue_date >= ?"
+            params.append(since)
+        return self._query(sql + " ORDER BY city, issue_date DESC", params)
+
+    def city_summary(self):
+        """{city: {'permits', 'min_issue_date', 'max_issue_date'}} from the per-day counts, not the permits table"""
+        rows = self._query(
+            "SELECT city, SUM(permits) AS permits, "
+            "MIN(CASE WHEN issue_date != '' THEN issue_date END) AS min_issue_date, "
+            "MAX(CASE WHEN issue_date != '' THEN issue_date END) AS max_issue_date "
+            "FROM permit_daily_counts WHERE permits > 0 GROUP BY city ORDER BY city"
+        )
+        return {row.pop('city'): row for row in rows}
+
+if __name__ == '__main__':
+    from leads_manifest import LeadsManifest
+    store = PermitStore()
+    store.import_leads(LeadsManifest('leads'))
+    for city, summary in store.city_summary().items():
+        print(f"  {city}: {summary['permits']} permits ({summary['min_issue_date']} to {summary['max_issue_date']})")
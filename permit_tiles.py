@@ -0,0 +1,229 @@
+"""
+Precomputed Mapbox Vector Tiles of the permit points, one tile set per city
+
+After a scrape (and after geocoding) build_cities() regenerates the tiles of
+the cities whose geocoded permits changed - each city's points are hashed
+and a city whose hash matches its last build is skipped. Tiles are written
+to data/tiles/<city>/<z>/<x>/<y>.mvt, and only tiles whose bytes actually
+changed are rewritten, so their ETags stay valid across builds. The app
+serves them as static files (/tiles/...), with a TileJSON per city.
+
+Layer "permits" holds one point per permit with the /last-week fields
+(address, description, date, type, permit_number, value, city, id) as
+properties. The encoder below covers the part of the MVT 2.1 spec points
+need, so there is no protobuf dependency.
+"""
+import hashlib
+import json
+import os
+import shutil
+import struct
+import threading
+from datetime import datetime
+
+from permit_map import lat_to_y, lng_to_x, permit_feature
+
+TILES_ROOT = os.getenv('TILES_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tiles'))
+TILES_MIN_ZOOM = int(os.getenv('TILES_MIN_ZOOM', 8))
+TILES_MAX_ZOOM = int(os.getenv('TILES_MAX_ZOOM', 14))   # Map clients overzoom past this
+TILE_EXTENT = 4096
+TILE_BUFFER = 64        # Points this close to an edge (in tile units) also go in the neighbour tile
+TILES_LAYER = 'permits'
+INDEX_NAME = 'index.json'
+
+
+# ---- MVT / protobuf encoding ----
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type, payload):
+    """Tag plus payload; wire type 2 payloads get their length prefix"""
+    tag = _varint((number << 3) | wire_type)
+    if wire_type == 2:
+        return tag + _varint(len(payload)) + payload
+    return tag + payload
+
+
+def _packed(values):
+    return b''.join(_varint(value) for value in values)
+
+
+def _value(value):
+    """Layer value message for a property"""
+    if isinstance(value, bool):
+        return _field(7, 0, _varint(int(value)))
+    if isinstance(value, int):
+        return _field(6, 0, _varint(_zigzag(value))) if value < 0 else _field(5, 0, _varint(value))
+    if isinstance(value, float):
+        return _field(3, 1, struct.pack('<d', value))
+    return _field(1, 2, str(value).encode('utf-8'))
+
+
+def encode_layer(name, features, extent=TILE_EXTENT):
+    """
+    One MVT layer of points
+
+    features: [(id, x, y, properties)] with x/y in tile units (0..extent).
+    Keys and values are shared across features, as the spec intends.
+    """
+    keys, values = {}, {}
+    encoded = []
+    for feature_id, x, y, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None or value == '':
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            value_key = (type(value).__name__, value)
+            tags.append(values.setdefault(value_key, len(values)))
+        geometry = [(1 & 0x7) | (1 << 3), _zigzag(x), _zigzag(y)]  # MoveTo(1) x y
+        feature = (_field(1, 0, _varint(feature_id)) + _field(2, 2, _packed(tags)) +
+                   _field(3, 0, _varint(1)) + _field(4, 2, _packed(geometry)))
+        encoded.append(_field(2, 2, feature))
+
+    layer = _field(15, 0, _varint(2)) + _field(1, 2, name.encode('utf-8')) + b''.join(encoded)
+    layer += b''.join(_field(3, 2, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_field(4, 2, _value(value)) for _, value in values)
+    layer += _field(5, 0, _varint(extent))
+    return _field(3, 2, layer)
+
+
+# ---- tile sets ----
+
+def _tile_points(rows, zoom, extent=TILE_EXTENT, buffer=TILE_BUFFER):
+    """{(x, y): [(id, px, py, properties)]} for one zoom level"""
+    tiles = {}
+    last = 2 ** zoom - 1
+    for row in rows:
+        fx, fy = lng_to_x(row['lng'], zoom), lat_to_y(row['lat'], zoom)
+        tx, ty = int(fx), int(fy)
+        px, py = int((fx - tx) * extent), int((fy - ty) * extent)
+        properties = permit_feature(row)['properties']
+        properties.pop('id', None)
+        # The home tile plus any neighbour whose buffer the point falls in
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                nx, ny = tx + dx, ty + dy
+                x_in, y_in = px - dx * extent, py - dy * extent
+                if not (0 <= nx <= last and 0 <= ny <= last):
+                    continue
+                if -buffer <= x_in <= extent + buffer and -buffer <= y_in <= extent + buffer:
+                    tiles.setdefault((nx, ny), []).append((row['id'], x_in, y_in, properties))
+    return tiles
+
+
+def _write_if_changed(path, data):
+    """Write atomically unless the file already holds these bytes; True if written"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+class PermitTiles:
+    """Builds and locates the per-city MVT tile sets"""
+
+    def __init__(self, store, root=TILES_ROOT, min_zoom=TILES_MIN_ZOOM, max_zoom=TILES_MAX_ZOOM):
+        self.store = store
+        self.root = root
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._lock = threading.Lock()
+
+    def index(self, city):
+        """The city's build record (fingerprint, bounds, zooms, tile count) or None"""
+        try:
+            with open(os.path.join(self.root, city, INDEX_NAME), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def tile_path(self, city, zoom, x, y):
+        return os.path.join(self.root, city, str(zoom), str(x), f"{y}.mvt")
+
+    def build_city(self, city, force=False):
+        """(Re)build one city's tiles if its geocoded permits changed; returns the index or None if skipped"""
+        rows = self.store.geocoded(city)
+        digest = hashlib.sha1()
+        for row in rows:
+            digest.update(json.dumps([row['id'], row['lat'], row['lng'], permit_feature(row)['properties']],
+                                     default=str).encode('utf-8'))
+        fingerprint = digest.hexdigest()
+        previous = self.index(city)
+        if not force and previous and previous.get('fingerprint') == fingerprint and \
+                previous.get('zooms') == [self.min_zoom, self.max_zoom]:
+            return None
+
+        city_root = os.path.join(self.root, city)
+        written = kept = 0
+        expected = set()
+        for zoom in range(self.min_zoom, self.max_zoom + 1):
+            for (x, y), features in _tile_points(rows, zoom).items():
+                path = self.tile_path(city, zoom, x, y)
+                expected.add(path)
+                if _write_if_changed(path, encode_layer(TILES_LAYER, features)):
+                    written += 1
+                else:
+                    kept += 1
+
+        # Tiles left from the previous build that no longer have any permits
+        removed = 0
+        if os.path.isdir(city_root):
+            for directory, _, files in os.walk(city_root):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    if name.endswith('.mvt') and path not in expected:
+                        os.remove(path)
+                        removed += 1
+
+        index = {
+            'city': city,
+            'fingerprint': fingerprint,
+            'permits': len(rows),
+            'tiles': len(expected),
+            'zooms': [self.min_zoom, self.max_zoom],
+            'bounds': [min(r['lng'] for r in rows), min(r['lat'] for r in rows),
+                       max(r['lng'] for r in rows), max(r['lat'] for r in rows)] if rows else None,
+            'built_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        _write_if_changed(os.path.join(city_root, INDEX_NAME), json.dumps(index, indent=1).encode('utf-8'))
+        print(f"🗺️  {city}: {len(expected)} tiles for {len(rows)} permits "
+              f"({written} written, {kept} unchanged, {removed} removed)")
+        return index
+
+    def build_cities(self, cities=None, force=False):
+        """Rebuild every changed city (default: all cities in the store); returns the cities rebuilt"""
+        with self._lock:
+            rebuilt = []
+            for city in cities or list(self.store.city_summary()):
+                try:
+                    if self.build_city(city, force=force):
+                        rebuilt.append(city)
+                except Exception as e:
+                    print(f"⚠️  Tile build for {city} failed: {e}")
+            return rebuilt
+
+    def remove_city(self, city):
+        shutil.rmtree(os.path.join(self.root, city), ignore_errors=True)
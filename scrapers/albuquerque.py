@@ -1,15 +1,15 @@
 import requests
 from bs4 import BeautifulSoup
-import time
-import random
 import csv
 import os
 from datetime import datetime
+from .utils import http_get, RetryPolicy
 
 class AlbuquerquePermitScraper:
     def __init__(self):
         self.base_url = "https://www.cabq.gov/planning/example/permits"
         self.permits = []
+        self.retry_policy = RetryPolicy(max_attempts=3)
 
     def scrape_permits(self, max_permits=100):
         """Scrape Albuquerque, NM building permits from HTML table"""
@@ -17,10 +17,10 @@ class AlbuquerquePermitScraper:
         print("=" * 60)
 
         # Retry logic with exponential backoff
-        max_retries = 3
+        max_retries = self.retry_policy.max_attempts
         for attempt in range(max_retries):
             try:
-                response = requests.get(self.base_url, timeout=30)
+                response = http_get(self.base_url, timeout=30)
                 response.raise_for_status()
 
                 soup = BeautifulSoup(response.text, 'html.parser')
@@ -36,8 +36,7 @@ class AlbuquerquePermitScraper:
 
                 if not rows or len(rows) <= 1:
                     print(f"Albuquerque: No table rows found on attempt {attempt + 1}")
-                    if attempt < max_retries - 1:
-                        time.sleep(random.uniform(1, 3) * (2 ** attempt))  # Exponential backoff
+                    if self.retry_policy.wait_before_retry(attempt):
                         continue
                     return self.permits
 
@@ -81,10 +80,10 @@ class AlbuquerquePermitScraper:
             except Exception as e:
                 print(f"Albuquerque: Unexpected error on attempt {attempt + 1}: {e}")
 
-            if attempt < max_retries - 1:
-                time.sleep(random.uniform(1, 3) * (2 ** attempt))  # Exponential backoff
+            if not self.retry_policy.wait_before_retry(attempt):
+                break
 
-        print(f"Albuquerque: Failed to scrape after {max_retries} attempts")
+        print(f"Albuquerque: Failed to scrape after {attempt + 1} attempts")
         return self.permits
 
     def save_to_csv(self, filename=None):
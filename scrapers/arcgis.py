@@ -0,0 +1,286 @@
+"""
+Shared ArcGIS FeatureServer / MapServer query engine
+
+Instead of paging serially with resultOffset over where=1=1, the engine:
+1. reads the layer description once (maxRecordCount, objectId field, fields)
+2. asks for the matching objectIds with returnIdsOnly (date predicate pushed
+   into the where clause, so only the window we want is counted)
+3. splits the id list into objectId ranges of at most maxRecordCount rows
+4. fetches those pages concurrently, requesting only the fields a city maps
+
+Servers that can't answer returnIdsOnly fall back to serial offset paging.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import requests
+from .base import PermitScraperBase
+from .utils import retry_with_backoff, http_get, RetryPolicy
+
+DEFAULT_MAX_RECORD_COUNT = 1000
+
+
+class ArcGISQueryError(ValueError):
+    """The server answered with an ArcGIS error payload"""
+
+
+def arcgis_date_where(field, start_date, end_date=None):
+    """Build a standardized-SQL date window predicate for an ArcGIS date field"""
+    clause = f"{field} >= DATE '{start_date.strftime('%Y-%m-%d')}'"
+    if end_date is not None:
+        # DATE literals are midnight, so bound the end with the following day
+        clause += f" AND {field} < DATE '{(end_date + timedelta(days=1)).strftime('%Y-%m-%d')}'"
+    return clause
+
+
+class ArcGISLayer:
+    """Query helper for one ArcGIS layer (.../FeatureServer/0/query)"""
+
+    def __init__(self, query_url, out_fields=None, page_size=None, max_workers=4, timeout=30, logger=None,
+                 retry_policy=None):
+        """
+        Args:
+            query_url: Layer query URL ending in /query
+            out_fields: Fields to request (None = all fields)
+            page_size: Preferred rows per request, capped at maxRecordCount
+            max_workers: Concurrent page requests
+            timeout: Request timeout in seconds
+            logger: Optional logger instance
+            retry_policy: RetryPolicy shared with the rest of the scrape
+        """
+        self.query_url = query_url
+        self.layer_url = query_url[:-len('/query')] if query_url.endswith('/query') else query_url
+        self.out_fields = list(out_fields) if out_fields else None
+        self.page_size = page_size
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.logger = logger
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._description = None
+
+    @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
+    def _get(self, url, params):
+        """GET an ArcGIS REST resource with retry logic"""
+        response = http_get(url, params=params, timeout=self.retry_policy.timeout(self.timeout))
+        response.raise_for_status()
+        data = response.json()
+        if isinstance(data, dict) and 'error' in data:
+            error = data['error']
+            raise ArcGISQueryError(f"{error.get('code')}: {error.get('message', 'Unknown')} {error.get('details') or ''}".strip())
+        return data
+
+    def describe(self):
+        """Layer description (maxRecordCount, objectIdField, fields), cached"""
+        if self._description is None:
+            try:
+                self._description = self._get(self.layer_url, {'f': 'json'})
+            except (requests.RequestException, ValueError) as e:
+                if self.logger:
+                    self.logger.warning(f"Could not read layer description: {e}")
+                self._description = {}
+        return self._description
+
+    @property
+    def max_record_count(self):
+        max_count = self.describe().get('maxRecordCount') or DEFAULT_MAX_RECORD_COUNT
+        if self.page_size:
+            return min(self.page_size, max_count)
+        return max_count
+
+    @property
+    def object_id_field(self):
+        description = self.describe()
+        if description.get('objectIdField'):
+            return description['objectIdField']
+        for field in description.get('fields') or []:
+            if field.get('type') == 'esriFieldTypeOID':
+                return field['name']
+        return 'OBJECTID'
+
+    def _out_fields_param(self):
+        """Requested fields that actually exist on the layer (case-insensitive)"""
+        if not self.out_fields:
+            return '*'
+        known = {f['name'].lower(): f['name'] for f in self.describe().get('fields') or [] if f.get('name')}
+        if not known:
+            return ','.join(self.out_fields)
+        fields = [known[f.lower()] for f in self.out_fields if f.lower() in known]
+        if not fields:
+            return '*'
+        # Always bring the objectId back - incremental scrapes track it
+        return ','.join(dict.fromkeys(fields + [self.object_id_field]))
+
+    def _query(self, params):
+        base = {'outFields': self._out_fields_param(), 'returnGeometry': 'false', 'f': 'json'}
+        base.update(params)
+        try:
+            return self._get(self.query_url, base)
+        except ArcGISQueryError as e:
+            if base['outFields'] == '*':
+                raise
+            # Maybe the projection was rejected - only drop it if asking for
+            # every field actually works
+            data = self._get(self.query_url, dict(base, outFields='*'))
+            if self.logger:
+                self.logger.warning(f"outFields rejected, requesting all fields: {e}")
+            self.out_fields = None
+            return data
+
+    def count(self, where='1=1'):
+        """Number of features matching where (returnCountOnly)"""
+        return self._get(self.query_url, {'where': where, 'returnCountOnly': 'true', 'f': 'json'}).get('count', 0)
+
+    def object_ids(self, where='1=1'):
+        """Sorted objectIds of features matching where (returnIdsOnly)"""
+        data = self._get(self.query_url, {'where': where, 'returnIdsOnly': 'true', 'f': 'json'})
+        return sorted(data.get('objectIds') or [])
+
+    def _id_ranges(self, ids):
+        """Split a sorted id list into (low, high) ranges of at most one page each, newest first"""
+        page = self.max_record_count
+        ranges = [(ids[i], ids[min(i + page, len(ids)) - 1]) for i in range(0, len(ids), page)]
+        return list(reversed(ranges))
+
+    def _fetch_range(self, where, id_range):
+        low, high = id_range
+        oid = self.object_id_field
+        data = self._query({
+            'where': f"({where}) AND {oid} >= {low} AND {oid} <= {high}",
+            'resultRecordCount': self.max_record_count,
+        })
+        return data.get('features') or []
+
+    def iter_features(self, where='1=1', max_records=None, order_by=None):
+        """
+        Yield feature attribute dicts matching where
+
+        When more than max_records features match, the highest objectIds
+        (the most recently loaded rows) are returned.
+        """
+        try:
+            ids = self.object_ids(where)
+        except ArcGISQueryError as e:
+            if self.logger:
+                self.logger.warning(f"returnIdsOnly not supported, paging serially: {e}")
+            yield from self._iter_serial(where, max_records, order_by)
+            return
+
+        if self.logger:
+            self.logger.info(f"{len(ids)} features match, page size {self.max_record_count}")
+        if max_records is not None and len(ids) > max_records:
+            ids = ids[-max_records:]
+        if not ids:
+            return
+
+        ranges = self._id_ranges(ids)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(ranges))) as executor:
+            # map() fetches concurrently but yields pages in range order
+            for features in executor.map(lambda r: self._fetch_range(where, r), ranges):
+                for feature in features:
+                    yield feature.get('attributes', {})
+
+    def _iter_serial(self, where, max_records, order_by):
+        """Fallback resultOffset paging for servers without returnIdsOnly"""
+        offset = 0
+        fetched = 0
+        page = self.max_record_count
+        while max_records is None or fetched < max_records:
+            params = {
+                'where': where,
+                'resultOffset': offset,
+                'resultRecordCount': page if max_records is None else min(page, max_records - fetched),
+            }
+            if order_by:
+                params['orderByFields'] = order_by
+            features = self._query(params).get('features') or []
+            if not features:
+                break
+            for feature in features:
+                yield feature.get('attributes', {})
+            fetched += len(features)
+            if len(features) < params['resultRecordCount']:
+                break
+            offset += len(features)
+
+
+class ArcGISPermitScraper(PermitScraperBase):
+    """
+    Base for ArcGIS-backed city scrapers
+
+    Subclasses set endpoints (URLs or dicts with 'name'/'url'), date_field,
+    out_fields (the attributes their map_record() reads) and implement
+    map_record(attrs).
+    """
+    endpoints = []
+    date_field = None
+    out_fields = None
+    where = None
+    order_by = None
+    max_workers = 4
+
+    def date_where(self, start_date, end_date):
+        """Date window predicate pushed into the where clause"""
+        if not self.date_field:
+            return None
+        return arcgis_date_where(self.date_field, start_date, end_date)
+
+    def _where(self, start_date, end_date, layer=None, last_object_id=None):
+        date_clause = self.date_where(start_date, end_date)
+        if date_clause and layer is not None and last_object_id is not None:
+            # Incremental runs also pick up rows loaded since the last run
+            # that carry an older issue date (late data entry, backfills)
+            date_clause = f"({date_clause}) OR {layer.object_id_field} > {int(last_object_id)}"
+        clauses = [c for c in (date_clause, self.where) if c]
+        return ' AND '.join(f"({c})" for c in clauses) or '1=1'
+
+    def fetch_records(self, start_date, end_date, max_records):
+        answered = False
+        last_error = None
+        for endpoint in self.endpoints:
+            url = endpoint['url'] if isinstance(endpoint, dict) else endpoint
+            label = endpoint.get('name', url) if isinstance(endpoint, dict) else url
+            self.logger.info(f"Trying {label}")
+            print(f"\n🔍 Trying: {label}...")
+
+            layer = ArcGISLayer(url, self.out_fields, max_workers=self.max_workers, logger=self.logger,
+                                retry_policy=self.retry_policy)
+            last_object_id = self.watermark.object_id(url) if self.incremental else None
+            where = self._where(start_date, end_date, layer, last_object_id)
+            order_by = self.order_by or (f"{self.date_field} DESC" if self.date_field else None)
+            yielded = 0
+            try:
+                try:
+                    for attrs in layer.iter_features(where, max_records, order_by):
+                        yielded += 1
+                        self._track_object_id(url, attrs.get(layer.object_id_field))
+                        yield attrs
+                except ArcGISQueryError as e:
+                    if yielded or where == (self.where or '1=1'):
+                        raise
+                    # Server rejected the date predicate - fall back to the
+                    # newest-first listing these endpoints used before
+                    self.logger.warning(f"{label} rejected date filter ({e}), listing newest first")
+                    for attrs in layer._iter_serial(self.where or '1=1', max_records, order_by):
+                        yielded += 1
+                        self._track_object_id(url, attrs.get(layer.object_id_field))
+                        yield attrs
+            except (requests.RequestException, ArcGISQueryError) as e:
+                if yielded:
+                    raise
+                self.logger.warning(f"{label} failed: {e}")
+                print(f"   ❌ {label} failed: {str(e)[:60]}...")
+                last_error = e
+                continue
+
+            if yielded:
+                self.logger.info(f"✅ Got {yielded} records from {label}")
+                return
+            answered = True
+
+        # Only an error if no endpoint answered at all - an empty window is
+        # a valid result for incremental scrapes
+        if not answered and last_error is not None:
+            raise last_error
+
+    def _track_object_id(self, url, object_id):
+        if isinstance(object_id, int):
+            self.object_ids[url] = max(object_id, self.object_ids.get(url, object_id))
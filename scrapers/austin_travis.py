@@ -2,7 +2,7 @@ import csv
 import requests
 from datetime import datetime
 from io import StringIO
-from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results
+from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results, http_get
 
 class AustinTravisPermitScraper:
     def __init__(self):
@@ -28,7 +28,7 @@ class AustinTravisPermitScraper:
                 '$where': "permit_class_mapped='Residential'"
             }
 
-            response = requests.get(url, params=params, timeout=15)
+            response = http_get(url, params=params, timeout=15)
             response.raise_for_status()
             data = response.json()
 
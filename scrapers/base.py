@@ -0,0 +1,268 @@
+"""
+Shared base class for API-backed permit scrapers
+
+Handles the parts every city scraper repeats - logging, health tracking,
+de-duplication, partial result saving, CSV output and the run() wrapper.
+Fetch engines (Socrata, ArcGIS) subclass this and implement fetch_records();
+city scrapers then only provide their config and a map_record() function.
+
+Scrapes are incremental: after a clean run the newest issue date is kept as
+a watermark and the next run only asks for records from that date on. A
+full-window scrape still runs every full_refresh_days to pick up late
+edits to older permits.
+"""
+from datetime import datetime, timedelta
+import csv
+import hashlib
+import json
+import os
+import threading
+import requests
+from .utils import setup_logger, ScraperHealthCheck, ScraperWatermark, RetryPolicy, save_partial_results
+
+
+def _is_iso_date(value):
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+class PermitScraperBase:
+    name = None            # Scraper key - log/health file name and leads folder
+    display_name = None    # Banner name, e.g. "Austin TX"
+    leads_dir = 'leads'    # Root folder for save_to_csv()
+    default_days_back = 90
+    full_refresh = None    # True/False forces the scrape mode, None = automatic
+    full_refresh_days = int(os.getenv('SCRAPER_FULL_REFRESH_DAYS', 7))
+
+    def __init__(self):
+        self.permits = []
+        self.seen_permit_ids = set()
+        self.logger = setup_logger(self.name)
+        self.health_check = ScraperHealthCheck(self.name)
+        self.watermark = ScraperWatermark(self.name)
+        self.retry_policy = RetryPolicy()  # Replaced per run by the scheduler (shared deadline)
+        self.incremental = False  # Current scrape only fetches past the watermark
+        self.up_to_date = False   # Incremental scrape finished cleanly with nothing new
+        self.object_ids = {}      # Highest source objectId seen per endpoint (ArcGIS)
+        self.fetch_error = None   # Error that ended the last scrape early, if any
+        self.permit_count = 0     # Permits yielded by the last scrape
+        self.stop_event = threading.Event()  # Set by the scraper pool when the run's deadline passes
+
+    def fetch_records(self, start_date, end_date, max_records):
+        """Yield raw source records newest first (implemented by fetch engines)"""
+        raise NotImplementedError
+
+    def map_record(self, record):
+        """Convert one raw record to a permit dict, or None to skip it"""
+        raise NotImplementedError
+
+    def iter_permits(self, max_permits=5000, days_back=None, full=None, batch_size=500):
+        """
+        Scrape permits with auto-recovery, yielding them in batches as they arrive
+
+        Nothing is kept in self.permits, so a consumer writing each batch out
+        (see permit_pipeline.py) holds at most one batch per city in memory.
+        Fetch errors end the scrape after yielding what was fetched; the error
+        is left in self.fetch_error.
+
+        Args:
+            max_permits: Maximum number of permits to retrieve
+            days_back: Size of the full window (passing it forces a full scrape)
+            full: True = full window, False = incremental, None = automatic
+            batch_size: Permits per yielded list
+        """
+        if full is None:
+            full = self.full_refresh
+        if full is None:
+            full = days_back is not None or self.watermark.needs_full_scrape(self.full_refresh_days)
+        if days_back is None:
+            days_back = self.default_days_back
+
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days_back)
+        skip_hashes = set()
+        if not full:
+            since = datetime.strptime(self.watermark.last_issue_date, '%Y-%m-%d')
+            if since > start_date:
+                start_date = since
+                skip_hashes = self.watermark.row_hashes
+            else:
+                full = True  # Watermark is older than the window anyway
+        self.incremental = not full
+        self.up_to_date = False
+        self.fetch_error = None
+        self.permit_count = 0
+
+        self.logger.info(f"🏗️  {self.display_name} Construction Permits Scraper")
+        self.logger.info(f"Date Range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
+        print(f"🏗️  {self.display_name} Construction Permits Scraper")
+        print(f"=" * 60)
+        print(f"📅 Date Range: {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
+        if self.incremental:
+            print(f"🔁 Incremental: fetching up to {max_permits} permits issued since {self.watermark.last_issue_date}...")
+        else:
+            print(f"📡 Full window: fetching up to {max_permits} permits from last {days_back} days...")
+
+        today = end_date.strftime('%Y-%m-%d')
+        newest_date, newest_hashes = None, []
+        clean = False
+        unchanged = 0
+        batch = []
+        try:
+            for record in self.fetch_records(start_date, end_date, max_permits):
+                if self.stop_event.is_set():
+                    break
+                permit = self.map_record(record)
+                if not permit:
+                    continue
+
+                permit_id = permit.get('permit_number')
+                if not permit_id or permit_id in self.seen_permit_ids:
+                    continue
+                self.seen_permit_ids.add(permit_id)
+                row_hash = self._row_hash(permit)
+                if row_hash in skip_hashes:
+                    unchanged += 1  # Already scraped on the watermark date
+                    continue
+
+                # Track the newest issue date (and its rows) for the watermark
+                issued = str(permit.get('issued_date') or '')[:10]
+                if _is_iso_date(issued) and issued <= today:
+                    if newest_date is None or issued > newest_date:
+                        newest_date, newest_hashes = issued, [row_hash]
+                    elif issued == newest_date:
+                        newest_hashes.append(row_hash)
+
+                batch.append(permit)
+                self.permit_count += 1
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+
+                if self.permit_count % 1000 == 0:
+                    print(f"✓ Fetched {self.permit_count} permits so far...")
+                if self.permit_count >= max_permits:
+                    break
+            clean = not self.stop_event.is_set()
+
+        except (requests.RequestException, ValueError) as e:
+            # ValueError covers bad JSON and rejected queries
+            self.logger.error(f"Fetch error, stopping scrape: {e}")
+            self.fetch_error = e
+
+        if batch:
+            yield batch
+
+        # Only move the watermark when the window was read completely - a
+        # truncated or failed run would otherwise leave a gap behind it
+        if clean and self.permit_count < max_permits and (self.permit_count or self.incremental):
+            full_run = not self.incremental
+            self.watermark.advance(newest_date, newest_hashes, self.object_ids, full=full_run)
+            self.logger.info(f"Watermark: {self.watermark.last_issue_date} ({'full' if full_run else 'incremental'} run)")
+            self.up_to_date = self.incremental and not self.permit_count
+        elif clean and self.permit_count:
+            self.logger.warning(f"Hit max_permits ({max_permits}) - watermark not advanced")
+        elif self.stop_event.is_set():
+            self.logger.warning("Stopped at the run deadline - watermark not advanced")
+
+        print()
+        print(f"=" * 60)
+
+        if self.permit_count:
+            self.logger.info(f"✅ Scraping Complete! Found {self.permit_count} permits")
+            self.health_check.record_success(self.permit_count)
+            print(f"✅ Scraping Complete!")
+            print(f"   Total Permits Found: {self.permit_count}")
+            if unchanged:
+                print(f"   Unchanged Since Last Run: {unchanged}")
+        elif self.up_to_date:
+            self.logger.info(f"✅ Up to date - no new permits since {self.watermark.last_issue_date}")
+            self.health_check.record_success(0)
+            print(f"✅ Up to date - no new permits since {self.watermark.last_issue_date}")
+        else:
+            self.logger.error("❌ No permits found")
+            self.health_check.record_failure("No permits retrieved")
+            print(f"❌ No permits found")
+
+        print(f"=" * 60)
+        print()
+
+    def scrape_permits(self, max_permits=5000, days_back=None, full=None):
+        """Scrape permits with auto-recovery into self.permits (see iter_permits)"""
+        for batch in self.iter_permits(max_permits, days_back, full):
+            self.permits.extend(batch)
+
+        if self.fetch_error and self.permits:
+            today = datetime.now().strftime('%Y-%m-%d')
+            filename = f'{self.leads_dir}/{self.name}/{today}/{today}_{self.name}_partial.csv'
+            save_partial_results(self.permits, filename, self.name)
+
+        return self.permits
+
+    def _row_hash(self, permit):
+        """Stable hash of a mapped permit, used to spot rows already scraped"""
+        return hashlib.sha1(json.dumps(permit, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _parse_cost(self, value):
+        """Parse cost value from various formats to a float"""
+        if not value:
+            return 0
+        try:
+            if isinstance(value, (int, float)):
+                return float(value)
+            return float(str(value).replace('$', '').replace(',', ''))
+        except:
+            return 0
+
+    def _format_cost(self, value):
+        """Format cost value as a dollar string"""
+        return f"${self._parse_cost(value):,.2f}"
+
+    def _format_date(self, value):
+        """Convert epoch milliseconds or ISO date strings to YYYY-MM-DD"""
+        if not value:
+            return 'N/A'
+        try:
+            if isinstance(value, (int, float)):
+                return datetime.fromtimestamp(int(value) / 1000).strftime('%Y-%m-%d')
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00')).strftime('%Y-%m-%d')
+        except:
+            return 'N/A'
+
+    def save_to_csv(self, filename=None):
+        if not self.permits:
+            return
+        if filename is None:
+            today = datetime.now().strftime('%Y-%m-%d')
+            filename = f'{self.leads_dir}/{self.name}/{today}/{today}_{self.name}.csv'
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.permits[0].keys()))
+            writer.writeheader()
+            writer.writerows(self.permits)
+        print(f"✅ Saved {len(self.permits)} permits to {filename}")
+
+    def run(self):
+        """Main execution with error handling and auto-recovery"""
+        try:
+            permits = self.scrape_permits()
+            if permits:
+                self.save_to_csv()
+                self.logger.info(f"✅ Scraped {len(permits)} permits for {self.name}")
+                print(f"✅ Scraped {len(permits)} permits for {self.name}")
+                return permits
+            elif self.up_to_date:
+                print(f"✅ No new permits for {self.name} since {self.watermark.last_issue_date}")
+                return []
+            else:
+                self.logger.warning(f"❌ No permits scraped for {self.name}")
+                print(f"❌ No permits scraped for {self.name} - will retry next run")
+                return []
+        except Exception as e:
+            self.logger.error(f"Fatal error in scraper: {e}", exc_info=True)
+            self.health_check.record_failure(str(e))
+            print(f"❌ Fatal error in {self.name} scraper: {e}")
+            return []
@@ -3,7 +3,7 @@ import requests
 import csv
 import time
 import os
-from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck
+from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, http_get
 
 class BostonPermitScraper:
     def __init__(self):
@@ -15,7 +15,7 @@ class BostonPermitScraper:
 
     @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
     def _fetch_batch(self, endpoint_url, params):
-        response = requests.get(endpoint_url, params=params, timeout=30)
+        response = http_get(endpoint_url, params=params, timeout=30)
         response.raise_for_status()
         return response.json()
 
@@ -1,300 +1,24 @@
-from datetime import datetime, timedelta
-import requests
-import csv
-import time
-import os
-from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results, validate_state
-
-class HoustonPermitScraper:
-    def __init__(self):
-        # Houston uses Socrata API
-        self.base_url = "https://data.houstontexas.gov/resource/msrk-w9d7.json"
-        self.permits = []
-        self.seen_permit_ids = set()
-        self.logger = setup_logger('houston')
-        self.health_check = ScraperHealthCheck('houston')
-
-    @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
-    def _fetch_arcgis_batch(self, url, params):
-        """Fetch a single ArcGIS batch with retry logic"""
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
-
-    @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
-    def _fetch_csv(self, url):
-        """Fetch CSV download with retry logic"""
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
-        return response.text
-
-    def scrape_permits(self, max_permits=5000, days_back=90):
-        """Scrape Houston permits with auto-recovery"""
-        self.logger.info("🏗️  Houston TX Construction Permits Scraper")
-        print(f"🏗️  Houston TX Construction Permits Scraper")
-        print(f"=" * 60)
-        print(f"📅 Date Range: {(datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')} to {datetime.now().strftime('%Y-%m-%d')}")
-        print(f"📡 Fetching up to {max_permits} permits from last {days_back} days...")
-
-        # Calculate date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days_back)
-        start_str = start_date.strftime('%Y-%m-%d')
-        end_str = end_date.strftime('%Y-%m-%d')
-
-        self.logger.info(f"Date Range: {start_str} to {end_str}")
-
-        offset = 0
-        batch_size = 1000
-        consecutive_failures = 0
-        max_consecutive_failures = 3
-
-        while len(self.permits) < max_permits:
-            try:
-                params = {
-                    '$where': f"issue_date >= '{start_str}' AND issue_date <= '{end_str}'",
-                    '$order': 'issue_date DESC',
-                    '$limit': min(batch_size, max_permits - len(self.permits)),
-                    '$offset': offset
-                }
-
-                data = self._fetch_batch(params)
-
-                if not data:
-                    self.logger.info(f"No more data at offset {offset}")
-                    break
-
-                # Reset failure counter on success
-                consecutive_failures = 0
-
-                for record in data:
-                    permit_id = record.get('permit_num') or record.get('permit_number') or str(record.get('id', ''))
-                    if permit_id not in self.seen_permit_ids:
-                        self.seen_permit_ids.add(permit_id)
-                        self.permits.append({
-                            'permit_number': permit_id,
-                            'address': f"{record.get('original_address1', '')}, {record.get('city', '')}, {record.get('state', '')}".strip(', '),
-                            'type': record.get('permit_type_desc'),
-                            'value': record.get('total_job_valuation', 0),
-                            'issued_date': self._format_date(record.get('issue_date')),
-                            'status': record.get('status')
-                        })
-
-                self.logger.debug(f"Fetched batch at offset {offset}: {len(data)} records")
-
-                if len(data) < batch_size:
-                    break
-                offset += batch_size
-                time.sleep(0.5)
-
-            except requests.RequestException as e:
-                consecutive_failures += 1
-                self.logger.warning(f"Request error at offset {offset}: {e}")
-
-                if consecutive_failures >= max_consecutive_failures:
-                    self.logger.error(f"Too many consecutive failures ({consecutive_failures}), stopping")
-                    if self.permits:
-                        today = datetime.now().strftime('%Y-%m-%d')
-                        filename = f'../leads/houston/{today}/{today}_houston_partial.csv'
-                        save_partial_results(self.permits, filename, 'houston')
-                    break
-
-                offset += batch_size
-                time.sleep(2)
-
-            except Exception as e:
-                consecutive_failures += 1
-                self.logger.error(f"Unexpected error at offset {offset}: {e}", exc_info=True)
-
-        if self.permits:
-            self.logger.info(f"✅ Success! Got {len(self.permits)} permits")
-            self.health_check.record_success(len(self.permits))
-            print(f"✅ Successfully retrieved {len(self.permits)} permits!")
-            return self.permits
-        else:
-            self.logger.error("All Houston endpoints failed")
-            self.health_check.record_failure("All endpoints failed")
-            print(f"\n⚠️  All Houston endpoints failed - will retry next run")
-            return []
-    
-    def _try_arcgis_api(self, url, max_permits, days_back):
-        """Try ArcGIS REST API with auto-recovery"""
-        # Calculate date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days_back)
-        start_str = start_date.strftime('%Y-%m-%d')
-        
-        offset = 0
-        batch_size = 1000
-        consecutive_failures = 0
-        max_consecutive_failures = 3
-
-        while len(self.permits) < max_permits:
-            try:
-                params = {
-                    'where': f"ISSUE_DATE >= date '{start_str}'",
-                    'outFields': '*',
-                    'returnGeometry': 'false',
-                    'resultOffset': offset,
-                    'resultRecordCount': min(batch_size, max_permits - len(self.permits)),
-                    'f': 'json'
-                }
-
-                data = self._fetch_arcgis_batch(url, params)
-
-                if 'features' not in data or not data['features']:
-                    self.logger.info(f"No more data at offset {offset}")
-                    break
-
-                # Reset failure counter on success
-                consecutive_failures = 0
-
-                for feature in data['features']:
-                    attrs = feature.get('attributes', {})
-                    permit_id = str(attrs.get('PERMIT_NUMBER') or attrs.get('PermitNumber') or attrs.get('OBJECTID', ''))
-
-                    if permit_id not in self.seen_permit_ids:
-                        self.seen_permit_ids.add(permit_id)
-
-                        # Extract address first
-                        address = attrs.get('ADDRESS') or 'N/A'
-
-                        # STATE VALIDATION: Only accept Texas addresses
-                        if not validate_state(address, 'houston', self.logger):
-                            continue  # Skip this record - wrong state
-
-                        self.permits.append({
-                            'permit_number': permit_id,
-                            'address': address,
-                            'type': attrs.get('WORK_TYPE') or 'N/A',
-                            'value': self._parse_cost(attrs.get('COST') or 0),
-                            'issued_date': self._format_date(attrs.get('ISSUE_DATE')),
-                            'status': attrs.get('STATUS') or 'N/A'
-                        })
-
-                self.logger.debug(f"Fetched batch at offset {offset}: {len(data['features'])} records")
-
-                if len(data['features']) < batch_size:
-                    break
-                offset += batch_size
-                time.sleep(0.5)
-
-            except requests.RequestException as e:
-                consecutive_failures += 1
-                self.logger.warning(f"Request error at offset {offset}: {e}")
-
-                if consecutive_failures >= max_consecutive_failures:
-                    self.logger.error(f"Too many consecutive failures, stopping ArcGIS API")
-                    if self.permits:
-                        today = datetime.now().strftime('%Y-%m-%d')
-                        filename = f'../leads/houston/{today}/{today}_houston_partial.csv'
-                        save_partial_results(self.permits, filename, 'houston')
-                    break
-
-                offset += batch_size
-                time.sleep(2)
-
-            except Exception as e:
-                consecutive_failures += 1
-                self.logger.error(f"Unexpected error at offset {offset}: {e}", exc_info=True)
-
-                if consecutive_failures >= max_consecutive_failures:
-                    self.logger.error("Too many consecutive failures, stopping ArcGIS API")
-                    if self.permits:
-                        today = datetime.now().strftime('%Y-%m-%d')
-                        filename = f'../leads/houston/{today}/{today}_houston_partial.csv'
-                        save_partial_results(self.permits, filename, 'houston')
-                    break
-
-                offset += batch_size
-                time.sleep(2)
-
-        return len(self.permits) > 0
-    
-    def _try_arcgis_download(self, url, max_permits, days_back):
-        """Try downloading CSV from ArcGIS Hub with auto-recovery"""
-        try:
-            csv_text = self._fetch_csv(url)
-            import io
-            reader = csv.DictReader(io.StringIO(csv_text))
-            
-            for row in reader:
-                if len(self.permits) >= max_permits:
-                    break
-                permit_id = str(row.get('permit_number') or row.get('PERMIT_NUMBER') or row.get('OBJECTID', ''))
-                
-                if permit_id not in self.seen_permit_ids:
-                    self.seen_permit_ids.add(permit_id)
-                    
-                    # Extract address first
-                    address = row.get('address') or 'N/A'
-                    
-                    # STATE VALIDATION: Only accept Texas addresses
-                    if not validate_state(address, 'houston', self.logger):
-                        continue  # Skip this record - wrong state
-                    
-                    self.permits.append({
-                        'permit_number': permit_id,
-                        'address': address,
-                        'type': row.get('work_type') or 'N/A',
-                        'value': self._parse_cost(row.get('cost') or 0),
-                        'issued_date': self._format_date(row.get('issue_date')),
-                        'status': row.get('status') or 'N/A'
-                    })
-            
-            return len(self.permits) > 0
-
-        except Exception as e:
-            self.logger.error(f"CSV download failed: {e}", exc_info=True)
-            return False
-    
-    def _parse_cost(self, value):
-        try:
-            return float(str(value).replace('$', '').replace(',', '')) if value else 0
-        except:
-            return 0
-    
-    def _format_date(self, timestamp):
-        if not timestamp:
-            return 'N/A'
-        try:
-            if isinstance(timestamp, (int, float)):
-                return datetime.fromtimestamp(int(timestamp) / 1000).strftime('%Y-%m-%d')
-            return str(timestamp)[:10]
-        except:
-            return 'N/A'
-    
-    def save_to_csv(self, filename=None):
-        if not self.permits:
-            return
-        if filename is None:
-            today = datetime.now().strftime('%Y-%m-%d')
-            filename = f'../leads/houston/{today}/{today}_houston.csv'
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=list(self.permits[0].keys()))
-            writer.writeheader()
-            writer.writerows(self.permits)
-        print(f"✅ Saved {len(self.permits)} permits to {filename}")
-
-    def run(self):
-        """Main execution with error handling and auto-recovery"""
-        try:
-            permits = self.scrape_permits()
-            if permits:
-                self.save_to_csv()
-                self.logger.info(f"✅ Scraped {len(permits)} permits for houston")
-                print(f"✅ Scraped {len(permits)} permits for houston")
-                return permits
-            else:
-                self.logger.warning("❌ No permits scraped for houston")
-                print(f"❌ No permits scraped for houston - will retry next run")
-                return []
-        except Exception as e:
-            self.logger.error(f"Fatal error in scraper: {e}", exc_info=True)
-            self.health_check.record_failure(str(e))
-            print(f"❌ Fatal error in houston scraper: {e}")
-            return []
+from .socrata import SocrataPermitScraper
+
+class HoustonPermitScraper(SocrataPermitScraper):
+    name = 'houston'
+    display_name = 'Houston TX'
+    leads_dir = '../leads'
+    # Houston uses Socrata API
+    endpoints = ['https://data.houstontexas.gov/resource/msrk-w9d7.json']
+    date_field = 'issue_date'
+    select_fields = ['permit_num', 'permit_number', 'original_address1', 'city', 'state',
+                     'permit_type_desc', 'total_job_valuation', 'status']
+
+    def map_record(self, record):
+        return {
+            'permit_number': record.get('permit_num') or record.get('permit_number') or record.get(':id', ''),
+            'address': f"{record.get('original_address1', '')}, {record.get('city', '')}, {record.get('state', '')}".strip(', '),
+            'type': record.get('permit_type_desc'),
+            'value': record.get('total_job_valuation', 0),
+            'issued_date': self._format_date(record.get('issue_date')),
+            'status': record.get('status')
+        }
 
 def scrape_permits():
     return HoustonPermitScraper().scrape_permits()
@@ -3,7 +3,7 @@ import requests
 from datetime import datetime
 from io import StringIO
 import os
-from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results
+from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results, http_get
 
 class NashvilleDavidsonPermitScraper:
     def __init__(self):
@@ -30,7 +30,7 @@ class NashvilleDavidsonPermitScraper:
                 'f': 'json'
             }
 
-            response = requests.get(url, params=params, timeout=15)
+            response = http_get(url, params=params, timeout=15)
             if response.status_code == 200:
                 data = response.json()
 
@@ -1,9 +1,8 @@
 from datetime import datetime, timedelta
 import requests
 import csv
-import time
 import os
-from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, validate_state
+from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, validate_state, http_get
 
 class PhiladelphiaPermitScraper:
     def __init__(self):
@@ -15,7 +14,7 @@ class PhiladelphiaPermitScraper:
 
     @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
     def _fetch_batch(self, endpoint_url, params):
-        response = requests.get(endpoint_url, params=params, timeout=30)
+        response = http_get(endpoint_url, params=params, timeout=30)
         response.raise_for_status()
         return response.json()
 
@@ -80,7 +79,6 @@ class PhiladelphiaPermitScraper:
                     if len(data) < batch_size:
                         break
                     offset += batch_size
-                    time.sleep(0.5)  # Rate limiting
 
                 if self.permits:
                     self.logger.info(f"✅ Success! Got {len(self.permits)} permits from Carto")
@@ -0,0 +1,157 @@
+"""
+Bounded worker pool for running city scrapers concurrently
+
+Cities run in parallel up to max_workers, but no more than per_host_limit
+scrapers may be in flight against the same API host at once (several cities
+share services.arcgis.com, data portals, etc). A global wall-clock deadline
+stops scheduling new cities and tells the running ones to stop: each
+scraper gets a `stop_event`, checked between batches by the scrapers and
+the pipeline, so a timed-out city is abandoned without publishing its CSV
+or moving its watermark. The run then waits up to stop_grace_seconds for
+those threads to wind down before returning.
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_HOST_LIMIT = 2
+DEFAULT_STOP_GRACE = 60    # Seconds timed-out scrapers get to notice their stop_event
+
+# Outcome statuses yielded by ScraperPool.run()
+STATUS_DONE = 'done'
+STATUS_ERROR = 'error'
+STATUS_STOPPED = 'stopped'
+STATUS_TIMEOUT = 'timeout'
+
+
+def scraper_hosts(scraper):
+    """
+    Collect the API hostnames a scraper instance talks to
+
+    Looks at the attributes the scrapers already use for their endpoints:
+    base_url, arcgis_url, url and the endpoints list (plain URLs or dicts
+    with a 'url' key).
+    """
+    urls = []
+    for attr in ('base_url', 'arcgis_url', 'url'):
+        value = getattr(scraper, attr, None)
+        if isinstance(value, str):
+            urls.append(value)
+
+    for endpoint in getattr(scraper, 'endpoints', None) or []:
+        if isinstance(endpoint, dict):
+            urls.append(endpoint.get('url'))
+        elif isinstance(endpoint, str):
+            urls.append(endpoint)
+
+    hosts = set()
+    for url in urls:
+        if url:
+            host = urlparse(url).hostname
+            if host:
+                hosts.add(host.lower())
+    return hosts
+
+
+class ScraperPool:
+    """Run (city_name, scraper) jobs concurrently with per-host caps and a deadline"""
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 deadline_seconds=None, should_stop=None, stop_grace_seconds=DEFAULT_STOP_GRACE):
+        """
+        Args:
+            max_workers: Maximum number of cities scraped at the same time
+            per_host_limit: Maximum concurrent cities hitting the same host
+            deadline_seconds: Wall-clock budget for the whole run (None = no limit)
+            should_stop: Optional callable polled between scheduling rounds;
+                returning True stops new cities from starting (kill switch)
+            stop_grace_seconds: How long run() waits for timed-out scrapers
+                to stop before returning
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.deadline_seconds = deadline_seconds
+        self.should_stop = should_stop or (lambda: False)
+        self.stop_grace_seconds = stop_grace_seconds
+
+    def run(self, jobs, fn):
+        """
+        Run fn(city_name, scraper) for every job and yield outcomes as they finish
+
+        Yields (city_name, status, value) tuples where status is one of
+        STATUS_DONE (value is fn's return value), STATUS_ERROR (value is the
+        exception), STATUS_STOPPED (never started - stop requested) or
+        STATUS_TIMEOUT (not finished before the deadline - its scraper's
+        stop_event is set and run() returns once it has stopped, or after
+        stop_grace_seconds).
+        """
+        start = time.monotonic()
+        deadline = start + self.deadline_seconds if self.deadline_seconds else None
+
+        pending = [(city_name, scraper, scraper_hosts(scraper)) for city_name, scraper in jobs]
+        running = {}
+        host_counts = Counter()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scraper')
+        try:
+            while pending or running:
+                if pending and self.should_stop():
+                    for city_name, _, _ in pending:
+                        yield city_name, STATUS_STOPPED, None
+                    pending = []
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    for city_name, _, _ in pending:
+                        yield city_name, STATUS_TIMEOUT, None
+                    for city_name, _, stop_event in running.values():
+                        stop_event.set()
+                        yield city_name, STATUS_TIMEOUT, None
+                    pending = []
+                    self._wait_for_stragglers(running)
+                    running = {}
+                    break
+
+                # Start every pending city whose hosts still have capacity,
+                # keeping the original list order as priority
+                still_pending = []
+                for city_name, scraper, hosts in pending:
+                    has_slot = len(running) < self.max_workers
+                    host_free = all(host_counts[h] < self.per_host_limit for h in hosts)
+                    if has_slot and host_free:
+                        for h in hosts:
+                            host_counts[h] += 1
+                        scraper.stop_event = threading.Event()
+                        future = executor.submit(fn, city_name, scraper)
+                        running[future] = (city_name, hosts, scraper.stop_event)
+                    else:
+                        still_pending.append((city_name, scraper, hosts))
+                pending = still_pending
+
+                if not running:
+                    continue
+
+                timeout = 1.0
+                if deadline is not None:
+                    timeout = max(0.0, min(timeout, deadline - time.monotonic()))
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    city_name, hosts, _ = running.pop(future)
+                    for h in hosts:
+                        host_counts[h] -= 1
+                    try:
+                        yield city_name, STATUS_DONE, future.result()
+                    except Exception as e:
+                        yield city_name, STATUS_ERROR, e
+        finally:
+            # Stragglers were already given their grace period - don't block on them
+            executor.shutdown(wait=False)
+
+    def _wait_for_stragglers(self, running):
+        """Give timed-out scrapers (stop_event set) a moment to finish before the run moves on"""
+        _, still_running = wait(list(running), timeout=self.stop_grace_seconds)
+        for future in still_running:
+            print(f"⚠️  {running[future][0]} scraper still running {self.stop_grace_seconds}s after the deadline")
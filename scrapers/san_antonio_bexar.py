@@ -3,7 +3,7 @@ import requests
 from datetime import datetime
 from io import StringIO
 import os
-from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results
+from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results, http_get
 
 class SanAntonioBexarPermitScraper:
     def __init__(self):
@@ -23,7 +23,7 @@ class SanAntonioBexarPermitScraper:
             # San Antonio OpenGov CSV - Direct download
             csv_url = 'https://data.sanantonio.gov/dataset/05012dcb-ba1b-4ade-b5f3-7403bc7f52eb/resource/fbb7202e-c6c1-475b-849e-c5c2cfb65833/download/accelasubmitpermitsextract.csv'
 
-            response = requests.get(csv_url, timeout=30)
+            response = http_get(csv_url, timeout=30)
             response.raise_for_status()
 
             # Parse CSV
@@ -4,7 +4,7 @@ import csv
 import io
 import time
 import os
-from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results, validate_state
+from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results, validate_state, http_get
 
 class SanAntonioPermitScraper:
     def __init__(self):
@@ -26,14 +26,14 @@ class SanAntonioPermitScraper:
     @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
     def _fetch_csv(self, url):
         """Fetch CSV data with retry logic"""
-        response = requests.get(url, timeout=60)
+        response = http_get(url, timeout=60)
         response.raise_for_status()
         return response.content.decode('utf-8')
 
     @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
     def _fetch_arcgis(self, url, params):
         """Fetch ArcGIS data with retry logic"""
-        response = requests.get(url, params=params, timeout=30)
+        response = http_get(url, params=params, timeout=30)
         response.raise_for_status()
         return response.json()
 
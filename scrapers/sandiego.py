@@ -3,7 +3,7 @@ import requests
 import csv
 import time
 import os
-from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results
+from .utils import retry_with_backoff, setup_logger, ScraperHealthCheck, save_partial_results, http_get
 
 class SanDiegoPermitScraper:
     def __init__(self):
@@ -19,7 +19,7 @@ class SanDiegoPermitScraper:
     @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
     def _fetch_csv(self, url):
         """Fetch CSV data with retry logic"""
-        response = requests.get(url, timeout=60)
+        response = http_get(url, timeout=60)
         response.raise_for_status()
         return response.text
 
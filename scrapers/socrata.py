@@ -0,0 +1,184 @@
+"""
+Shared Socrata (SODA / SoQL) fetch engine
+
+Pages with a keyset cursor on (date_field, :id) instead of $offset, so every
+page is an index seek no matter how deep the scrape goes, and pushes a
+$select projection so only the columns a city actually maps come over the
+wire. Records are returned through a generator.
+"""
+import re
+import requests
+from .base import PermitScraperBase
+from .utils import retry_with_backoff, http_get, RetryPolicy
+
+
+class SocrataQueryError(ValueError):
+    """The portal rejected the SoQL query itself (bad column, bad syntax)"""
+
+
+def _soql_literal(value):
+    """Quote a value for use inside a SoQL $where clause"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class SocrataClient:
+    """Keyset-paginated reader for a single Socrata dataset"""
+
+    def __init__(self, url, date_field, select_fields=None, page_size=1000, timeout=30, logger=None,
+                 retry_policy=None):
+        """
+        Args:
+            url: Dataset resource URL (https://<portal>/resource/<id>.json)
+            date_field: Timestamp column used for the date window and cursor
+            select_fields: Columns to project (None = all columns)
+            page_size: Rows per request
+            timeout: Request timeout in seconds
+            logger: Optional logger instance
+            retry_policy: RetryPolicy shared with the rest of the scrape
+        """
+        self.url = url
+        self.date_field = date_field
+        self.select_fields = list(select_fields) if select_fields else None
+        self.page_size = page_size
+        self.timeout = timeout
+        self.logger = logger
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    def _select_clause(self):
+        if not self.select_fields:
+            # :* adds the system fields (:id) next to every regular column
+            return ':*, *'
+        columns = [':id', self.date_field] + [f for f in self.select_fields if f != self.date_field]
+        return ', '.join(dict.fromkeys(columns))
+
+    def _where_clause(self, start, end, where, cursor):
+        clauses = []
+        if start:
+            clauses.append(f"{self.date_field} >= {_soql_literal(start)}")
+        if end:
+            clauses.append(f"{self.date_field} <= {_soql_literal(end)}")
+        if where:
+            clauses.append(f"({where})")
+        if cursor:
+            last_date, last_id = cursor
+            clauses.append(
+                f"({self.date_field} < {_soql_literal(last_date)} OR "
+                f"({self.date_field} = {_soql_literal(last_date)} AND :id < {_soql_literal(last_id)}))"
+            )
+        return ' AND '.join(clauses)
+
+    @retry_with_backoff(max_retries=3, initial_delay=2, exceptions=(requests.RequestException,))
+    def _fetch_page(self, params):
+        """Fetch a single page with retry logic"""
+        response = http_get(self.url, params=params, timeout=self.retry_policy.timeout(self.timeout))
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            # Query errors won't fix themselves - don't burn retries on them
+            raise SocrataQueryError(f"{response.status_code} from {self.url}: {response.text[:200]}")
+        response.raise_for_status()
+        if not response.text.strip():
+            return []  # Empty response
+        return response.json()
+
+    def iter_records(self, start=None, end=None, where=None, max_records=None):
+        """
+        Yield records newest first
+
+        Args:
+            start: Inclusive lower bound for date_field (SoQL timestamp string)
+            end: Inclusive upper bound for date_field
+            where: Extra SoQL predicate ANDed onto the date window
+            max_records: Stop after this many records (None = no limit)
+        """
+        cursor = None
+        fetched = 0
+
+        while max_records is None or fetched < max_records:
+            limit = self.page_size if max_records is None else min(self.page_size, max_records - fetched)
+            params = {
+                '$select': self._select_clause(),
+                '$order': f"{self.date_field} DESC, :id DESC",
+                '$limit': limit,
+            }
+            where_clause = self._where_clause(start, end, where, cursor)
+            if where_clause:
+                params['$where'] = where_clause
+
+            try:
+                rows = self._fetch_page(params)
+            except SocrataQueryError as e:
+                if not self.select_fields:
+                    raise
+                # Usually a projected column this dataset doesn't have - drop
+                # it, or fall back to full rows if the column can't be named
+                missing = re.search(r'[Nn]o such column:?\s*([\w:]+)', str(e))
+                if missing and missing.group(1) in self.select_fields and missing.group(1) != self.date_field:
+                    if self.logger:
+                        self.logger.warning(f"Dropping unknown column from projection: {missing.group(1)}")
+                    self.select_fields.remove(missing.group(1))
+                else:
+                    if self.logger:
+                        self.logger.warning(f"Projection rejected, fetching all columns: {e}")
+                    self.select_fields = None
+                continue
+
+            if not rows:
+                break
+
+            for row in rows:
+                yield row
+            fetched += len(rows)
+
+            if len(rows) < limit:
+                break
+
+            last = rows[-1]
+            if last.get(self.date_field) is None or last.get(':id') is None:
+                if self.logger:
+                    self.logger.warning("Last row has no cursor values, stopping pagination")
+                break
+            cursor = (last[self.date_field], last[':id'])
+
+
+class SocrataPermitScraper(PermitScraperBase):
+    """
+    Base for SoQL-backed city scrapers
+
+    Subclasses set endpoints, date_field and select_fields (the source
+    columns their map_record() reads) and implement map_record().
+    """
+    endpoints = []
+    date_field = 'issue_date'
+    select_fields = None
+    where = None
+    page_size = 1000
+
+    def fetch_records(self, start_date, end_date, max_records):
+        start = start_date.strftime('%Y-%m-%dT00:00:00.000')
+        end = end_date.strftime('%Y-%m-%dT23:59:59.999')
+
+        answered = False
+        last_error = None
+        for endpoint_url in self.endpoints:
+            self.logger.info(f"Trying endpoint: {endpoint_url}")
+            client = SocrataClient(endpoint_url, self.date_field, self.select_fields, page_size=self.page_size,
+                                   logger=self.logger, retry_policy=self.retry_policy)
+            yielded = 0
+            try:
+                for record in client.iter_records(start, end, self.where, max_records):
+                    yielded += 1
+                    yield record
+            except (requests.RequestException, SocrataQueryError) as e:
+                if yielded:
+                    raise
+                self.logger.warning(f"Endpoint failed: {endpoint_url}: {e}")
+                last_error = e
+                continue
+
+            if yielded:
+                return
+            answered = True
+
+        # Only an error if no endpoint answered at all - an empty window is
+        # a valid result for incremental scrapes
+        if not answered and last_error is not None:
+            raise last_error
@@ -4,9 +4,15 @@ Shared utilities for all scrapers - retry logic, logging, and error handling
 import time
 import logging
 import os
+import random
+import threading
 from functools import wraps
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
 import traceback
+import requests
+from requests.adapters import HTTPAdapter
 
 # Setup logging
 LOG_DIR = os.path.join(os.path.dirname(__file__), '../logs')
@@ -44,9 +50,114 @@ def setup_logger(scraper_name):
     return logger
 
 
+class ScrapeDeadlineExceeded(requests.exceptions.Timeout):
+    """The scrape ran out of time - raised instead of starting another attempt"""
+
+
+class RetryPolicy:
+    """
+    One retry/deadline policy for every HTTP layer of a scrape
+
+    Each logical request gets at most max_attempts tries and request_budget
+    seconds (sleeps included); backoff is full jitter, random between 0 and
+    base_delay * backoff_factor**attempt, capped at max_delay. Nothing is
+    retried or slept past the scrape deadline (a time.monotonic() value).
+    Retries and time spent sleeping are counted for the run summary.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, backoff_factor=2, max_delay=20.0,
+                 request_budget=90.0, deadline=None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.backoff_factor = backoff_factor
+        self.max_delay = max_delay
+        self.request_budget = request_budget
+        self.deadline = deadline
+        self.retries = 0
+        self.sleep_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds left before the deadline (None = no deadline)"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def check_deadline(self):
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise ScrapeDeadlineExceeded("Scrape deadline reached")
+
+    def timeout(self, default):
+        """Request timeout capped by the time left before the deadline"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(1.0, min(default, remaining))
+
+    def is_retryable(self, error):
+        """Client errors (bad query, not found) won't fix themselves"""
+        if isinstance(error, ScrapeDeadlineExceeded):
+            return False
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+        if status is not None and 400 <= status < 500 and status not in (408, 429):
+            return False
+        return True
+
+    def wait_before_retry(self, attempt, started=None, logger=None, error=None):
+        """
+        Sleep before retry number attempt + 1
+
+        Returns False (without sleeping) when the attempts, the request
+        budget or the scrape deadline don't allow another try.
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * self.backoff_factor ** attempt))
+        if started is not None and time.monotonic() - started + delay > self.request_budget:
+            return False
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            return False
+
+        message = f"Attempt {attempt + 1}/{self.max_attempts} failed: {error}. Retrying in {delay:.1f}s..."
+        if logger:
+            logger.warning(message)
+        else:
+            print(f"⚠️  {message}")
+
+        with self._lock:
+            self.retries += 1
+            self.sleep_seconds += delay
+        time.sleep(delay)
+        return True
+
+    def call(self, func, *args, retry_on=(requests.RequestException,), logger=None, **kwargs):
+        """Run func(*args, **kwargs), retrying retryable errors under this policy"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            self.check_deadline()
+            try:
+                return func(*args, **kwargs)
+            except retry_on as e:
+                if not self.is_retryable(e) or not self.wait_before_retry(attempt, started, logger, e):
+                    if logger:
+                        logger.error(f"Giving up on {getattr(func, '__name__', 'request')} after {attempt + 1} attempt(s): {e}")
+                        logger.debug(traceback.format_exc())
+                    raise
+                attempt += 1
+
+
 def retry_with_backoff(max_retries=3, initial_delay=1, backoff_factor=2, exceptions=(Exception,)):
     """
-    Retry decorator with exponential backoff
+    Retry decorator with jittered exponential backoff
+
+    If the decorated method's instance has a retry_policy (scrapers get one
+    per run), that policy decides - so retries, budgets and the run deadline
+    are shared across every layer instead of multiplying. Otherwise a policy
+    is built from these arguments.
 
     Args:
         max_retries: Maximum number of retry attempts
@@ -57,82 +168,196 @@ def retry_with_backoff(max_retries=3, initial_delay=1, backoff_factor=2, excepti
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            delay = initial_delay
-            last_exception = None
-
-            # Get logger from args if available (self.logger)
-            logger = None
-            if args and hasattr(args[0], 'logger'):
-                logger = args[0].logger
-
-            for attempt in range(max_retries + 1):
-                try:
-                    return func(*args, **kwargs)
-                except exceptions as e:
-                    last_exception = e
-
-                    if attempt == max_retries:
-                        if logger:
-                            logger.error(f"Final attempt failed for {func.__name__}: {e}")
-                            logger.debug(traceback.format_exc())
-                        raise
+            owner = args[0] if args else None
+            policy = getattr(owner, 'retry_policy', None) or RetryPolicy(
+                max_attempts=max_retries + 1, base_delay=initial_delay, backoff_factor=backoff_factor)
+            logger = getattr(owner, 'logger', None)
+            return policy.call(func, *args, retry_on=exceptions, logger=logger, **kwargs)
 
-                    if logger:
-                        logger.warning(
-                            f"Attempt {attempt + 1}/{max_retries + 1} failed for {func.__name__}: {e}. "
-                            f"Retrying in {delay}s..."
-                        )
-                    else:
-                        print(f"⚠️  Retry {attempt + 1}/{max_retries + 1} - waiting {delay}s...")
+        return wrapper
+    return decorator
 
-                    time.sleep(delay)
-                    delay *= backoff_factor
 
-            raise last_exception
+# Shared HTTP sessions - one keep-alive connection pool per API host, reused
+# by every scraper in the process instead of a new TCP+TLS handshake per page
+HTTP_POOL_MAXSIZE = int(os.getenv('SCRAPER_HTTP_POOL_MAXSIZE', 16))
+HTTP_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
 
-        return wrapper
-    return decorator
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url):
+    """
+    Get the shared requests.Session for a URL's host
+
+    Sessions are created on first use and kept for the life of the process.
+    Each one pools up to HTTP_POOL_MAXSIZE connections to its host, which
+    covers the concurrent page fetches and parallel cities hitting it.
+    """
+    parsed = urlparse(url)
+    key = f"{parsed.scheme}://{parsed.netloc.lower()}"
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HTTP_HEADERS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+        return session
+
+
+# Per-host request rate (requests/second) - starts at RATE_LIMIT_INITIAL,
+# creeps up while the host answers quickly, halves on 429/503 or errors
+RATE_LIMIT_INITIAL = float(os.getenv('SCRAPER_RATE_LIMIT_INITIAL', 4))
+RATE_LIMIT_MIN = float(os.getenv('SCRAPER_RATE_LIMIT_MIN', 0.2))
+RATE_LIMIT_MAX = float(os.getenv('SCRAPER_RATE_LIMIT_MAX', 20))
+RATE_LIMIT_HEALTHY_LATENCY = 2.0   # Seconds - faster answers speed us up
+RATE_LIMIT_SLOW_LATENCY = 8.0      # Seconds - slower answers slow us down
+RATE_LIMIT_MAX_RETRY_AFTER = 120   # Never park a host longer than this
+
+
+class HostRateLimiter:
+    """
+    Adaptive token bucket for one API host
+
+    acquire() blocks until a request may go out. record() feeds back the
+    outcome: healthy latencies raise the rate additively, 429/503 and
+    errors cut it in half (AIMD), and a Retry-After header pauses the host
+    for that long.
+    """
 
+    def __init__(self, host, rate=RATE_LIMIT_INITIAL, min_rate=RATE_LIMIT_MIN, max_rate=RATE_LIMIT_MAX):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = 1.0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        capacity = max(1.0, self.rate)  # Allow a burst of about one second
+        self.tokens = min(capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Wait for a token (and for any Retry-After pause to end)"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def record(self, status_code=None, latency=None, retry_after=None):
+        """Adjust the rate after a response (status_code None = connection error)"""
+        with self._lock:
+            if status_code in (429, 503) or status_code is None:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0)
+                pause = _parse_retry_after(retry_after)
+                if pause:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + min(pause, RATE_LIMIT_MAX_RETRY_AFTER))
+                reason = f"HTTP {status_code}" if status_code else "connection error"
+                print(f"🐢 {self.host}: {reason} - slowing to {self.rate:.2f} req/s"
+                      + (f", pausing {min(pause, RATE_LIMIT_MAX_RETRY_AFTER):.0f}s" if pause else ""))
+            elif latency is not None and latency > RATE_LIMIT_SLOW_LATENCY:
+                self.rate = max(self.min_rate, self.rate * 0.8)
+            elif latency is not None and latency < RATE_LIMIT_HEALTHY_LATENCY and status_code < 500:
+                self.rate = min(self.max_rate, self.rate + 0.5)
+
+
+def _parse_retry_after(value):
+    """Retry-After as seconds (it may be a number or an HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+_rate_limiters = {}
+
+
+def get_rate_limiter(url):
+    """Get the shared HostRateLimiter for a URL's host"""
+    host = urlparse(url).netloc.lower()
+    with _sessions_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None:
+            limiter = _rate_limiters[host] = HostRateLimiter(host)
+        return limiter
 
-def safe_request(session_or_requests, url, params=None, timeout=30, max_retries=3):
+
+def http_get(url, params=None, timeout=30, **kwargs):
+    """
+    GET through the shared session and rate limiter for the URL's host
+
+    Drop-in for requests.get - callers don't need their own sleeps between
+    pages, the host's limiter paces them.
+    """
+    limiter = get_rate_limiter(url)
+    limiter.acquire()
+    started = time.monotonic()
+    try:
+        response = get_session(url).get(url, params=params, timeout=timeout, **kwargs)
+    except (requests.ConnectionError, requests.Timeout):
+        limiter.record(None)
+        raise
+    limiter.record(response.status_code, time.monotonic() - started, response.headers.get('Retry-After'))
+    return response
+
+
+def safe_request(session_or_requests, url, params=None, timeout=30, max_retries=3, retry_policy=None):
     """
     Make a safe HTTP request with automatic retries
 
     Args:
-        session_or_requests: requests module or requests.Session instance
+        session_or_requests: requests module (uses the shared host session)
+            or a requests.Session instance
         url: URL to request
         params: Query parameters
         timeout: Request timeout in seconds
-        max_retries: Maximum retry attempts
+        max_retries: Maximum attempts when no retry_policy is given
+        retry_policy: RetryPolicy shared with the rest of the scrape
 
     Returns:
         Response object or None if all retries failed
     """
-    import requests
+    policy = retry_policy or RetryPolicy(max_attempts=max_retries)
 
-    for attempt in range(max_retries):
-        try:
-            response = session_or_requests.get(url, params=params, timeout=timeout)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt  # Exponential backoff
-                print(f"⏱️  Timeout - retrying in {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"❌ Request timeout after {max_retries} attempts")
-                return None
-        except requests.exceptions.RequestException as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"⚠️  Request failed: {e} - retrying in {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"❌ Request failed after {max_retries} attempts: {e}")
-                return None
-
-    return None
+    def _get():
+        if session_or_requests is requests:
+            response = http_get(url, params=params, timeout=policy.timeout(timeout))
+        else:
+            response = session_or_requests.get(url, params=params, timeout=policy.timeout(timeout))
+        response.raise_for_status()
+        return response
+
+    try:
+        return policy.call(_get)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Request failed: {e}")
+        return None
 
 
 class ScraperHealthCheck:
@@ -187,6 +412,79 @@ class ScraperHealthCheck:
             return False, "Could not parse last success time"
 
 
+class ScraperWatermark:
+    """
+    Persisted per-scraper high-water mark for incremental scraping
+
+    Stored next to the health file as logs/<scraper>_watermark.json:
+    last_issue_date (newest issue date scraped), row_hashes (hashes of the
+    rows on that date, so re-fetched boundary rows are skipped), object_ids
+    (highest source objectId per endpoint) and last_full_scrape.
+    """
+
+    def __init__(self, scraper_name):
+        self.scraper_name = scraper_name
+        self.watermark_file = os.path.join(LOG_DIR, f'{scraper_name}_watermark.json')
+        self.state = self.load()
+
+    def load(self):
+        """Read the watermark file, or an empty state if missing/corrupt"""
+        import json
+        try:
+            with open(self.watermark_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Write the watermark atomically (temp file + rename)"""
+        import json
+        tmp_file = f"{self.watermark_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.watermark_file)
+
+    @property
+    def last_issue_date(self):
+        return self.state.get('last_issue_date')
+
+    @property
+    def row_hashes(self):
+        return set(self.state.get('row_hashes') or [])
+
+    def object_id(self, endpoint):
+        return (self.state.get('object_ids') or {}).get(endpoint)
+
+    def needs_full_scrape(self, full_every_days):
+        """True if there is no watermark or the last full-window scrape is too old"""
+        if not self.last_issue_date or not self.state.get('last_full_scrape'):
+            return True
+        try:
+            last_full = datetime.strptime(self.state['last_full_scrape'], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return True
+        return (datetime.now() - last_full).days >= full_every_days
+
+    def advance(self, last_issue_date, row_hashes, object_ids=None, full=False):
+        """Move the watermark forward after a clean scrape and persist it"""
+        if last_issue_date:
+            if last_issue_date == self.last_issue_date:
+                row_hashes = set(row_hashes) | self.row_hashes
+            if not self.last_issue_date or last_issue_date >= self.last_issue_date:
+                self.state['last_issue_date'] = last_issue_date
+                self.state['row_hashes'] = sorted(row_hashes)
+        if object_ids:
+            merged = dict(self.state.get('object_ids') or {})
+            for endpoint, object_id in object_ids.items():
+                merged[endpoint] = max(object_id, merged.get(endpoint) or object_id)
+            self.state['object_ids'] = merged
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if full:
+            self.state['last_full_scrape'] = now
+        self.state['updated_at'] = now
+        self.save()
+
+
 def save_partial_results(permits, filename, scraper_name):
     """Save partial results even if scraper fails midway"""
     if not permits:
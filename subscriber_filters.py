@@ -0,0 +1,174 @@
+"""
+Per-subscriber lead filters
+
+A subscriber's filters (the `filters` JSON column of the subscribers
+table) narrow their daily email to the permits they care about:
+
+    {"permit_types": ["roofing", "residential"], "min_value": 10000, "max_value": 500000,
+     "zip_codes": ["37206"], "keywords": ["solar", "pool heater"]}
+
+Each list matches any of its entries and the conditions are ANDed. Permit
+types match part of the permit type, keywords match whole words of the
+description (all words of a multi-word keyword), case-insensitively.
+normalize_filters() puts a set in canonical form, so subscribers with the
+same filters share one signature and one result.
+
+FilterIndex answers every distinct filter set of a city from one pass over
+the day's permits: it indexes them once into bitmaps - a Python int per
+permit type, zip code and description word, plus the permits sorted by
+value - and a filter set becomes a few ORs and ANDs of those bitmaps
+instead of a loop over the permits per subscriber.
+"""
+import bisect
+import json
+import os
+import re
+
+from permit_pipeline import parse_cost, parse_zip
+
+LEADS_FILTER_POOL = int(os.getenv('LEADS_FILTER_POOL', 5000))  # Newest permits per city that filters search
+FILTER_LIST_MAX = 50        # Entries per list, keeps a filter set's bitmap work bounded
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text):
+    return _WORD.findall((text or '').lower())
+
+
+def normalize_filters(raw):
+    """Subscriber filters (dict or JSON string) -> canonical dict ({} = everything); raises ValueError"""
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            raise ValueError("filters must be a JSON object")
+    if not isinstance(raw, dict):
+        raise ValueError("filters must be a JSON object")
+
+    filters = {}
+    for key in ('permit_types', 'zip_codes', 'keywords'):
+        values = raw.get(key) or []
+        if isinstance(values, str):
+            values = values.split(',')
+        if not isinstance(values, list) or len(values) > FILTER_LIST_MAX:
+            raise ValueError(f"{key} must be a list of at most {FILTER_LIST_MAX} entries")
+        if key == 'zip_codes':
+            cleaned = {str(value).strip()[:5] for value in values if str(value).strip()}
+            if any(not value.isdigit() for value in cleaned):
+                raise ValueError("zip_codes must be 5-digit zip codes")
+        elif key == 'keywords':
+            cleaned = {' '.join(_words(str(value))) for value in values}
+        else:
+            cleaned = {str(value).strip().lower() for value in values}
+        cleaned.discard('')
+        if cleaned:
+            filters[key] = sorted(cleaned)
+
+    for key in ('min_value', 'max_value'):
+        if raw.get(key) not in (None, ''):
+            value = parse_cost(raw[key])
+            if value is None:
+                raise ValueError(f"{key} must be a number")
+            filters[key] = value
+    if filters.get('min_value') is not None and filters.get('max_value') is not None \
+            and filters['min_value'] > filters['max_value']:
+        raise ValueError("min_value is above max_value")
+
+    unknown = set(raw) - {'permit_types', 'zip_codes', 'keywords', 'min_value', 'max_value'}
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+    return filters
+
+
+def _bitmap(positions, size):
+    """Python int with the given bit positions set, built in one go"""
+    bits = bytearray((size + 7) // 8)
+    for i in positions:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class FilterIndex:
+    """Bitmap indexes over one city's permits (rows in the order results should come out)"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.all = (1 << len(rows)) - 1
+        by_type, by_zip, by_word = {}, {}, {}
+        valued = []
+        for i, row in enumerate(rows):
+            by_type.setdefault((row.get('permit_type') or '').strip().lower(), []).append(i)
+            # Rows stored before zip codes were scraped still have one in the address
+            zip_code = parse_zip(row.get('zip_code'), row.get('address'))
+            if zip_code:
+                by_zip.setdefault(zip_code, []).append(i)
+            for word in set(_words(row.get('description'))):
+                by_word.setdefault(word, []).append(i)
+            cost = row.get('estimated_cost')
+            if cost is not None:
+                valued.append((cost, i))
+        size = len(rows)
+        self.by_type = {key: _bitmap(positions, size) for key, positions in by_type.items()}
+        self.by_zip = {key: _bitmap(positions, size) for key, positions in by_zip.items()}
+        self.by_word = {key: _bitmap(positions, size) for key, positions in by_word.items()}
+        valued.sort()
+        self._costs = [cost for cost, _ in valued]
+        self._cost_rows = [i for _, i in valued]
+        self._cache = {}
+
+    def _cached(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def _type_mask(self, term):
+        # Substring match over the distinct permit types, not the permits
+        return self._cached(('type', term), lambda: self._or(
+            mask for permit_type, mask in self.by_type.items() if term in permit_type))
+
+    def _keyword_mask(self, keyword):
+        def build():
+            mask = self.all
+            for word in keyword.split():
+                mask &= self.by_word.get(word, 0)
+            return mask
+        return self._cached(('keyword', keyword), build)
+
+    def _value_mask(self, low, high):
+        def build():
+            start = 0 if low is None else bisect.bisect_left(self._costs, low)
+            end = len(self._costs) if high is None else bisect.bisect_right(self._costs, high)
+            return _bitmap(self._cost_rows[start:end], len(self.rows))
+        return self._cached(('value', low, high), build)
+
+    @staticmethod
+    def _or(masks):
+        result = 0
+        for mask in masks:
+            result |= mask
+        return result
+
+    def mask(self, filters):
+        """Bitmap of the rows matching a normalized filter set"""
+        mask = self.all
+        if filters.get('permit_types'):
+            mask &= self._or(self._type_mask(term) for term in filters['permit_types'])
+        if filters.get('zip_codes'):
+            mask &= self._or(self.by_zip.get(zip_code, 0) for zip_code in filters['zip_codes'])
+        if filters.get('keywords'):
+            mask &= self._or(self._keyword_mask(keyword) for keyword in filters['keywords'])
+        if filters.get('min_value') is not None or filters.get('max_value') is not None:
+            mask &= self._value_mask(filters.get('min_value'), filters.get('max_value'))
+        return mask
+
+    def select(self, filters, limit=None):
+        """Matching rows in index order, at most `limit`"""
+        mask = self.mask(filters)
+        rows = []
+        while mask and (limit is None or len(rows) < limit):
+            low = mask & -mask
+            rows.append(self.rows[low.bit_length() - 1])
+            mask ^= low
+        return rows
@@ -42,6 +42,9 @@ CREATE TABLE IF NOT EXISTS permits (
 CREATE INDEX IF NOT EXISTS idx_permits_city ON permits(city);
 CREATE INDEX IF NOT EXISTS idx_permits_issue_date ON permits(issue_date DESC);
 CREATE INDEX IF NOT EXISTS idx_permits_city_date ON permits(city, issue_date DESC);
+-- Keyset pagination of /api/permits on (issue_date, id), with and without a city filter
+CREATE INDEX IF NOT EXISTS idx_permits_city_date_id ON permits(city, issue_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_permits_date_id ON permits(issue_date DESC, id DESC);
 
 -- 3. Users/Subscribers Table (optional - for tracking paid users)
 CREATE TABLE IF NOT EXISTS subscribers (
@@ -57,6 +60,10 @@ CREATE TABLE IF NOT EXISTS subscribers (
 -- Index for email lookups
 CREATE INDEX IF NOT EXISTS idx_subscribers_email ON subscribers(email);
 
+-- Lead filters for the daily email, e.g. {"permit_types": ["roofing"], "min_value": 10000,
+-- "max_value": 500000, "zip_codes": ["37206"], "keywords": ["solar"]} - see subscriber_filters.py
+ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS filters JSONB NOT NULL DEFAULT '{}';
+
 -- 4. Enable Row Level Security (RLS) for public access patterns
 ALTER TABLE geocode_cache ENABLE ROW LEVEL SECURITY;
 ALTER TABLE permits ENABLE ROW LEVEL SECURITY;
@@ -86,6 +93,64 @@ CREATE POLICY "Users can read own subscriber data" ON subscribers
 CREATE POLICY "Service role can manage subscribers" ON subscribers
     FOR ALL USING (auth.role() = 'service_role');
 
+-- 5. Permit counts per city/day, maintained by trigger so stats never count the permits table
+CREATE TABLE IF NOT EXISTS permit_daily_counts (
+    city TEXT NOT NULL,
+    issue_date DATE NOT NULL DEFAULT '1970-01-01', -- 1970-01-01 = no issue date
+    permits INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (city, issue_date)
+);
+
+CREATE OR REPLACE FUNCTION permits_track_counts() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE permit_daily_counts SET permits = permits - 1, updated_at = NOW()
+        WHERE city = OLD.city AND issue_date = COALESCE(OLD.issue_date, '1970-01-01');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO permit_daily_counts (city, issue_date, permits)
+        VALUES (NEW.city, COALESCE(NEW.issue_date, '1970-01-01'), 1)
+        ON CONFLICT (city, issue_date) DO UPDATE
+            SET permits = permit_daily_counts.permits + 1, updated_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS permits_track_counts_insert_delete ON permits;
+CREATE TRIGGER permits_track_counts_insert_delete AFTER INSERT OR DELETE ON permits
+    FOR EACH ROW EXECUTE FUNCTION permits_track_counts();
+
+DROP TRIGGER IF EXISTS permits_track_counts_update ON permits;
+CREATE TRIGGER permits_track_counts_update AFTER UPDATE OF city, issue_date ON permits
+    FOR EACH ROW WHEN (OLD.city IS DISTINCT FROM NEW.city OR OLD.issue_date IS DISTINCT FROM NEW.issue_date)
+    EXECUTE FUNCTION permits_track_counts();
+
+-- Backfill once (re-running rebuilds the counts from scratch)
+TRUNCATE permit_daily_counts;
+INSERT INTO permit_daily_counts (city, issue_date, permits)
+SELECT city, COALESCE(issue_date, '1970-01-01'), COUNT(*) FROM permits GROUP BY 1, 2;
+
+-- One row per city for the admin stats: supabase.rpc('permit_city_counts')
+CREATE OR REPLACE FUNCTION permit_city_counts()
+RETURNS TABLE (city TEXT, permits BIGINT, min_issue_date DATE, max_issue_date DATE, updated_at TIMESTAMPTZ) AS $$
+    SELECT city,
+           SUM(permits)::BIGINT,
+           MIN(issue_date) FILTER (WHERE issue_date > '1970-01-01'),
+           MAX(issue_date) FILTER (WHERE issue_date > '1970-01-01'),
+           MAX(updated_at)
+    FROM permit_daily_counts
+    WHERE permits > 0
+    GROUP BY city
+    ORDER BY city;
+$$ LANGUAGE sql STABLE;
+
+ALTER TABLE permit_daily_counts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Anyone can read permit counts" ON permit_daily_counts
+    FOR SELECT USING (true);
+
 -- Sample insert to verify tables work
 -- INSERT INTO geocode_cache (address, city, lat, lng) VALUES ('123 Test St', 'Austin', 30.2672, -97.7431);
 
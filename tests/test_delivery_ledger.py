@@ -0,0 +1,198 @@
+import pytest
+from python_http_client.exceptions import HTTPError
+
+import lead_mailer
+from delivery_ledger import DeliveryLedger
+from lead_mailer import LeadMailer
+from permit_store import PermitStore
+
+DAY = '2026-10-18'
+CONTENTS = {('nashville', ''): ('Nashville leads', '<p>leads</p>'),
+            ('austin', ''): ('Austin leads', '<p>leads</p>')}
+
+
+class FakeResponse:
+    def __init__(self, message_id):
+        self.status_code = 202
+        self.headers = {'X-Message-Id': message_id}
+
+
+class FakeSendGrid:
+    """Stands in for SendGridAPIClient: answers from a script of errors, then accepts everything"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []      # [(subject, [emails])] of every request
+
+    def send(self, message):
+        payload = message.get()
+        emails = sorted(to['email'] for p in payload['personalizations'] for to in p['to'])
+        self.sent.append((payload['subject'], emails))
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeResponse(f"msg-{len(self.sent)}")
+
+
+def http_error(status):
+    return HTTPError(status, 'error', b'{"errors": []}', {})
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(lead_mailer, 'EMAIL_RETRY_BASE', 0.01)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return DeliveryLedger(path=str(tmp_path / 'ledger.db'), max_attempts=3)
+
+
+def plan(ledger, *recipients):
+    return ledger.plan(DAY, [(email, city, '', None) for email, city in recipients])
+
+
+def mailer(client):
+    # One sender thread, so scripted errors hit requests in claim order
+    return LeadMailer('key', 'leads@example.com', batch_size=10, concurrency=1, client=client)
+
+
+def statuses(ledger):
+    return ledger.status(DAY)['by_status']
+
+
+def test_replanning_does_not_requeue_sent_recipients(ledger):
+    assert plan(ledger, ('a@x.com', 'nashville'), ('b@x.com', 'nashville')) == 2
+    client = FakeSendGrid()
+    stats = mailer(client).deliver(ledger, DAY, CONTENTS, deadline=5)
+    assert (stats['sent'], stats['requests']) == (2, 1)
+
+    # A rerun of the day (restart, second worker) plans everyone again plus one new subscriber
+    assert plan(ledger, ('a@x.com', 'nashville'), ('b@x.com', 'nashville'), ('c@x.com', 'austin')) == 1
+    mailer(client).deliver(ledger, DAY, CONTENTS, deadline=5)
+
+    assert client.sent == [('Nashville leads', ['a@x.com', 'b@x.com']), ('Austin leads', ['c@x.com'])]
+    assert statuses(ledger) == {'sent': 3}
+    assert ledger.pending_digests(DAY) == []
+
+
+def test_same_email_in_two_cities_gets_both(ledger):
+    plan(ledger, ('a@x.com', 'nashville'), ('a@x.com', 'austin'))
+    client = FakeSendGrid()
+    mailer(client).deliver(ledger, DAY, CONTENTS, deadline=5)
+    assert sorted(subject for subject, _ in client.sent) == ['Austin leads', 'Nashville leads']
+
+
+def test_transient_failure_is_retried(ledger):
+    plan(ledger, ('a@x.com', 'nashville'), ('b@x.com', 'nashville'))
+    client = FakeSendGrid(errors=[http_error(503), http_error(429)])
+
+    stats = mailer(client).deliver(ledger, DAY, CONTENTS, deadline=10)
+
+    assert len(client.sent) == 3
+    assert (stats['sent'], stats['retried'], stats['failed'], stats['failed_requests']) == (2, 4, 0, 2)
+    assert statuses(ledger) == {'sent': 2}
+    with ledger._lock:
+        rows = ledger._conn.execute('SELECT attempts, message_id, last_error FROM deliveries').fetchall()
+    assert rows == [(3, 'msg-3', None)] * 2
+
+
+def test_transient_failures_give_up_after_max_attempts(ledger):
+    plan(ledger, ('a@x.com', 'nashville'))
+    client = FakeSendGrid(errors=[http_error(500)] * 10)
+
+    stats = mailer(client).deliver(ledger, DAY, CONTENTS, deadline=10)
+
+    assert len(client.sent) == ledger.max_attempts
+    assert (stats['sent'], stats['failed']) == (0, 1)
+    assert statuses(ledger) == {'failed': 1}
+
+
+def test_permanent_failure_is_not_retried(ledger):
+    plan(ledger, ('a@x.com', 'nashville'), ('c@x.com', 'austin'))
+    client = FakeSendGrid(errors=[http_error(400)])
+
+    stats = mailer(client).deliver(ledger, DAY, CONTENTS, deadline=10)
+
+    assert len(client.sent) == 2
+    assert (stats['sent'], stats['failed'], stats['retried']) == (1, 1, 0)
+    assert statuses(ledger) == {'sent': 1, 'failed': 1}
+    failed, = ledger.status(DAY)['failed']
+    assert (failed['email'], failed['city']) == ('c@x.com', 'austin')     # Claimed first
+
+    # retry_failed() gives them another round
+    assert ledger.retry_failed(DAY) == 1
+    mailer(client).deliver(ledger, DAY, CONTENTS, deadline=5)
+    assert statuses(ledger) == {'sent': 2}
+
+
+def test_expired_sending_lease_is_reclaimed(ledger):
+    plan(ledger, ('a@x.com', 'nashville'))
+
+    # A sender leases the row and dies before SendGrid answers
+    assert [row[0] for row in ledger.claim(DAY, 10)] == ['a@x.com']
+    assert ledger.claim(DAY, 10) == []
+    assert ledger.undelivered(DAY) == 1
+
+    # Once the lease has run out the row is due again
+    with ledger._lock:
+        ledger._conn.execute('UPDATE deliveries SET available_at = 0')
+    client = FakeSendGrid()
+    stats = mailer(client).deliver(ledger, DAY, CONTENTS, deadline=5)
+
+    assert client.sent == [('Nashville leads', ['a@x.com'])]
+    assert stats['sent'] == 1
+    assert statuses(ledger) == {'sent': 1}
+
+
+def test_zero_second_lease_is_due_straight_away(ledger):
+    plan(ledger, ('a@x.com', 'nashville'))
+    assert len(ledger.claim(DAY, 10, lease_seconds=0)) == 1
+    assert [row[0] for row in ledger.claim(DAY, 10)] == ['a@x.com']
+
+
+def send_range(ledger, day, email, city, cursor_to):
+    ledger.plan(day, [(email, city, f"|0|{cursor_to}", cursor_to)])
+    ledger.claim(day, 10)
+    ledger.mark_sent(day, city, [email], 'msg')
+
+
+def test_cursors_only_move_forward(ledger):
+    send_range(ledger, '2026-10-16', 'a@x.com', 'nashville', 120)
+    assert ledger.cursors() == {('a@x.com', 'nashville'): 120}
+
+    send_range(ledger, '2026-10-17', 'a@x.com', 'nashville', 180)
+    # An older digest resent late (or a range that ended earlier) can't rewind it
+    send_range(ledger, '2026-10-18', 'a@x.com', 'nashville', 150)
+    assert ledger.cursors() == {('a@x.com', 'nashville'): 180}
+
+    # A failed delivery doesn't move it, and neither does a first email without a cursor
+    ledger.plan('2026-10-19', [('a@x.com', 'nashville', '|180|300', 300), ('b@x.com', 'nashville', '', None)])
+    ledger.claim('2026-10-19', 10)
+    ledger.mark_failed('2026-10-19', 'nashville', ['a@x.com'], 'rejected')
+    ledger.mark_sent('2026-10-19', 'nashville', ['b@x.com'])
+    assert ledger.cursors() == {('a@x.com', 'nashville'): 180}
+
+
+def test_reupserted_permits_stay_out_of_the_next_range(ledger, tmp_path):
+    store = PermitStore(path=str(tmp_path / 'permits.db'))
+
+    def permits(*numbers):
+        return [{'permit_number': number, 'address': f"{number} Main St", 'city': 'nashville',
+                 'issue_date': '2026-10-01'} for number in numbers]
+
+    store.ingest(permits('P1', 'P2', 'P3'))
+    first = store.first_seen_mark()
+    send_range(ledger, '2026-10-17', 'a@x.com', 'nashville', first)
+
+    # The next scrape repeats the known permits (with changes) and brings one new one
+    store.ingest([dict(row, status='Issued') for row in permits('P1', 'P2', 'P3')] + permits('P4'))
+    upto = store.first_seen_mark()
+    after = ledger.cursors()[('a@x.com', 'nashville')]
+
+    assert after == first
+    assert [row['permit_number'] for row in store.first_seen_between('nashville', after, upto)] == ['P4']
+    send_range(ledger, '2026-10-18', 'a@x.com', 'nashville', upto)
+
+    store.ingest(permits('P1', 'P2', 'P3', 'P4'))
+    after = ledger.cursors()[('a@x.com', 'nashville')]
+    assert store.first_seen_between('nashville', after, store.first_seen_mark()) == []
@@ -0,0 +1,93 @@
+from geocode_cache import GeocodeResolver
+from permit_pipeline import CSV_FIELDS
+from permit_store import csv_permit_row
+
+
+class FakeGeocodeTable:
+    """Supabase geocode_cache stand-in that counts round trips"""
+
+    def __init__(self, rows=(), fail_writes=False):
+        self.rows = {(row['address'], row['city']): row for row in rows}
+        self.fail_writes = fail_writes
+        self.queries = 0
+        self.upserts = []
+        self._query = None
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        self._query = {}
+        return self
+
+    def eq(self, column, value):
+        self._query[column] = value
+        return self
+
+    def in_(self, column, values):
+        self._query[column] = values
+        return self
+
+    def upsert(self, rows, on_conflict):
+        self._query = None
+        self.upserts.append(rows)
+        return self
+
+    def execute(self):
+        if self._query is None:
+            if self.fail_writes:
+                raise RuntimeError('503 Service Unavailable')
+            return self
+        self.queries += 1
+        query, self._query = self._query, None
+        self.data = [row for (address, city), row in self.rows.items()
+                     if city == query['city'] and address in query['address']]
+        return self
+
+
+def addresses(count):
+    return [f"{i} Main St" for i in range(count)]
+
+
+def test_batch_is_one_query_per_chunk_and_later_tiers_are_skipped(tmp_path):
+    remote = FakeGeocodeTable([{'address': a, 'city': 'Austin, USA', 'lat': 30.0, 'lng': -97.0} for a in addresses(200)])
+    resolver = GeocodeResolver(remote, path=str(tmp_path / 'geocode.db'))
+
+    coords = resolver.resolve_many(addresses(250), 'Austin, USA')
+    assert remote.queries == 3  # 250 addresses, 100 per `in` query
+    assert coords['0 Main St'] == (30.0, -97.0)
+    assert coords['249 Main St'] == (None, None)
+
+    # Hits and misses are both remembered in memory
+    resolver.resolve_many(addresses(250), 'Austin, USA')
+    assert remote.queries == 3
+    assert resolver.stats['memory'] == 250
+
+    # A fresh process finds the hits on disk, only the misses go to Supabase
+    restarted = GeocodeResolver(remote, path=str(tmp_path / 'geocode.db'))
+    restarted.resolve_many(addresses(250), 'Austin, USA')
+    assert restarted.stats['disk'] == 200
+    assert remote.queries == 4
+
+
+def test_stored_coordinates_are_written_in_one_bulk_upsert(tmp_path):
+    remote = FakeGeocodeTable(fail_writes=True)
+    resolver = GeocodeResolver(remote, path=str(tmp_path / 'geocode.db'))
+    for i, address in enumerate(addresses(3)):
+        resolver.store(address, 'Austin, USA', 30.0 + i, -97.0)
+    assert remote.upserts == []
+
+    assert resolver.flush() == 3
+    assert [len(rows) for rows in remote.upserts] == [3]
+    # Failed writes are kept for the next flush
+    remote.fail_writes = False
+    assert resolver.flush() == 3
+    assert resolver.flush() == 0
+    assert resolver.resolve('2 Main St', 'Austin, USA') == (32.0, -97.0)
+
+
+def test_pipeline_csv_rows_map_to_permit_columns():
+    raw = dict(zip(CSV_FIELDS, ['P1', '1 Main St', 'Roofing', '$12,000', '2026-10-01', 'Issued', 'Reroof', '']))
+    row = csv_permit_row(raw, 'austin')
+    assert (row['permit_type'], row['issue_date'], row['estimated_cost']) == ('Roofing', '2026-10-01', 12000.0)
+    assert csv_permit_row(dict(raw, permit_number=''), 'austin') is None
@@ -0,0 +1,50 @@
+from geocode_cache import GeocodeResolver
+from geocode_worker import GeocodeWorker, LocalGeocoder, serve_standin
+from permit_fingerprints import FingerprintIndex
+
+
+def make_worker(tmp_path, quota, miss_rate=0.0):
+    server = serve_standin(port=0, latency=0, miss_rate=miss_rate, max_rate=1000, background=True)
+    backend = LocalGeocoder(f"http://127.0.0.1:{server.server_address[1]}", rate=200)
+    resolver = GeocodeResolver(path=str(tmp_path / 'cache.db'))
+    worker = GeocodeWorker(resolver, backend, daily_quota=quota, concurrency=2, path=str(tmp_path / 'worker.db'))
+    return server, worker
+
+
+def test_lookups_stop_at_the_daily_quota(tmp_path):
+    server, worker = make_worker(tmp_path, quota=5)
+    addresses = [f"{i} Main St" for i in range(8)] + ['0 Main St', 'Unknown Address']
+    try:
+        results, stats = worker.resolve_addresses(addresses, 'Austin, USA', ', Austin, TX')
+        assert (stats['addresses'], stats['geocoded'], stats['quota_exhausted']) == (8, 5, True)
+        assert server.requests == 5 and worker.quota_used() == 5
+
+        # Next batch: the 5 found are cached, the rest wait for tomorrow's quota
+        results, stats = worker.resolve_addresses(addresses, 'Austin, USA', ', Austin, TX')
+        assert (stats['cached'], stats['geocoded'], stats['quota_exhausted']) == (5, 0, True)
+        assert len(results) == 5 and server.requests == 5
+    finally:
+        server.shutdown()
+
+
+def test_not_found_addresses_are_not_retried_right_away(tmp_path):
+    server, worker = make_worker(tmp_path, quota=100, miss_rate=1.0)
+    addresses = [f"{i} Nowhere Rd" for i in range(4)]
+    try:
+        results, stats = worker.resolve_addresses(addresses, 'Austin, USA')
+        assert results == {} and stats['not_found'] == 4
+
+        results, stats = worker.resolve_addresses(addresses, 'Austin, USA')
+        assert results == {} and stats['not_found'] == 0
+        assert server.requests == 4 and worker.quota_left() == 96
+    finally:
+        server.shutdown()
+
+
+def test_geocoded_row_does_not_make_the_next_scrape_look_changed(tmp_path):
+    fingerprints = FingerprintIndex(path=str(tmp_path / 'fingerprints.db'))
+    scraped = {'permit_number': 'P1', 'address': '1 Main St', 'city': 'austin', 'estimated_cost': 1000.0}
+    fingerprints.record('austin', [dict(scraped, lat=30.27, lng=-97.74)])
+
+    assert fingerprints.diff('austin', [scraped]) == ([], [], 1)
+    assert fingerprints.diff('austin', [dict(scraped, estimated_cost=2000.0)])[1]
@@ -0,0 +1,112 @@
+import csv
+import os
+
+from leads_history import LeadsHistory, iter_leads_rows
+from leads_manifest import LeadsManifest
+
+COLUMNS = ['permit_number', 'address', 'type', 'value', 'issued_date']
+
+# Each day adds, changes and drops permits against the day before
+DAYS = {
+    '2026-10-01': [
+        ['P1', '1 Main St', 'Roofing', '12000', '2026-09-30'],
+        ['P2', '2 Oak Ave', 'Pool', '45000', '2026-09-29'],
+        ['P3', '3 Elm Rd', 'Solar', '30000', '2026-09-28'],
+    ],
+    '2026-10-02': [
+        ['P1', '1 Main St', 'Roofing', '15000', '2026-09-30'],     # changed
+        ['P3', '3 Elm Rd', 'Solar', '30000', '2026-09-28'],        # P2 removed
+        ['P4', '4 Pine Ct', 'Addition', '80000', '2026-10-01'],    # added
+    ],
+    '2026-10-03': [
+        ['P2', '2 Oak Ave', 'Pool', '45000', '2026-09-29'],        # back again
+        ['P4', '4 Pine Ct', 'Addition', '82000', '2026-10-01'],
+        ['', '5 Ash Ln', 'Fence', '2500', '2026-10-02'],           # no permit number
+    ],
+    '2026-10-04': [],
+}
+
+
+def rows_of(date):
+    return [dict(zip(COLUMNS, values)) for values in DAYS[date]]
+
+
+def ordered(rows):
+    return sorted(rows, key=lambda row: (row['permit_number'], row['address']))
+
+
+def write_csv(root, city, date):
+    path = os.path.join(root, city, date, f"{date}_{city}.csv")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows_of(date))
+    return path
+
+
+def test_snapshot_rebuilds_every_recorded_day(tmp_path):
+    history = LeadsHistory(path=str(tmp_path / 'history.db'))
+    for date in DAYS:
+        history.record_day('nashville', date, rows_of(date), COLUMNS)
+
+    for date in DAYS:
+        assert ordered(history.snapshot('nashville', date)) == ordered(rows_of(date))
+    assert history.columns('nashville', '2026-10-02') == COLUMNS
+
+    summary = dict(history.days('nashville'))['2026-10-02']
+    assert summary == {'rows': 3, 'added': 1, 'changed': 1, 'removed': 1}
+    delta = history.delta('nashville', '2026-10-02')
+    assert [row['permit_number'] for row in delta['added']] == ['P4']
+    assert [row['value'] for row in delta['changed']] == ['15000']
+    assert delta['removed'] == ['P2']
+
+
+def test_record_day_rejects_days_before_the_newest(tmp_path):
+    history = LeadsHistory(path=str(tmp_path / 'history.db'))
+    history.record_day('nashville', '2026-10-02', rows_of('2026-10-02'), COLUMNS)
+
+    assert history.record_day('nashville', '2026-10-01', rows_of('2026-10-01'), COLUMNS) is None
+    assert not history.has_day('nashville', '2026-10-01')
+
+
+def test_incremental_days_merge_into_the_day_before(tmp_path):
+    history = LeadsHistory(path=str(tmp_path / 'history.db'))
+    history.record_day('nashville', '2026-10-01', rows_of('2026-10-01'), COLUMNS)
+    # Watermark scrapes: only permits issued or updated since the last run
+    history.record_day('nashville', '2026-10-02', [dict(zip(COLUMNS, DAYS['2026-10-02'][0]))], COLUMNS, incremental=True)
+    history.record_day('nashville', '2026-10-03', [dict(zip(COLUMNS, DAYS['2026-10-02'][2]))], COLUMNS, incremental=True)
+
+    assert dict(history.days('nashville'))['2026-10-02'] == {'rows': 3, 'added': 0, 'changed': 1, 'removed': 0}
+    assert dict(history.days('nashville'))['2026-10-03'] == {'rows': 4, 'added': 1, 'changed': 0, 'removed': 0}
+    snapshot = {row['permit_number']: row['value'] for row in history.snapshot('nashville', '2026-10-03')}
+    assert snapshot == {'P1': '15000', 'P2': '45000', 'P3': '30000', 'P4': '80000'}
+
+    # A second run the same day adds to that day instead of replacing it
+    history.record_day('nashville', '2026-10-03', [dict(zip(COLUMNS, DAYS['2026-10-03'][1]))], COLUMNS, incremental=True)
+    assert dict(history.days('nashville'))['2026-10-03'] == {'rows': 4, 'added': 1, 'changed': 0, 'removed': 0}
+    assert [row['value'] for row in history.delta('nashville', '2026-10-03')['added']] == ['82000']
+
+
+def test_compact_only_removes_days_in_the_history(tmp_path):
+    root = str(tmp_path / 'leads')
+    paths = {date: write_csv(root, 'nashville', date) for date in DAYS}
+    manifest = LeadsManifest(leads_root=root)
+    history = LeadsHistory(path=str(tmp_path / 'history.db'))
+    # 2026-10-02 never made it into the history
+    for date in ('2026-10-01', '2026-10-03'):
+        history.record_csv('nashville', date, paths[date])
+
+    assert history.compact(manifest, keep_days=1) == 2
+
+    assert not os.path.exists(paths['2026-10-01'])
+    assert not os.path.exists(paths['2026-10-03'])
+    assert os.path.exists(paths['2026-10-02'])
+    assert os.path.exists(paths['2026-10-04'])     # Within keep_days
+    entries = manifest.snapshot()['nashville']
+    assert [date for date, entry in sorted(entries.items()) if entry.get('archived')] == ['2026-10-01', '2026-10-03']
+
+    # Archived days read back from the history, the rest from disk
+    for date, entry in entries.items():
+        rows = list(iter_leads_rows(manifest, history, 'nashville', date, entry))
+        assert ordered(rows) == ordered(rows_of(date))
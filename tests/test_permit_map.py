@@ -0,0 +1,60 @@
+from permit_map import PermitMap, tiles_for_bbox
+from permit_store import PermitStore
+
+AUSTIN = (-97.80, 30.20, -97.70, 30.30)
+
+
+def permit(i, city, lat, lng):
+    return {'permit_number': f"{city}-{i}", 'address': f"{i} Main St", 'city': city,
+            'issue_date': f"2026-10-{i % 28 + 1:02d}", 'lat': lat, 'lng': lng}
+
+
+def make_map(tmp_path):
+    store = PermitStore(path=str(tmp_path / 'permits.db'))
+    # 40 permits on one downtown block, 10 spread over the rest of the box, 5 in Houston
+    rows = [permit(i, 'austin', 30.2672 + i * 1e-5, -97.7431 + i * 1e-5) for i in range(40)]
+    rows += [permit(40 + i, 'austin', 30.21 + i * 0.008, -97.79 + i * 0.008) for i in range(10)]
+    rows += [permit(i, 'houston', 29.76 + i * 0.001, -95.37) for i in range(5)]
+    rows.append({'permit_number': 'austin-nocoords', 'address': '1 Elm St', 'city': 'austin'})
+    store.ingest(rows)
+    return store, PermitMap(store)
+
+
+def test_zoomed_out_view_is_clustered(tmp_path):
+    store, permit_map = make_map(tmp_path)
+    result = permit_map.features(AUSTIN, 11)
+
+    assert result['mode'] == 'clusters'
+    assert result['total'] == 50  # Houston and the permit without coordinates are outside
+    assert len(result['features']) < 50
+    biggest = max(result['features'], key=lambda f: f['properties']['point_count'])
+    assert biggest['properties']['cluster'] and biggest['properties']['point_count'] >= 40
+    lng, lat = biggest['geometry']['coordinates']
+    assert abs(lat - 30.2674) < 0.001 and abs(lng + 97.7429) < 0.001
+
+
+def test_zoomed_in_view_returns_points(tmp_path):
+    store, permit_map = make_map(tmp_path)
+    result = permit_map.features((-97.7440, 30.2665, -97.7420, 30.2680), 16, {'cities': ['austin']})
+
+    assert result['mode'] == 'points' and result['total'] == 40 and not result['truncated']
+    properties = result['features'][0]['properties']
+    assert properties['city'] == 'austin' and properties['date'] >= result['features'][-1]['properties']['date']
+
+
+def test_cluster_tiles_are_cached_until_the_city_changes(tmp_path):
+    store, permit_map = make_map(tmp_path)
+    filters = {'cities': ['austin']}
+    tiles = len(tiles_for_bbox(AUSTIN, 11))
+
+    permit_map.features(AUSTIN, 11, filters)
+    permit_map.features(AUSTIN, 11, filters)
+    assert permit_map.stats == {'tile_hits': tiles, 'tile_misses': tiles}
+
+    # New Houston permits don't touch Austin's tiles, an Austin geocode does
+    store.ingest([permit(99, 'houston', 29.7, -95.3)])
+    permit_map.features(AUSTIN, 11, filters)
+    assert permit_map.stats['tile_misses'] == tiles
+    store.set_coordinates('austin', [('austin-nocoords', 30.25, -97.75)])
+    assert permit_map.features(AUSTIN, 11, filters)['total'] == 51
+    assert permit_map.stats['tile_misses'] == 2 * tiles
@@ -0,0 +1,90 @@
+import csv
+from datetime import datetime, timedelta
+
+from leads_history import LeadsHistory
+from permit_pipeline import CSV_FIELDS, LeadsCSVWriter, normalize_permit, run_pipeline, to_supabase_row
+from upload_outbox import UploadOutbox
+
+
+class BatchScraper:
+    def __init__(self, batches, incremental=False):
+        self.batches = batches
+        self.incremental = incremental
+
+    def iter_permits(self, batch_size=500):
+        yield from self.batches
+
+
+class RunOnlyScraper:
+    """Older scrapers only have run()"""
+
+    def __init__(self, permits):
+        self.permits = permits
+
+    def run(self):
+        return self.permits
+
+
+def test_scraper_shapes_normalize_to_csv_fields():
+    socrata = {'permit_id': ' 2026-001 ', 'address': '1 Main St', 'work_type': 'Roofing',
+               'estimated_cost': '$12,500.00', 'issue_date': '2026-10-01T00:00:00', 'lat': 36.1, 'lng': -86.7}
+    row = normalize_permit(socrata)
+    assert list(row)[:len(CSV_FIELDS)] == CSV_FIELDS
+    assert (row['permit_number'], row['type'], row['value'], row['issued_date']) == \
+        ('2026-001', 'Roofing', '$12,500.00', '2026-10-01T00:00:00')
+
+    record = to_supabase_row(row, 'nashville')
+    assert (record['issue_date'], record['estimated_cost'], record['lat']) == ('2026-10-01', 12500.0, 36.1)
+    # No coordinates scraped - none sent, so an upsert can't wipe a geocode
+    assert 'lat' not in to_supabase_row(normalize_permit({'permit_number': 'x', 'address': 'y'}), 'nashville')
+
+
+def test_batches_stream_to_the_csv_and_the_outbox(tmp_path):
+    batches = [
+        [{'permit_number': 'P1', 'address': '1 Main St', 'type': 'Roofing', 'value': '1000', 'issued_date': '2026-10-01'},
+         {'permit_number': '', 'address': 'no number'}],
+        [{'permit_number': 'P2', 'address': '', 'type': 'Pool'},
+         {'permit_id': 'P3', 'address': '3 Elm Rd', 'permit_type': 'Solar', 'issue_date': '2026-10-02'}],
+    ]
+    outbox = UploadOutbox(path=str(tmp_path / 'outbox.db'))
+
+    stats = run_pipeline('San Antonio', BatchScraper(batches), outbox=outbox, leads_root=str(tmp_path / 'leads'),
+                         batch_size=2)
+
+    assert {key: stats[key] for key in ('scraped', 'invalid', 'written', 'queued')} == \
+        {'scraped': 4, 'invalid': 2, 'written': 2, 'queued': 2}
+    assert '/sanantonio/' in stats['csv_path']
+    with open(stats['csv_path'], newline='') as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == CSV_FIELDS
+        assert [(row['permit_number'], row['type']) for row in reader] == [('P1', 'Roofing'), ('P3', 'Solar')]
+    queued = outbox.claim(10)
+    assert [(row['permit_number'], row['city']) for *_, row in queued] == [('P1', 'sanantonio'), ('P3', 'sanantonio')]
+
+
+def test_run_only_scrapers_are_batched_too(tmp_path):
+    permits = [{'permit_number': f"P{i}", 'address': f"{i} Main St"} for i in range(5)]
+    stats = run_pipeline('Tulsa', RunOnlyScraper(permits), leads_root=str(tmp_path / 'leads'), batch_size=2)
+    assert (stats['scraped'], stats['written']) == (5, 5)
+
+
+def test_empty_scrape_writes_no_csv(tmp_path):
+    stats = run_pipeline('Tulsa', BatchScraper([]), leads_root=str(tmp_path / 'leads'))
+    assert stats['written'] == 0
+    assert 'csv_path' not in stats
+    assert not (tmp_path / 'leads').exists()
+
+
+def test_incremental_scrape_is_merged_into_the_leads_history(tmp_path):
+    history = LeadsHistory(path=str(tmp_path / 'history.db'))
+    date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    yesterday = LeadsCSVWriter('tulsa', str(tmp_path / 'leads'), date=date, history=history)
+    yesterday.write([normalize_permit({'permit_number': 'P1', 'address': '1 Main St'})])
+    yesterday.close()
+
+    scraper = BatchScraper([[{'permit_number': 'P2', 'address': '2 Main St'}]], incremental=True)
+    stats = run_pipeline('Tulsa', scraper, history=history, leads_root=str(tmp_path / 'leads'))
+
+    assert stats['written'] == 1
+    today = datetime.now().strftime('%Y-%m-%d')
+    assert sorted(row['permit_number'] for row in history.snapshot('tulsa', today)) == ['P1', 'P2']
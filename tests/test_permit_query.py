@@ -0,0 +1,84 @@
+import pytest
+
+from permit_query import decode_cursor, parse_filters, query_permits
+from permit_store import PermitStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PermitStore(path=str(tmp_path / 'permits.db'))
+    rows = []
+    for city, count in (('nashville', 17), ('austin', 11), ('houston', 5), ('dallas', 4)):
+        for i in range(count):
+            rows.append({
+                'permit_number': f"{city}-{i}",
+                'address': f"{i} Main St",
+                'city': city,
+                'permit_type': 'Roofing' if i % 2 else 'Pool',
+                # Few distinct dates, so pages break inside runs of equal issue dates
+                'issue_date': f"2026-10-{1 + i % 3:02d}" if i != 4 else None,
+                'estimated_cost': 1000 * i,
+            })
+    store.ingest(rows)
+    return store
+
+
+def all_pages(store, filters, limit):
+    permits, cursor, pages = [], None, 0
+    while True:
+        page = query_permits(filters, store, cursor=cursor, limit=limit, source='local')
+        assert page['source'] == 'local'
+        assert page['count'] <= limit
+        permits += page['permits']
+        pages += 1
+        cursor = page['next_cursor']
+        if not cursor:
+            return permits, pages
+
+
+def expected_ids(store, cities, permit_type=None):
+    with store._lock:
+        rows = store._conn.execute(
+            f"SELECT id, permit_type FROM permits WHERE issue_date IS NOT NULL "
+            f"AND city IN ({','.join('?' * len(cities))})", cities
+        ).fetchall()
+    return sorted(row['id'] for row in rows if permit_type in (None, row['permit_type']))
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 7, 50])
+def test_multi_city_pages_return_every_row_once(store, limit):
+    filters = parse_filters({'cities': 'nashville,austin,houston'})
+    permits, pages = all_pages(store, filters, limit)
+
+    ids = [permit['id'] for permit in permits]
+    assert len(ids) == len(set(ids))
+    assert sorted(ids) == expected_ids(store, ['nashville', 'austin', 'houston'])
+    assert {permit['city'] for permit in permits} == {'nashville', 'austin', 'houston'}
+    keys = [(permit['issue_date'], permit['id']) for permit in permits]
+    assert keys == sorted(keys, reverse=True)
+    assert pages == -(-len(ids) // limit)
+
+
+def test_pages_with_filters_return_every_match_once(store):
+    filters = parse_filters({'cities': 'nashville,austin', 'permit_type': 'Roofing'})
+    permits, _ = all_pages(store, filters, 4)
+
+    ids = [permit['id'] for permit in permits]
+    assert len(ids) == len(set(ids))
+    assert sorted(ids) == expected_ids(store, ['nashville', 'austin'], 'Roofing')
+
+
+def test_cursor_is_rejected_with_different_filters(store):
+    filters = parse_filters({'cities': 'nashville,austin'})
+    cursor = query_permits(filters, store, limit=5, source='local')['next_cursor']
+    assert cursor
+
+    for other in ({'cities': 'nashville'}, {'cities': 'nashville,austin', 'min_cost': '5000'}):
+        with pytest.raises(ValueError):
+            query_permits(parse_filters(other), store, cursor=cursor, limit=5)
+    with pytest.raises(ValueError):
+        decode_cursor(cursor[:-3], filters)
+
+    # The same filters carry on where the first page stopped
+    assert decode_cursor(cursor, filters)[0] == 'local'
+    assert query_permits(filters, store, cursor=cursor, limit=5)['count'] == 5
@@ -0,0 +1,48 @@
+from permit_store import PermitStore
+
+
+def make_store(tmp_path):
+    return PermitStore(path=str(tmp_path / 'permits.db'))
+
+
+def stored(store, permit_number, city='nashville'):
+    with store._lock:
+        return dict(store._conn.execute(
+            'SELECT * FROM permits WHERE permit_number = ? AND city = ?', (permit_number, city)
+        ).fetchone())
+
+
+def test_partial_upsert_keeps_columns_it_does_not_carry(tmp_path):
+    store = make_store(tmp_path)
+    store.ingest([{
+        'permit_number': 'P1', 'address': '1 Main St', 'city': 'nashville', 'state': 'TN',
+        'permit_type': 'Roofing', 'description': 'Reroof', 'issue_date': '2026-10-01',
+        'lat': 36.1, 'lng': -86.7, 'source': 'scraper',
+    }])
+
+    # A later scrape without state/source/coordinates, with an updated status
+    store.ingest([{'permit_number': 'P1', 'address': '1 Main St', 'city': 'nashville',
+                   'status': 'Issued', 'lat': None}])
+
+    row = stored(store, 'P1')
+    assert (row['state'], row['source'], row['permit_type'], row['description']) == \
+        ('TN', 'scraper', 'Roofing', 'Reroof')
+    assert (row['lat'], row['lng'], row['status']) == (36.1, -86.7, 'Issued')
+
+
+def test_set_coordinates_only_touches_lat_lng(tmp_path):
+    store = make_store(tmp_path)
+    store.ingest([{'permit_number': 'P1', 'address': '1 Main St', 'city': 'nashville', 'state': 'TN',
+                   'issue_date': '2026-10-01'}], source='scraper')
+    before = stored(store, 'P1')
+    generation = store.generation
+
+    assert store.set_coordinates('nashville', [('P1', 36.16, -86.78), ('missing', 1.0, 2.0)]) == 1
+
+    row = stored(store, 'P1')
+    assert (row['lat'], row['lng']) == (36.16, -86.78)
+    assert {k: v for k, v in row.items() if k not in ('lat', 'lng')} == \
+        {k: v for k, v in before.items() if k not in ('lat', 'lng')}
+    assert store.city_generations['nashville'] > generation
+    assert [p['permit_number'] for p in store.in_bbox((-87, 36, -86, 37))] == ['P1']
+    assert store.missing_coordinates('nashville') == []
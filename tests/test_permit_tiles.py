@@ -0,0 +1,128 @@
+import os
+import struct
+
+from permit_map import lat_to_y, lng_to_x
+from permit_store import PermitStore
+from permit_tiles import PermitTiles, encode_layer
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def read_message(data):
+    """Protobuf bytes -> [(field number, value)], length-delimited values left as bytes"""
+    fields, pos = [], 0
+    while pos < len(data):
+        tag, pos = read_varint(data, pos)
+        wire_type = tag & 0x7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        else:
+            length, pos = read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        fields.append((tag >> 3, value))
+    return fields
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def read_packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def decode_value(data):
+    field, value = read_message(data)[0]
+    return {1: lambda v: v.decode('utf-8'), 3: lambda v: struct.unpack('<d', v)[0],
+            5: lambda v: v, 7: bool}[field](value)
+
+
+def decode_tile(data):
+    """MVT tile -> {layer name: {'version', 'extent', 'features': [(id, x, y, properties)]}}"""
+    layers = {}
+    for _, layer_bytes in read_message(data):
+        layer = read_message(layer_bytes)
+        keys = [v.decode('utf-8') for f, v in layer if f == 3]
+        values = [decode_value(v) for f, v in layer if f == 4]
+        features = []
+        for field, feature_bytes in layer:
+            if field != 2:
+                continue
+            feature = dict(read_message(feature_bytes))
+            tags = read_packed(feature[2])
+            command, x, y = read_packed(feature[4])
+            assert command == 9 and feature[3] == 1  # MoveTo(1), POINT
+            features.append((feature[1], unzigzag(x), unzigzag(y),
+                             {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}))
+        fields = dict(layer)
+        layers[fields[1].decode('utf-8')] = {'version': fields[15], 'extent': fields[5], 'features': features}
+    return layers
+
+
+def test_encoded_layer_decodes_to_the_features():
+    tile = encode_layer('permits', [
+        (1, 10, 4000, {'city': 'austin', 'value': 1500.5, 'empty': '', 'count': 3}),
+        (2, -20, 4100, {'city': 'austin', 'cluster': True}),
+    ])
+    layer = decode_tile(tile)['permits']
+    assert (layer['version'], layer['extent']) == (2, 4096)
+    assert layer['features'] == [
+        (1, 10, 4000, {'city': 'austin', 'value': 1500.5, 'count': 3}),
+        (2, -20, 4100, {'city': 'austin', 'cluster': True}),
+    ]
+
+
+def tile_files(root):
+    return sorted(os.path.relpath(os.path.join(d, name), root)
+                  for d, _, names in os.walk(root) for name in names if name.endswith('.mvt'))
+
+
+def test_city_tiles_are_rebuilt_only_when_its_permits_change(tmp_path):
+    store = PermitStore(path=str(tmp_path / 'permits.db'))
+    store.ingest([
+        {'permit_number': 'P1', 'address': '1 Main St', 'city': 'austin', 'permit_type': 'Roofing',
+         'estimated_cost': 12000.0, 'lat': 30.2672, 'lng': -97.7431},
+        {'permit_number': 'P2', 'address': '2 Oak Ave', 'city': 'austin', 'lat': 30.40, 'lng': -97.60},
+        {'permit_number': 'P3', 'address': '3 Elm Rd', 'city': 'austin'},  # Not geocoded
+    ])
+    tiles = PermitTiles(store, root=str(tmp_path / 'tiles'), min_zoom=10, max_zoom=12)
+
+    index = tiles.build_city('austin')
+    assert (index['permits'], index['zooms']) == (2, [10, 12])
+    assert index['bounds'] == [-97.7431, 30.2672, -97.60, 30.40]
+    files = tile_files(str(tmp_path / 'tiles'))
+    assert index['tiles'] == len(files) and len(files) >= 6  # Two points, three zooms
+
+    # The home tile of P1 at zoom 12 holds it with its properties
+    path = tiles.tile_path('austin', 12, int(lng_to_x(-97.7431, 12)), int(lat_to_y(30.2672, 12)))
+    with open(path, 'rb') as f:
+        features = decode_tile(f.read())['permits']['features']
+    properties = next(p for *_, p in features if p['permit_number'] == 'P1')
+    assert (properties['type'], properties['value'], properties['address']) == ('Roofing', 12000.0, '1 Main St')
+
+    assert tiles.build_city('austin') is None  # Nothing changed
+    assert tiles.build_cities(['austin']) == []
+
+    # Moving P2 rewrites its tiles only; P1's tiles keep their bytes (and mtime)
+    mtime = os.stat(path).st_mtime_ns
+    store.set_coordinates('austin', [('P2', 30.10, -97.90)])
+    assert tiles.build_cities(['austin']) == ['austin']
+    assert os.stat(path).st_mtime_ns == mtime
+    assert tiles.index('austin')['bounds'] == [-97.90, 30.10, -97.7431, 30.2672]
+    assert tile_files(str(tmp_path / 'tiles')) != files
+    assert len(tile_files(str(tmp_path / 'tiles'))) == tiles.index('austin')['tiles']
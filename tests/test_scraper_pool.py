@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+import pytest
+
+from permit_pipeline import ScrapeStopped, run_pipeline
+from scrapers.pool import STATUS_DONE, STATUS_TIMEOUT, ScraperPool
+
+
+class FakeScraper:
+    def __init__(self, host, batches=()):
+        self.base_url = f"https://{host}/resource.json"
+        self.batches = list(batches)
+        self.stopped = False
+
+    def iter_permits(self, batch_size=500):
+        yield from self.batches
+
+
+def test_per_host_limit_caps_concurrent_cities():
+    lock = threading.Lock()
+    active, peak = {}, {}
+
+    def scrape(city_name, scraper):
+        host = scraper.base_url
+        with lock:
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+        time.sleep(0.05)
+        with lock:
+            active[host] -= 1
+        return city_name
+
+    jobs = [(f"a{i}", FakeScraper('a.example.com')) for i in range(5)] + \
+           [(f"b{i}", FakeScraper('b.example.com')) for i in range(3)]
+    outcomes = list(ScraperPool(max_workers=8, per_host_limit=2).run(jobs, scrape))
+
+    assert sorted(value for _, status, value in outcomes if status == STATUS_DONE) == sorted(name for name, _ in jobs)
+    assert max(peak.values()) == 2
+
+
+def test_deadline_stops_running_scrapers_before_returning():
+    def scrape(city_name, scraper):
+        if city_name == 'fast':
+            return 'done'
+        while not scraper.stop_event.wait(0.01):
+            pass
+        time.sleep(0.05)    # Wind-down after noticing the stop
+        scraper.stopped = True
+
+    jobs = [('fast', FakeScraper('a.example.com')), ('slow', FakeScraper('b.example.com')),
+            ('slower', FakeScraper('c.example.com'))]
+    outcomes = list(ScraperPool(deadline_seconds=0.3, stop_grace_seconds=5).run(jobs, scrape))
+
+    assert ('fast', STATUS_DONE, 'done') in outcomes
+    assert sorted(name for name, status, _ in outcomes if status == STATUS_TIMEOUT) == ['slow', 'slower']
+    # Both stragglers had finished by the time run() returned
+    assert jobs[1][1].stopped and jobs[2][1].stopped
+
+
+def test_stopped_scrape_does_not_publish_its_csv(tmp_path):
+    permit = {'permit_number': 'P1', 'address': '1 Main St', 'type': 'Roofing', 'issued_date': '2026-10-01'}
+    scraper = FakeScraper('a.example.com', batches=[[permit], [dict(permit, permit_number='P2')]])
+    scraper.stop_event = threading.Event()
+    original = scraper.iter_permits
+
+    def iter_permits(batch_size=500):
+        for batch in original(batch_size):
+            yield batch
+            scraper.stop_event.set()    # Deadline passes after the first batch
+    scraper.iter_permits = iter_permits
+
+    leads_root = str(tmp_path / 'leads')
+    with pytest.raises(ScrapeStopped):
+        run_pipeline('Nashville', scraper, leads_root=leads_root)
+
+    written = [name for _, _, names in os.walk(leads_root) for name in names]
+    assert written == []
+
+
+def test_unstopped_scrape_publishes_its_csv(tmp_path):
+    permit = {'permit_number': 'P1', 'address': '1 Main St', 'type': 'Roofing', 'issued_date': '2026-10-01'}
+    scraper = FakeScraper('a.example.com', batches=[[permit]])
+    scraper.stop_event = threading.Event()
+
+    stats = run_pipeline('Nashville', scraper, leads_root=str(tmp_path / 'leads'))
+
+    assert stats['written'] == 1
+    assert os.path.exists(stats['csv_path'])
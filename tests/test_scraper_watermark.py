@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import scrapers.utils
+from scrapers.base import PermitScraperBase
+
+
+def day(days_ago):
+    return (datetime.now() - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+
+
+class ListScraper(PermitScraperBase):
+    """Serves a fixed list of source records, newest first, and remembers each window asked for"""
+    name = 'watermark_test'
+    display_name = 'Watermark Test'
+
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+        self.windows = []
+
+    def fetch_records(self, start_date, end_date, max_records):
+        self.windows.append(start_date.strftime('%Y-%m-%d'))
+        for record in self.records:
+            if record['issued_date'] >= start_date.strftime('%Y-%m-%d'):
+                yield record
+
+    def map_record(self, record):
+        return dict(record)
+
+
+@pytest.fixture(autouse=True)
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrapers.utils, 'LOG_DIR', str(tmp_path))
+
+
+def scrape(scraper, **kwargs):
+    return [permit['permit_number'] for batch in scraper.iter_permits(**kwargs) for permit in batch]
+
+
+RECORDS = [
+    {'permit_number': 'P3', 'issued_date': day(1)},
+    {'permit_number': 'P2', 'issued_date': day(1)},
+    {'permit_number': 'P1', 'issued_date': day(5)},
+]
+
+
+def test_second_run_only_fetches_past_the_watermark():
+    first = ListScraper(RECORDS)
+    assert scrape(first) == ['P3', 'P2', 'P1']
+    assert not first.incremental
+    assert first.watermark.last_issue_date == day(1)
+
+    # A new permit on the watermark date and one after it; P2/P3 come back unchanged
+    second = ListScraper([{'permit_number': 'P5', 'issued_date': day(0)},
+                          {'permit_number': 'P4', 'issued_date': day(1)}] + RECORDS)
+    assert scrape(second) == ['P5', 'P4']
+    assert second.incremental
+    assert second.windows == [day(1)]
+    assert second.watermark.last_issue_date == day(0)
+
+    third = ListScraper([{'permit_number': 'P5', 'issued_date': day(0)}])
+    assert scrape(third) == []
+    assert third.up_to_date
+
+
+def test_full_refresh_ignores_the_watermark():
+    scrape(ListScraper(RECORDS))
+    scraper = ListScraper(RECORDS)
+    assert scrape(scraper, full=True) == ['P3', 'P2', 'P1']
+    assert not scraper.incremental
+
+
+def test_truncated_or_stopped_scrape_keeps_the_watermark():
+    scrape(ListScraper(RECORDS[2:]))
+    assert ListScraper([]).watermark.last_issue_date == day(5)
+
+    # Hit max_permits: the rest of the window was never read
+    truncated = ListScraper(RECORDS)
+    assert scrape(truncated, max_permits=1) == ['P3']
+    assert ListScraper([]).watermark.last_issue_date == day(5)
+
+    stopped = ListScraper(RECORDS)
+    stopped.stop_event.set()
+    assert scrape(stopped) == []
+    assert not stopped.up_to_date
+    assert ListScraper([]).watermark.last_issue_date == day(5)
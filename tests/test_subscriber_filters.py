@@ -0,0 +1,49 @@
+import pytest
+
+from permit_pipeline import normalize_permit, to_supabase_row
+from permit_store import PermitStore
+from subscriber_filters import FilterIndex, normalize_filters
+
+
+def scraped_rows(tmp_path, permits):
+    """Scraper output -> pipeline -> local store rows, the way the daily email reads them"""
+    store = PermitStore(path=str(tmp_path / 'permits.db'))
+    store.ingest([to_supabase_row(normalize_permit(permit), 'chattanooga') for permit in permits], source='scraper')
+    return store.recent('chattanooga', limit=100)
+
+
+def test_scraped_permits_match_zip_filters(tmp_path):
+    rows = scraped_rows(tmp_path, [
+        {'permit_number': 'P1', 'address': '100 Market St Chattanooga TN 37402', 'type': 'Roofing', 'value': '9000'},
+        {'permit_number': 'P2', 'address': '5 Oak Ave', 'zip': '37403-1234', 'type': 'Pool', 'value': '40000'},
+        {'permit_number': 'P3', 'address': '12345 Ranch Rd', 'type': 'Solar', 'value': '25000'},
+    ])
+    assert {row['permit_number']: row['zip_code'] for row in rows} == {'P1': '37402', 'P2': '37403', 'P3': None}
+
+    index = FilterIndex(rows)
+    select = lambda raw: sorted(row['permit_number'] for row in index.select(normalize_filters(raw)))
+    assert select({'zip_codes': ['37402']}) == ['P1']
+    assert select({'zip_codes': '37402,37403', 'min_value': 10000}) == ['P2']
+    assert select({'zip_codes': ['12345']}) == []  # House numbers aren't zip codes
+
+
+def test_types_keywords_and_values_combine(tmp_path):
+    rows = scraped_rows(tmp_path, [
+        {'permit_number': 'P1', 'address': '1 Main St', 'type': 'Residential Roofing', 'description': 'Solar panels'},
+        {'permit_number': 'P2', 'address': '2 Main St', 'type': 'Roofing', 'description': 'Reroof', 'value': '$8,000'},
+        {'permit_number': 'P3', 'address': '3 Main St', 'type': 'Pool', 'description': 'Pool heater, solar'},
+    ])
+    index = FilterIndex(rows)
+    select = lambda raw: sorted(row['permit_number'] for row in index.select(normalize_filters(raw)))
+    assert select({}) == ['P1', 'P2', 'P3']
+    assert select({'permit_types': ['roofing']}) == ['P1', 'P2']
+    assert select({'keywords': ['Solar']}) == ['P1', 'P3']
+    assert select({'keywords': ['pool heater'], 'permit_types': ['pool', 'roof']}) == ['P3']
+    assert select({'permit_types': ['roofing'], 'max_value': 10000}) == ['P2']
+
+
+@pytest.mark.parametrize('raw', ['[1]', {'zip_codes': ['abcde']}, {'min_value': 'lots'},
+                                 {'min_value': 10, 'max_value': 5}, {'colors': ['red']}])
+def test_invalid_filters_are_rejected(raw):
+    with pytest.raises(ValueError):
+        normalize_filters(raw)
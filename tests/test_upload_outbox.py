@@ -0,0 +1,134 @@
+import time
+
+from permit_fingerprints import FingerprintIndex
+from upload_outbox import OutboxDrainer, UploadOutbox
+
+KEY = 'permit_number,city'
+
+
+def permit(number, **fields):
+    return {'permit_number': number, 'city': 'nashville', **fields}
+
+
+def make_outbox(tmp_path, **kwargs):
+    return UploadOutbox(path=str(tmp_path / 'outbox.db'), **kwargs)
+
+
+def leases(claimed):
+    return [(row_id, version) for row_id, version, *_ in claimed]
+
+
+def test_ack_removes_sent_rows(tmp_path):
+    outbox = make_outbox(tmp_path)
+    outbox.append('permits', [permit('A1'), permit('A2')], on_conflict=KEY)
+
+    claimed = outbox.claim(10)
+    assert [row['permit_number'] for *_, row in claimed] == ['A1', 'A2']
+    outbox.ack(leases(claimed))
+    assert outbox.depth() == 0
+
+
+def test_row_replaced_in_flight_is_resent_not_acked(tmp_path):
+    outbox = make_outbox(tmp_path)
+    outbox.append('permits', [permit('A1', address='old')], on_conflict=KEY)
+    claimed = outbox.claim(10)
+
+    # A newer scrape re-queues the permit while the old version is uploading
+    outbox.append('permits', [permit('A1', address='new')], on_conflict=KEY)
+    outbox.ack(leases(claimed))
+
+    assert outbox.depth() == 1
+    (row_id, version, _, _, _, _, row), = outbox.claim(10)
+    assert row['address'] == 'new'
+    assert version == claimed[0][1] + 1
+    outbox.ack([(row_id, version)])
+    assert outbox.depth() == 0
+
+
+def test_fail_only_backs_off_the_leased_version(tmp_path):
+    outbox = make_outbox(tmp_path)
+    outbox.append('permits', [permit('A1', address='old'), permit('A2')], on_conflict=KEY)
+    claimed = outbox.claim(10)
+    outbox.append('permits', [permit('A1', address='new')], on_conflict=KEY)
+
+    outbox.fail(leases(claimed), 'supabase down', delay=3600)
+
+    # A2 waits out its backoff; A1's new version is due straight away, with a clean attempt count
+    retry = outbox.claim(10)
+    assert [(row['permit_number'], row['address'], attempts) for _, _, attempts, _, _, _, row in retry] == \
+        [('A1', 'new', 0)]
+    stats = outbox.stats()
+    assert stats['pending'] == 2
+    assert stats['retrying'] == 1
+
+
+def test_rows_park_after_max_attempts_and_requeue(tmp_path):
+    outbox = make_outbox(tmp_path, max_attempts=3)
+    outbox.append('permits', [permit('A1')], on_conflict=KEY)
+
+    for _ in range(3):
+        claimed = outbox.claim(10)
+        assert len(claimed) == 1
+        outbox.fail(leases(claimed), 'rejected', delay=0)
+
+    assert outbox.claim(10) == []
+    stats = outbox.stats()
+    assert (stats['parked'], stats['pending'], stats['last_error']) == (1, 0, 'rejected')
+    assert outbox.depth() == 1
+
+    assert outbox.requeue_parked() == 1
+    (_, _, attempts, table, on_conflict, _, row), = outbox.claim(10)
+    assert (attempts, table, on_conflict, row['permit_number']) == (0, 'permits', KEY, 'A1')
+    assert outbox.stats()['parked'] == 0
+
+
+def test_full_outbox_applies_backpressure_before_the_first_drain(tmp_path):
+    outbox = make_outbox(tmp_path, max_rows=2)
+    outbox.append('permits', [permit('A1'), permit('A2')], on_conflict=KEY)
+
+    started = time.monotonic()
+    outbox.append('permits', [permit('A3')], on_conflict=KEY, backpressure_timeout=1)
+    assert time.monotonic() - started >= 1
+    assert outbox.depth() == 3  # Rows are kept once the wait gives up
+
+
+def test_stalled_drainer_does_not_block_appends(tmp_path):
+    outbox = make_outbox(tmp_path, max_rows=2)
+    outbox.append('permits', [permit('A1'), permit('A2')], on_conflict=KEY)
+    outbox.last_drained_at = time.monotonic() - 60
+
+    started = time.monotonic()
+    outbox.append('permits', [permit('A3')], on_conflict=KEY, backpressure_timeout=5)
+    assert time.monotonic() - started < 1
+
+
+class FakeSupabase:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, on_conflict):
+        return self
+
+    def execute(self):
+        if self.fail:
+            raise RuntimeError('503 Service Unavailable')
+
+
+def test_fingerprints_are_recorded_only_once_supabase_accepts_rows(tmp_path):
+    fingerprints = FingerprintIndex(path=str(tmp_path / 'fingerprints.db'))
+    outbox = make_outbox(tmp_path, max_attempts=1)
+    rows = [permit('A1', address='1 Main St'), permit('A2', address='2 Main St')]
+    outbox.append('permits', rows, on_conflict=KEY)
+
+    OutboxDrainer(outbox, FakeSupabase(fail=True), fingerprints=fingerprints, workers=1).drain_once()
+    assert outbox.stats()['parked'] == 2
+    # Parked rows are still new to the next run, so it queues them again
+    assert len(fingerprints.diff('nashville', rows)[0]) == 2
+
+    outbox.requeue_parked()
+    OutboxDrainer(outbox, FakeSupabase(), fingerprints=fingerprints, workers=1).drain_once()
+    assert outbox.depth() == 0
+    assert fingerprints.diff('nashville', rows) == ([], [], 2)
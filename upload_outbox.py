@@ -0,0 +1,351 @@
+"""
+Durable outbox for Supabase uploads
+
+Scrapers append rows to a local SQLite write-ahead table and return
+straight away; a background OutboxDrainer upserts them to Supabase with
+adaptive batch sizes and a few parallel requests. Rows stay in the outbox
+until Supabase has accepted them, so a slow or failing Supabase no longer
+holds up the scrape and no longer loses the data.
+
+    run_pipeline() -> UploadOutbox.append() -> data/upload_outbox.db
+                                                   |
+                       OutboxDrainer threads <-----+-> supabase.table(...).upsert()
+
+Rows are keyed by (table, conflict key), so re-queueing a permit that is
+still waiting just replaces the pending version, and every send is an
+upsert on that key - retries and duplicate sends are harmless.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'upload_outbox.db'))
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 4))            # Parallel upsert requests
+OUTBOX_MIN_BATCH = 50
+OUTBOX_MAX_BATCH = int(os.getenv('OUTBOX_MAX_BATCH', 1000))      # Rows per upsert request
+OUTBOX_MAX_ROWS = int(os.getenv('OUTBOX_MAX_ROWS', 50000))       # Producers slow down above this depth
+OUTBOX_MAX_ATTEMPTS = 12        # After this many failures a row is parked for inspection
+OUTBOX_LEASE_SECONDS = 120      # A claimed batch returns to the queue if its sender dies
+OUTBOX_FAST_LATENCY = 2.0       # Seconds - faster upserts grow the batch size
+OUTBOX_SLOW_LATENCY = 10.0      # Seconds - slower upserts shrink it
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    on_conflict TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    last_error TEXT,
+    UNIQUE (table_name, row_key)
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_available ON outbox (attempts, available_at, id);
+"""
+
+
+class UploadOutbox:
+    """SQLite-backed queue of rows waiting to be upserted to Supabase"""
+
+    def __init__(self, path=OUTBOX_PATH, max_rows=OUTBOX_MAX_ROWS, max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.path = path
+        self.max_rows = max_rows
+        self.max_attempts = max_attempts
+        # Monotonic time of the last successful upload - starts at "now" so the
+        # row bound holds from startup, not only after the first drain
+        self.last_drained_at = time.monotonic()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Serialized write transaction (BEGIN IMMEDIATE also locks out other processes)"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def append(self, table, rows, on_conflict, backpressure_timeout=60):
+        """
+        Queue rows for upsert into a Supabase table
+
+        on_conflict is the comma-separated unique key (e.g.
+        'permit_number,city'); its values identify a row in the outbox too.
+        Blocks while the outbox is over max_rows and the drainer is making
+        progress, so producers slow to the upload rate instead of filling
+        the disk - if nothing has drained recently we queue anyway.
+        """
+        if not rows:
+            return 0
+        self._wait_for_room(backpressure_timeout)
+
+        key_fields = [field.strip() for field in on_conflict.split(',')]
+        now = time.time()
+        values = []
+        for row in rows:
+            row_key = json.dumps([row.get(field) for field in key_fields])
+            values.append((table, row_key, on_conflict, ','.join(sorted(row)), json.dumps(row, default=str), now, now))
+
+        with self._transaction() as conn:
+            conn.executemany(
+                """INSERT INTO outbox (table_name, row_key, on_conflict, columns, payload, enqueued_at, available_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (table_name, row_key) DO UPDATE SET
+                       on_conflict = excluded.on_conflict,
+                       columns = excluded.columns,
+                       payload = excluded.payload,
+                       version = outbox.version + 1,
+                       attempts = 0,
+                       last_error = NULL""",
+                values
+            )
+        return len(values)
+
+    def _wait_for_room(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.depth() >= self.max_rows:
+            if time.monotonic() - self.last_drained_at > 30:
+                return  # Drainer is stalled (Supabase down?) - keep the data rather than block
+            time.sleep(0.5)
+
+    def claim(self, limit, lease_seconds=OUTBOX_LEASE_SECONDS):
+        """
+        Lease up to `limit` due rows to a sender
+
+        Returns a list of (id, version, attempts, table, on_conflict, columns, row).
+        Leased rows are hidden from other senders until the lease runs out.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            claimed = conn.execute(
+                """SELECT id, version, attempts, table_name, on_conflict, columns, payload FROM outbox
+                   WHERE attempts < ? AND available_at <= ?
+                   ORDER BY id LIMIT ?""",
+                (self.max_attempts, now, limit)
+            ).fetchall()
+            if claimed:
+                conn.executemany('UPDATE outbox SET available_at = ? WHERE id = ?',
+                                 [(now + lease_seconds, row[0]) for row in claimed])
+        return [(row_id, version, attempts, table, on_conflict, columns, json.loads(payload))
+                for row_id, version, attempts, table, on_conflict, columns, payload in claimed]
+
+    def ack(self, leases):
+        """Remove uploaded rows (unless they were re-queued with newer data meanwhile)"""
+        with self._transaction() as conn:
+            conn.executemany('DELETE FROM outbox WHERE id = ? AND version = ?', leases)
+            # Rows replaced while in flight still need their new version sent
+            conn.executemany('UPDATE outbox SET available_at = ? WHERE id = ?',
+                             [(time.time(), row_id) for row_id, _ in leases])
+        self.last_drained_at = time.monotonic()
+
+    def fail(self, leases, error, delay):
+        """Put rows back after a failed upload, retrying after `delay` seconds"""
+        with self._transaction() as conn:
+            conn.executemany(
+                'UPDATE outbox SET attempts = attempts + 1, available_at = ?, last_error = ? WHERE id = ? AND version = ?',
+                [(time.time() + delay, str(error)[:500], row_id, version) for row_id, version in leases]
+            )
+            # Rows replaced while in flight carry fresh data - send them now
+            conn.executemany('UPDATE outbox SET available_at = ? WHERE id = ? AND version != ?',
+                             [(time.time(), row_id, version) for row_id, version in leases])
+
+    def depth(self):
+        """Rows still waiting (including parked ones)"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def stats(self):
+        """Queue depth summary for the admin API"""
+        now = time.time()
+        with self._lock:
+            pending, oldest = self._conn.execute(
+                'SELECT COUNT(*), MIN(enqueued_at) FROM outbox WHERE attempts < ?', (self.max_attempts,)
+            ).fetchone()
+            due = self._conn.execute(
+                'SELECT COUNT(*) FROM outbox WHERE attempts < ? AND available_at <= ?', (self.max_attempts, now)
+            ).fetchone()[0]
+            retrying = self._conn.execute(
+                'SELECT COUNT(*) FROM outbox WHERE attempts > 0 AND attempts < ?', (self.max_attempts,)
+            ).fetchone()[0]
+            parked = self._conn.execute(
+                'SELECT COUNT(*) FROM outbox WHERE attempts >= ?', (self.max_attempts,)
+            ).fetchone()[0]
+            by_table = dict(self._conn.execute(
+                'SELECT table_name, COUNT(*) FROM outbox GROUP BY table_name'
+            ).fetchall())
+            last_error = self._conn.execute(
+                'SELECT last_error FROM outbox WHERE last_error IS NOT NULL ORDER BY available_at DESC LIMIT 1'
+            ).fetchone()
+        return {
+            'pending': pending,
+            'due': due,
+            'retrying': retrying,
+            'parked': parked,
+            'by_table': by_table,
+            'oldest_age_seconds': round(now - oldest, 1) if oldest else 0,
+            'max_rows': self.max_rows,
+            'last_error': last_error[0] if last_error else None,
+        }
+
+    def requeue_parked(self):
+        """Give parked rows (too many failures) another round of attempts"""
+        with self._transaction() as conn:
+            return conn.execute(
+                'UPDATE outbox SET attempts = 0, available_at = ? WHERE attempts >= ?',
+                (time.time(), self.max_attempts)
+            ).rowcount
+
+
+class OutboxDrainer:
+    """
+    Background thread that uploads the outbox to Supabase
+
+    Each round claims enough rows for `workers` requests, groups them by
+    table and column set (a bulk upsert nulls columns that some rows
+    don't send, e.g. lat/lng), and upserts the groups in parallel. The
+    batch size grows while Supabase answers quickly and halves on errors
+    or slow responses; failed rows back off exponentially with jitter.
+    Permits Supabase accepts are recorded in the fingerprint index, if
+    given, so later runs skip them while unchanged.
+    """
+
+    def __init__(self, outbox, supabase, fingerprints=None, workers=OUTBOX_WORKERS, min_batch=OUTBOX_MIN_BATCH,
+                 max_batch=OUTBOX_MAX_BATCH, idle_interval=2.0):
+        self.outbox = outbox
+        self.supabase = supabase
+        self.fingerprints = fingerprints
+        self.workers = max(1, workers)
+        self.min_batch = min_batch
+        self.max_batch = max(min_batch, max_batch)
+        self.batch_size = min(self.max_batch, 200)
+        self.idle_interval = idle_interval
+        self.uploaded = 0
+        self.failed_batches = 0
+        self.last_error = None
+        self.last_upload_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox-upload')
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='outbox-drainer', daemon=True)
+        self._thread.start()
+        print(f"📤 Supabase outbox drainer started ({self.outbox.depth()} rows pending)")
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.drain_once()
+            except Exception as e:
+                print(f"⚠️  Outbox drainer error: {e}")
+                sent = 0
+            if not sent:
+                self._stop.wait(self.idle_interval)
+
+    def drain_once(self):
+        """Upload one round of due rows; returns how many rows were attempted"""
+        claimed = self.outbox.claim(self.batch_size * self.workers)
+        if not claimed:
+            return 0
+
+        groups = {}
+        for row_id, version, attempts, table, on_conflict, columns, row in claimed:
+            groups.setdefault((table, on_conflict, columns), []).append(((row_id, version), attempts, row))
+
+        batch_size = self.batch_size
+        jobs = []
+        for (table, on_conflict, _), items in groups.items():
+            for i in range(0, len(items), batch_size):
+                jobs.append((table, on_conflict, items[i:i + batch_size]))
+
+        for _ in self._executor.map(lambda job: self._send(*job), jobs):
+            pass
+        return len(claimed)
+
+    def _send(self, table, on_conflict, items):
+        leases = [lease for lease, _, _ in items]
+        rows = [row for _, _, row in items]
+        started = time.monotonic()
+        try:
+            self.supabase.table(table).upsert(rows, on_conflict=on_conflict).execute()
+        except Exception as e:
+            self._record_failure(leases, max(attempts for _, attempts, _ in items), e)
+            return
+        latency = time.monotonic() - started
+        self.outbox.ack(leases)
+        if self.fingerprints and table == 'permits':
+            by_city = {}
+            for row in rows:
+                by_city.setdefault(row['city'], []).append(row)
+            for city, city_rows in by_city.items():
+                self.fingerprints.record(city, city_rows)
+        with self._lock:
+            self.uploaded += len(rows)
+            self.last_upload_at = time.time()
+            if latency > OUTBOX_SLOW_LATENCY:
+                self.batch_size = max(self.min_batch, self.batch_size // 2)
+            elif latency < OUTBOX_FAST_LATENCY and len(rows) >= self.batch_size:
+                self.batch_size = min(self.max_batch, self.batch_size + self.min_batch)
+
+    def _record_failure(self, leases, attempts, error):
+        with self._lock:
+            self.failed_batches += 1
+            self.last_error = str(error)[:500]
+            self.batch_size = max(self.min_batch, self.batch_size // 2)
+        delay = min(600, 2 ** attempts) * random.uniform(0.5, 1.0)
+        self.outbox.fail(leases, error, delay)
+        print(f"⚠️  Supabase upload of {len(leases)} rows failed (retry in {delay:.0f}s): {str(error)[:200]}")
+
+    def flush(self, timeout=60):
+        """Wait until nothing is due (or timeout); returns the remaining depth"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.outbox.stats()['due']:
+                break
+            if not self.running and not self.drain_once():
+                break
+            time.sleep(0.2)
+        return self.outbox.depth()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'uploaded': self.uploaded,
+                'failed_batches': self.failed_batches,
+                'batch_size': self.batch_size,
+                'workers': self.workers,
+                'last_error': self.last_error,
+                'last_upload_at': self.last_upload_at,
+            }